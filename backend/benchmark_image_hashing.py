@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетного сравнения pHash изображений: попарный цикл по объектам
+ImageHash против векторного XOR + popcount над массивами NumPy, время
+запроса к индексу изображений, стоимость хэширования одного фото и
+калибровка порога предфильтра по dHash
+"""
+
+import os
+import sys
+import time
+import random
+from io import BytesIO
+
+import imagehash
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from monitoring.plagiarism_detector import PlagiarismDetector
+from monitoring.post_features import PostFeatures
+from monitoring.image_index import ImageHashIndex
+from config.settings import settings
+
+
+def random_hashes(count: int, rng: random.Random):
+    """Случайные 64-битные хэши в hex, как их хранит кэш"""
+    return [f"{rng.getrandbits(64):016x}" for _ in range(count)]
+
+
+def compare_loop(hashes1, hashes2):
+    """Существующий способ: попарное ImageHash.__sub__ в Python"""
+    objects1 = [imagehash.hex_to_hash(h) for h in hashes1]
+    objects2 = [imagehash.hex_to_hash(h) for h in hashes2]
+    return [[h1 - h2 for h2 in objects2] for h1 in objects1]
+
+
+def measure(func, *args, repeat: int = 3):
+    """Лучшее время из нескольких запусков"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark_index_query(rng: random.Random):
+    """Запрос к индексу изображений - линейный проход по массиву хэшей"""
+    print("\n🔎 Запрос к индексу изображений:")
+    for size in (10000, 100000, 500000):
+        index = ImageHashIndex(max_distance=settings.IMAGE_DHASH_THRESHOLD, max_photos=size)
+        for start in range(0, size, 10):
+            ids = tuple(f"1_{i}" for i in range(start, start + 10))
+            index.add_post(PostFeatures(
+                owner_id=-1, post_id=start, image_ids=ids,
+                image_dhashes={photo_id: f"{rng.getrandbits(64):016x}" for photo_id in ids}
+            ))
+
+        queries = random_hashes(20, rng)
+        elapsed, _ = measure(index.query_many, queries)
+        print(f"   {size} фото: {elapsed / len(queries) * 1000:.2f} мс на запрос")
+
+
+def synthetic_photo(rng: np.random.Generator) -> Image.Image:
+    """Гладкое случайное изображение 640×480"""
+    pixels = (rng.random((48, 64, 3)) * 255).astype('uint8')
+    img = Image.fromarray(pixels).resize((640, 480), Image.BICUBIC)
+    return img.filter(ImageFilter.GaussianBlur(rng.uniform(3, 12)))
+
+
+def recompress(img: Image.Image, quality: int) -> Image.Image:
+    buffer = BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return Image.open(BytesIO(buffer.getvalue()))
+
+
+def benchmark_photo_hashing(detector: PlagiarismDetector, count: int = 50):
+    """Стоимость хэширования одного загруженного фото по стадиям prefetch_image_hashes
+
+    pHash считается сразу после загрузки, а не только для пар, прошедших
+    предфильтр по dHash: для ленивого расчета признакам поста пришлось бы
+    хранить миниатюру 32×32 (1 КБ на фото в индексах) вместо 16 символов pHash.
+    """
+    print("\n🖼  Хэширование загруженного фото (604×453, JPEG):")
+    rng = np.random.default_rng(1)
+    contents = []
+    for _ in range(count):
+        buffer = BytesIO()
+        synthetic_photo(rng).resize((604, 453)).save(buffer, 'JPEG', quality=87)
+        contents.append(buffer.getvalue())
+
+    def decode_and_dhash():
+        return [detector._hash_image(detector._load_image(content)) for content in contents]
+
+    decode_time, hashed = measure(decode_and_dhash)
+    phash_time, _ = measure(lambda: [detector._phash_from_thumbnail(thumbnail) for _, thumbnail in hashed])
+    print(f"   декодирование + dHash + миниатюра: {decode_time / count * 1000:.2f} мс на фото")
+    print(f"   pHash по миниатюре: {phash_time / count * 1000:.3f} мс на фото "
+          f"(+{phash_time / decode_time:.0%}), в признаках поста 16 байт против 1024 байт миниатюры")
+
+
+def calibrate_dhash_threshold(count: int = 150):
+    """Расстояния dHash между фото и его копиями, которые pHash признает плагиатом
+
+    Порог предфильтра должен пропускать такие копии и отсекать случайные пары.
+    """
+    print(f"\n📐 Калибровка порога dHash (сейчас {settings.IMAGE_DHASH_THRESHOLD}, "
+          f"порог pHash {settings.IMAGE_HAMMING_THRESHOLD}):")
+    rng = np.random.default_rng(0)
+    photos = [synthetic_photo(rng).convert('L') for _ in range(count)]
+    dhashes = [imagehash.dhash(img) for img in photos]
+    phashes = [imagehash.phash(img) for img in photos]
+
+    transforms = {
+        'JPEG q=30': lambda img: recompress(img, 30),
+        'масштаб 50%': lambda img: img.resize((320, 240)),
+        'яркость +20%': lambda img: ImageEnhance.Brightness(img).enhance(1.2),
+        'контраст +30%': lambda img: ImageEnhance.Contrast(img).enhance(1.3),
+        'обрезка 5%': lambda img: img.crop((16, 12, 624, 468)),
+        'обрезка 10%': lambda img: img.crop((32, 24, 608, 456)),
+    }
+    radii = (8, 10, 12, 14, 16)
+    print(f"   {'копии':<14} {'пар':>4} {'макс.':>6} " + " ".join(f"{'≤' + str(r):>6}" for r in radii))
+    for name, transform in transforms.items():
+        distances = []
+        for img, dhash, phash in zip(photos, dhashes, phashes):
+            copy = transform(img).convert('L')
+            if imagehash.phash(copy) - phash <= settings.IMAGE_HAMMING_THRESHOLD:
+                distances.append(imagehash.dhash(copy) - dhash)
+        if not distances:
+            continue
+        distances = np.array(distances)
+        print(f"   {name:<14} {len(distances):>4} {distances.max():>6} " +
+              " ".join(f"{(distances <= r).mean():>6.0%}" for r in radii))
+
+    random_pairs = np.array([dhashes[i] - dhashes[j] for i in range(count) for j in range(i)])
+    print(f"   {'случайные':<14} {len(random_pairs):>4} {random_pairs.min():>6} " +
+          " ".join(f"{(random_pairs <= r).mean():>6.2%}" for r in radii) + "  (мин.)")
+
+
+def main():
+    print("🚀 Бенчмарк сравнения хэшей изображений\n")
+
+    detector = PlagiarismDetector()
+    rng = random.Random(42)
+
+    for k, n in [(4, 10), (10, 1000), (50, 10000)]:
+        hashes1 = random_hashes(k, rng)
+        hashes2 = random_hashes(n, rng)
+
+        loop_time, loop_distances = measure(compare_loop, hashes1, hashes2)
+        batch_time, batch_result = measure(detector.compare_image_hashes_batch, hashes1, hashes2)
+
+        if batch_result['distances'].tolist() != loop_distances:
+            print(f"❌ {k}×{n}: результаты расходятся")
+            return
+
+        print(f"✅ {k}×{n}: цикл {loop_time * 1000:.2f} мс, "
+              f"NumPy {batch_time * 1000:.2f} мс, ускорение x{loop_time / batch_time:.1f}")
+
+    benchmark_index_query(rng)
+    benchmark_photo_hashing(detector)
+    calibrate_dhash_threshold()
+
+
+if __name__ == "__main__":
+    main()
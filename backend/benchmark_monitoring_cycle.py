@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк полного цикла мониторинга без сети: MonitoringScheduler,
+VKAPIService и NotificationService работают с локальной заменой VK API
+(vk_fake_api.py) поверх записи или синтетических данных.
+
+Каждый цикл видит посты, опубликованные до очередного момента времени,
+поэтому первый цикл загружает стены, а следующие - только новые посты.
+Результаты воспроизводимы: база, индексы и кэши создаются заново во
+временном каталоге, задержка и ошибки 6 задаются параметрами.
+"""
+
+import os
+import sys
+import time
+import argparse
+import asyncio
+import logging
+import tempfile
+import threading
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк цикла мониторинга на замене VK API")
+    parser.add_argument('--recording', help="Каталог записи vk_fake_api.py (по умолчанию - синтетические данные)")
+    parser.add_argument('--groups', type=int, default=10, help="Синтетические данные: число сообществ")
+    parser.add_argument('--posts', type=int, default=60, help="Синтетические данные: постов на сообщество")
+    parser.add_argument('--copy-rate', type=float, default=0.05, help="Синтетические данные: доля копий")
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Задержка ответа VK API")
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов с ошибкой 6")
+    parser.add_argument('--rps-limit', type=float, default=0.0, help="Лимит запросов в секунду на токен на стороне замены")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=8081)
+    return parser.parse_args()
+
+
+class ErrorCounter(logging.Handler):
+    """Счетчик ошибок планировщика: потерянные записи о плагиате не должны выглядеть как их отсутствие"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def configure_environment(args, workdir: str):
+    """Настройки приложения до его импорта: адрес замены VK API и чистые хранилища"""
+    os.environ['VK_API_BASE_URL'] = f"http://127.0.0.1:{args.port}/method"
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ['MINHASH_INDEX_PATH'] = os.path.join(workdir, 'minhash_index.pkl')
+    os.environ['TFIDF_MODEL_PATH'] = os.path.join(workdir, 'tfidf_model.npz')
+    os.environ['IMAGE_HASH_CACHE_PATH'] = os.path.join(workdir, 'image_hashes.sqlite3')
+    os.environ['IMAGE_INDEX_PATH'] = os.path.join(workdir, 'image_index.pkl')
+    os.environ.setdefault('VK_ACCESS_TOKEN', 'offline-user-token')
+    os.environ.setdefault('VK_GROUP_TOKEN', 'offline-group-token')
+
+
+def start_fake_api(recording, args):
+    """Замена VK API в отдельном потоке со своим event loop"""
+    import uvicorn
+    from vk_fake_api import FakeVKAPI, create_app
+
+    fake_api = FakeVKAPI(
+        recording,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rps_limit=args.rps_limit,
+        seed=args.seed
+    )
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(fake_api), host='127.0.0.1', port=args.port, log_level='warning'
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return fake_api, server, thread
+
+
+def prepare_database(recording):
+    """Пользователь и все сообщества записи как отслеживаемые группы"""
+    from database.database import Base, engine, SessionLocal
+    from models.user import User, SubscriptionType
+    from models.group import Group
+    from models.plagiarism import Plagiarism  # noqa: F401 - таблица для create_all
+
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(vk_id=1, first_name="Бенчмарк", subscription_type=SubscriptionType.PREMIUM,
+                    max_groups=len(recording.groups))
+        db.add(user)
+        db.flush()
+        for group_id, info in recording.groups.items():
+            db.add(Group(vk_group_id=group_id, name=info.get('name', str(group_id)), user_id=user.id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def database_counters():
+    from database.database import SessionLocal
+    from models.group import Group
+    from models.plagiarism import Plagiarism
+
+    db = SessionLocal()
+    try:
+        posts_checked = sum(group.posts_checked or 0 for group in db.query(Group).all())
+        return posts_checked, db.query(Plagiarism).count()
+    finally:
+        db.close()
+
+
+async def run_cycles(fake_api, recording, args):
+    from monitoring.scheduler import MonitoringScheduler
+    from services.vk_rate_limiter import rate_limiter_metrics
+    from services.vk_cache import get_vk_response_cache
+    from services.vk_client import close_vk_client
+    from monitoring.image_fetcher import close_image_fetcher
+
+    scheduler = MonitoringScheduler()
+    errors = ErrorCounter()
+    logging.getLogger('monitoring.scheduler').addHandler(errors)
+
+    dates = sorted(post.get('date', 0) for posts in recording.walls.values() for post in posts.values())
+    first, last = dates[0], dates[-1]
+
+    print(f"{'цикл':>4} {'время, с':>9} {'постов':>7} {'пост/с':>7} {'запросов':>9} "
+          f"{'execute':>8} {'ошибок 6':>9} {'фото':>6} {'плагиат':>8} {'сообщ.':>7} {'ошибок':>7}")
+
+    totals = {'time': 0.0, 'posts': 0}
+    try:
+        for cycle in range(1, args.cycles + 1):
+            # Каждый цикл видит следующую часть ленты
+            fake_api.clock = first + (last - first) * cycle // args.cycles
+            fake_api.reset_stats()
+            posts_before, plagiarism_before = database_counters()
+            errors_before = len(errors.messages)
+
+            started = time.perf_counter()
+            await scheduler.run_monitoring()
+            elapsed = time.perf_counter() - started
+
+            posts_after, plagiarism_after = database_counters()
+            stats = dict(fake_api.stats)
+            posts = posts_after - posts_before
+            totals['time'] += elapsed
+            totals['posts'] += posts
+
+            print(f"{cycle:>4} {elapsed:>9.2f} {posts:>7} {posts / elapsed if elapsed else 0:>7.1f} "
+                  f"{stats.get('requests', 0):>9} {stats.get('method:execute', 0):>8} "
+                  f"{stats.get('errors_injected', 0) + stats.get('errors_rate_limit', 0):>9} "
+                  f"{stats.get('photos', 0):>6} {plagiarism_after - plagiarism_before:>8} "
+                  f"{stats.get('messages_sent', 0):>7} {len(errors.messages) - errors_before:>7}")
+    finally:
+        scheduler.detection_executor.shutdown()
+        await close_vk_client()
+        await close_image_fetcher()
+
+    print(f"\n📊 Всего: {totals['posts']} постов за {totals['time']:.2f} с "
+          f"({totals['posts'] / totals['time'] if totals['time'] else 0:.1f} пост/с)")
+
+    print("\n⏱  Лимитеры токенов (на стороне клиента):")
+    for token, metrics in rate_limiter_metrics().items():
+        print(f"   {token}: {metrics['acquired']} запросов, ожидание в среднем "
+              f"{metrics['avg_wait_seconds']:.3f} с, максимум {metrics['max_wait_seconds']:.3f} с, "
+              f"штрафов {metrics['penalties']}")
+
+    cache = get_vk_response_cache().metrics()
+    print(f"   Кэш ответов: {cache['size']} записей, попаданий {cache['hit_ratio']:.0%}")
+
+    if errors.messages:
+        print(f"\n❌ Ошибок планировщика: {len(errors.messages)}, первая: {errors.messages[0]}")
+    return not errors.messages
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='vk_benchmark_')
+    configure_environment(args, workdir)
+
+    from vk_fake_api import VKRecording, generate_recording
+
+    print("🚀 Бенчмарк цикла мониторинга на локальной замене VK API\n")
+
+    if args.recording:
+        recording = VKRecording.load(args.recording)
+    else:
+        recording = generate_recording(
+            os.path.join(workdir, 'recording'), args.groups, args.posts, args.copy_rate, seed=args.seed
+        )
+    posts = sum(len(posts) for posts in recording.walls.values())
+    if not recording.groups or not posts:
+        print(f"❌ В записи {args.recording} нет сообществ или постов")
+        return
+
+    print(f"   Данные: {len(recording.groups)} сообществ, {posts} постов, {len(recording.photo_sources)} фото")
+    print(f"   VK API: задержка {args.latency_ms:.0f}±{args.jitter_ms:.0f} мс, ошибок 6 {args.error_rate:.0%}, "
+          f"лимит {args.rps_limit or '-'} запр/с на токен")
+    print(f"   Рабочий каталог: {workdir}\n")
+
+    fake_api, server, thread = start_fake_api(recording, args)
+    try:
+        prepare_database(recording)
+        succeeded = asyncio.run(run_cycles(fake_api, recording, args))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    if not succeeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
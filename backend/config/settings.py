@@ -12,6 +12,25 @@ class Settings(BaseSettings):
     VK_GROUP_TOKEN: Optional[str] = None
     VK_APP_ID: Optional[str] = None
     VK_APP_SECRET: Optional[str] = None
+    VK_SERVICE_TOKENS: str = ""             # Дополнительные токены через запятую: сервисные,
+    VK_USER_TOKENS: str = ""                # пользовательские
+    VK_GROUP_TOKENS: str = ""               # и токены сообществ
+    VK_TOKEN_QUARANTINE_SECONDS: float = 600.0  # Карантин токена после ошибок 5/29
+    VK_API_BASE_URL: str = "https://api.vk.com/method"  # Для офлайн-прогонов - адрес vk_fake_api.py
+    VK_API_VERSION: str = "5.131"
+    VK_API_TIMEOUT_SECONDS: float = 10.0
+    VK_API_MAX_CONNECTIONS: int = 20        # Размер пула соединений с api.vk.com
+    VK_EXECUTE_ENABLED: bool = True         # Объединять вызовы wall.get/groups.getById/wall.getById в execute
+    VK_EXECUTE_MAX_CALLS: int = 25          # Вызовов в одном execute (лимит VK - 25)
+    VK_EXECUTE_WINDOW_MS: int = 20          # Окно ожидания соседних вызовов
+    VK_API_REQUESTS_PER_SECOND: float = 3.0 # Лимит запросов в секунду на токен
+    VK_API_BURST: float = 3.0               # Запросов подряд без ожидания
+    VK_API_PENALTY_SECONDS: float = 1.0     # Пауза токена после ошибки 6
+    VK_API_MAX_RETRIES: int = 5             # Повторов при ошибке 6
+    VK_API_BACKOFF_BASE_SECONDS: float = 0.5
+    VK_API_BACKOFF_MAX_SECONDS: float = 8.0
+    VK_CALLBACK_SECRET: Optional[str] = None       # Секретный ключ из настроек Callback API
+    VK_CALLBACK_CONFIRMATION_CODES: str = ""        # Строки подтверждения сервера: group_id:код через запятую
     
     # JWT
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
@@ -26,20 +45,58 @@ class Settings(BaseSettings):
     # Настройки детекции плагиата для MVP
     TEXT_SIMILARITY_THRESHOLD: float = 0.7  # 70% как в требованиях MVP
     IMAGE_HAMMING_THRESHOLD: int = 10       # Расстояние Хэмминга ≤10
+    IMAGE_DHASH_THRESHOLD: int = 12         # Предфильтр по dHash: копии после сжатия, масштаба и яркости - до 5,
+                                            # после обрезки на 5% - до 14, случайные фото - от 15 (benchmark_image_hashing.py)
     MIN_TEXT_LENGTH: int = 20               # Минимальная длина текста для анализа
+    CHAR_SIMILARITY_MODE: str = "auto"      # sequence, kgram или auto
+    CHAR_SIMILARITY_MAX_SEQUENCE_LENGTH: int = 200   # Порог длины для SequenceMatcher в режиме auto: дальше он квадратичен
+    TEXT_CASCADE_ENABLED: bool = True       # Каскад проверок с ранним выходом при доказанном плагиате
     
     # Настройки мониторинга
     MONITORING_INTERVAL_HOURS: int = 3      # Каждые 3 часа как в требованиях
     MAX_POSTS_PER_GROUP: int = 100          # Максимум постов для анализа
+    MAX_NEW_POSTS_PER_CYCLE: int = 1000     # Максимум новых постов группы за цикл
+    CALLBACK_POLL_FALLBACK_HOURS: int = 24  # Группы с работающим Callback API опрашиваются не чаще
+    INCREMENTAL_FIRST_PAGE_SIZE: int = 20   # Первая страница стены, когда уже есть обработанные посты
+    BACKFILL_INTERVAL_MINUTES: int = 5      # Как часто догружать историю стен
+    GROUP_METADATA_REFRESH_HOURS: int = 24  # Как часто обновлять названия и фото групп
+    BACKFILL_CONCURRENT_PAGES: int = 10     # Страниц по 100 постов, запрашиваемых одновременно
+    BACKFILL_MAX_POSTS_PER_RUN: int = 5000  # Постов группы за один запуск (дальше - в следующий)
     MAX_GROUPS_TO_MONITOR: int = 50         # Максимум групп для мониторинга
+    MONITORING_CONCURRENCY: int = 5         # Групп, обрабатываемых одновременно
+    MONITORING_GROUP_TIMEOUT_SECONDS: float = 300.0  # Дольше обработка группы прерывается до следующего цикла
+    DETECTION_WORKERS: int = 2              # Процессов для детекции (0 - в основном процессе)
+    DETECTION_BATCH_SIZE: int = 16          # Задач детекции в одной отправке в пул
     
     # Настройки кэширования
     CACHE_DURATION_HOURS: int = 24          # Время жизни кэша
     MAX_CACHE_SIZE: int = 1000              # Максимальный размер кэша
+    IMAGE_HASH_CACHE_PATH: str = "data/image_hashes.sqlite3"  # Кэш dHash/pHash по id фото
+    
+    # Загрузка изображений
+    IMAGE_FETCH_CONCURRENCY: int = 32       # Одновременных загрузок всего
+    IMAGE_FETCH_PER_HOST_LIMIT: int = 8     # Одновременных загрузок с одного хоста
+    IMAGE_FETCH_TIMEOUT_SECONDS: float = 10.0
+    IMAGE_FETCH_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_HASH_MIN_SIZE: int = 90           # Минимальная сторона фото, загружаемого для хэширования
+    IMAGE_INDEX_PATH: str = "data/image_index.pkl"  # Глобальный индекс хэшей фото
+    IMAGE_INDEX_MAX_PHOTOS: int = 500000    # Максимум фото в индексе
+    
+    # Индекс кандидатов (MinHash + LSH)
+    MINHASH_INDEX_PATH: str = "data/minhash_index.pkl"
+    MINHASH_NUM_PERM: int = 128             # Количество хэш-функций в сигнатуре
+    MINHASH_BANDS: int = 32                 # Количество бэндов LSH
+    MINHASH_MAX_POSTS: int = 200000         # Максимум постов в индексе
+    MAX_CANDIDATES_PER_POST: int = 50       # Максимум кандидатов на проверку
+    SIMHASH_MAX_DISTANCE: int = 3           # Расстояние Хэмминга SimHash для почти-дубликатов
+    
+    # Корпусная TF-IDF модель
+    TFIDF_MODEL_PATH: str = "data/tfidf_model.npz"
     
     # Настройки уведомлений
     NOTIFICATION_ENABLED: bool = True
     MAX_NOTIFICATIONS_PER_DAY: int = 10     # Максимум уведомлений в день
+    CONFIDENCE_THRESHOLD: float = 0.7       # Минимальная уверенность (схожесть по сильнейшему признаку) для уведомления
     
     class Config:
         env_file = ".env"
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Создание движка базы данных
 engine = create_engine(settings.DATABASE_URL)
@@ -19,4 +22,33 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def add_missing_columns(bind=engine):
+    """Добавление в существующие таблицы столбцов, появившихся в моделях
+    
+    create_all создает только отсутствующие таблицы, поэтому в базе,
+    созданной до появления столбца, его нужно добавить через ALTER TABLE.
+    Столбец добавляется допускающим NULL, а уже существующие строки
+    получают значение по умолчанию из модели.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                
+                if column.default is not None and column.default.is_scalar:
+                    connection.execute(table.update().values({column.name: column.default.arg}))
+                
+                logger.info(f"В таблицу {table.name} добавлен столбец {column.name}")
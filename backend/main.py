@@ -4,9 +4,14 @@ from fastapi.staticfiles import StaticFiles
 import uvicorn
 from contextlib import asynccontextmanager
 
-from database.database import engine, Base
-from routers import auth, groups, monitoring, billing, notifications
+from database.database import engine, Base, add_missing_columns
+from routers import auth, groups, monitoring, billing, notifications, callback
 from monitoring.scheduler import MonitoringScheduler
+from monitoring.image_fetcher import close_image_fetcher
+from services.vk_client import close_vk_client
+from services.vk_rate_limiter import rate_limiter_metrics
+from services.vk_token_pool import get_token_pool
+from services.vk_cache import get_vk_response_cache
 from config.settings import settings
 
 
@@ -14,15 +19,20 @@ from config.settings import settings
 async def lifespan(app: FastAPI):
     # Создание таблиц при запуске
     Base.metadata.create_all(bind=engine)
+    # Новые столбцы моделей в базе, созданной прежней версией
+    add_missing_columns(engine)
     
     # Инициализация планировщика мониторинга
     scheduler = MonitoringScheduler()
     scheduler.start()
+    app.state.scheduler = scheduler
     
     yield
     
     # Остановка планировщика при завершении
     scheduler.stop()
+    await close_image_fetcher()
+    await close_vk_client()
 
 
 app = FastAPI(
@@ -47,6 +57,7 @@ app.include_router(groups.router, prefix="/api/groups", tags=["groups"])
 app.include_router(monitoring.router, prefix="/api/monitoring", tags=["monitoring"])
 app.include_router(billing.router, prefix="/api/billing", tags=["billing"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(callback.router, prefix="/api/vk", tags=["vk"])
 
 
 @app.get("/")
@@ -59,6 +70,16 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/vk")
+async def vk_health_check():
+    """Пул токенов VK API, очереди и время ожидания лимитеров, попадания в кэш"""
+    return {
+        "tokens": get_token_pool().status(),
+        "rate_limiters": rate_limiter_metrics(),
+        "response_cache": get_vk_response_cache().metrics()
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -29,6 +29,17 @@ class Group(Base):
     plagiarism_found = Column(Integer, default=0)
     last_check = Column(DateTime, nullable=True)
     
+    # Самый новый обработанный пост - со следующего цикла загружаются только более новые
+    last_post_id = Column(Integer, nullable=True)
+    last_post_date = Column(DateTime, nullable=True)
+    
+    # Догрузка истории стены: смещение следующей страницы и признак завершения
+    backfill_offset = Column(Integer, default=0)
+    backfill_completed = Column(Boolean, default=False)
+    
+    # Найденные случаи плагиата
+    plagiarism_cases = relationship("Plagiarism", back_populates="group")
+    
     # Метаданные
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum
 from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
 from database.database import Base
 import enum
 
@@ -25,6 +26,9 @@ class User(Base):
     subscription_type = Column(Enum(SubscriptionType), default=SubscriptionType.FREE)
     subscription_expires = Column(DateTime, nullable=True)
     
+    # Отслеживаемые группы
+    groups = relationship("Group", back_populates="user")
+    
     # Настройки
     notifications_enabled = Column(Boolean, default=True)
     max_groups = Column(Integer, default=1)
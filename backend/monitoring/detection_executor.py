@@ -0,0 +1,100 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from monitoring.plagiarism_detector import PlagiarismDetector
+from monitoring.post_features import PostFeatures
+from monitoring.tfidf_model import CorpusTfidfModel
+
+logger = logging.getLogger(__name__)
+
+# Задача детекции: блок оригиналов × блок проверяемых постов
+DetectionTask = Tuple[List[PostFeatures], List[PostFeatures]]
+
+# Детектор, живущий в процессе-воркере
+_worker_detector: Optional[PlagiarismDetector] = None
+_worker_tfidf_mtime: Optional[float] = None
+
+
+def _tfidf_model_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(settings.TFIDF_MODEL_PATH)
+    except OSError:
+        return None
+
+
+def _init_worker():
+    """Создание детектора один раз на процесс-воркер"""
+    global _worker_detector, _worker_tfidf_mtime
+    _worker_detector = PlagiarismDetector()
+    _worker_tfidf_mtime = _tfidf_model_mtime()
+
+
+def _run_detection_tasks(tasks: List[DetectionTask]) -> List[List[List[Dict]]]:
+    """Выполнение пачки задач детекции в процессе-воркере"""
+    global _worker_tfidf_mtime
+    if _worker_detector is None:
+        _init_worker()
+
+    # Документные частоты подтягиваются после каждого сохранения модели планировщиком
+    mtime = _tfidf_model_mtime()
+    if mtime is not None and mtime != _worker_tfidf_mtime:
+        _worker_detector.tfidf_model = CorpusTfidfModel.load(settings.TFIDF_MODEL_PATH)
+        _worker_tfidf_mtime = mtime
+
+    return [_worker_detector.detect_plagiarism_block(originals, targets) for originals, targets in tasks]
+
+
+class DetectionExecutor:
+    """Вынос CPU-тяжелой детекции из event loop в пул процессов
+
+    При max_workers = 0 детекция выполняется в текущем процессе переданным
+    детектором - так же, как раньше.
+    """
+
+    def __init__(self, detector: PlagiarismDetector, max_workers: int = 2, batch_size: int = 16):
+        self.detector = detector
+        self.max_workers = max_workers
+        self.batch_size = max(1, batch_size)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+
+        if self._pool is None:
+            # spawn: воркеры не наследуют event loop, потоки и соединения родителя
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            logger.info(f"Пул детекции запущен: {self.max_workers} процессов")
+        return self._pool
+
+    async def detect_blocks(self, tasks: List[DetectionTask]) -> List[List[List[Dict]]]:
+        """Детекция для списка блоков; результаты в порядке задач"""
+        if not tasks:
+            return []
+
+        pool = self._get_pool()
+        if pool is None:
+            return [self.detector.detect_plagiarism_block(originals, targets) for originals, targets in tasks]
+
+        # Задачи отправляются пачками, чтобы не платить за пересылку каждой по отдельности
+        loop = asyncio.get_running_loop()
+        batches = [tasks[i:i + self.batch_size] for i in range(0, len(tasks), self.batch_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _run_detection_tasks, batch) for batch in batches
+        ))
+        return [block for batch_result in results for block in batch_result]
+
+    def shutdown(self):
+        """Остановка пула процессов"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    """Расстояние Хэмминга между двумя целочисленными хэшами"""
+    return bin(hash1 ^ hash2).count('1')
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Число единичных битов в каждом элементе массива uint64 (SWAR, без таблиц)"""
+    values = values - ((values >> np.uint64(1)) & _M1)
+    values = (values & _M2) + ((values >> np.uint64(2)) & _M2)
+    values = (values + (values >> np.uint64(4))) & _M4
+    return ((values * _H01) >> np.uint64(56)).astype(np.int64)
+
+
+class MultiIndexHammingIndex:
+    """Multi-index hashing: поиск всех хэшей в пределах расстояния Хэмминга k
+
+    Хэш делится на k + 1 непересекающихся блоков. По принципу Дирихле у двух
+    хэшей с расстоянием не больше k хотя бы один блок совпадает точно, поэтому
+    кандидатов достаточно искать по точному совпадению блоков, а затем
+    проверять полное расстояние.
+    """
+
+    def __init__(self, bits: int = 64, max_distance: int = 3, max_items: int = 200000):
+        self.bits = bits
+        self.max_distance = max_distance
+        self.max_items = max_items
+
+        # Границы блоков: k + 1 блоков почти одинаковой длины
+        blocks = max_distance + 1
+        sizes = [bits // blocks + (1 if i < bits % blocks else 0) for i in range(blocks)]
+        self._blocks = []
+        offset = 0
+        for size in sizes:
+            self._blocks.append((offset, (1 << size) - 1))
+            offset += size
+
+        self.hashes: "OrderedDict[Hashable, int]" = OrderedDict()
+        self.tables: List[Dict[int, set]] = [{} for _ in self._blocks]
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.hashes
+
+    def _block_values(self, value: int) -> List[int]:
+        return [(value >> offset) & mask for offset, mask in self._blocks]
+
+    def add(self, key: Hashable, value: int) -> bool:
+        """Добавление хэша в индекс"""
+        if key in self.hashes:
+            return False
+
+        self.hashes[key] = value
+        for table, block in zip(self.tables, self._block_values(value)):
+            table.setdefault(block, set()).add(key)
+
+        while len(self.hashes) > self.max_items:
+            self.remove(next(iter(self.hashes)))
+
+        return True
+
+    def remove(self, key: Hashable):
+        """Удаление хэша из индекса"""
+        value = self.hashes.pop(key, None)
+        if value is None:
+            return
+
+        for table, block in zip(self.tables, self._block_values(value)):
+            bucket = table.get(block)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[block]
+
+    def query(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """Все ключи с расстоянием до value не больше max_distance, по возрастанию расстояния"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        candidates = set()
+        for table, block in zip(self.tables, self._block_values(value)):
+            bucket = table.get(block)
+            if bucket:
+                candidates.update(bucket)
+
+        matches = []
+        for key in candidates:
+            distance = hamming_distance(self.hashes[key], value)
+            if distance <= max_distance:
+                matches.append((key, distance))
+
+        matches.sort(key=lambda item: item[1])
+        return matches
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncImageFetcher:
+    """Асинхронная загрузка изображений через общий пул соединений httpx
+
+    Ограничивает общее число одновременных загрузок и число загрузок
+    на один хост, читает ответ потоком с ограничением размера.
+    """
+
+    def __init__(self, max_concurrency: int = 32, per_host_limit: int = 8,
+                 timeout: float = 10.0, max_bytes: int = 10 * 1024 * 1024):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+        # Клиент и семафоры создаются лениво внутри работающего event loop
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                follow_redirects=True
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._host_semaphores = {}
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def fetch(self, url: str) -> Optional[bytes]:
+        """Загрузка одного изображения; None при ошибке или превышении размера"""
+        client = self._get_client()
+        try:
+            async with self._semaphore, self._host_semaphore(url):
+                async with client.stream('GET', url) as response:
+                    response.raise_for_status()
+
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            logger.warning(f"Изображение {url} больше {self.max_bytes} байт - пропускаем")
+                            return None
+                        chunks.append(chunk)
+
+                    return b''.join(chunks)
+
+        except Exception as e:
+            logger.error(f"Ошибка загрузки изображения {url}: {e}")
+            return None
+
+    async def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """Параллельная загрузка изображений: url -> содержимое"""
+        unique_urls = list(dict.fromkeys(urls))
+        contents = await asyncio.gather(*(self.fetch(url) for url in unique_urls))
+        return dict(zip(unique_urls, contents))
+
+    async def close(self):
+        """Закрытие пула соединений"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+_image_fetcher: Optional[AsyncImageFetcher] = None
+
+
+def get_image_fetcher() -> AsyncImageFetcher:
+    """Общий для процесса загрузчик изображений"""
+    global _image_fetcher
+    if _image_fetcher is None:
+        _image_fetcher = AsyncImageFetcher(
+            max_concurrency=settings.IMAGE_FETCH_CONCURRENCY,
+            per_host_limit=settings.IMAGE_FETCH_PER_HOST_LIMIT,
+            timeout=settings.IMAGE_FETCH_TIMEOUT_SECONDS,
+            max_bytes=settings.IMAGE_FETCH_MAX_BYTES
+        )
+    return _image_fetcher
+
+
+async def close_image_fetcher():
+    """Закрытие общего загрузчика при остановке приложения"""
+    if _image_fetcher is not None:
+        await _image_fetcher.close()
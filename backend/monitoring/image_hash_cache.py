@@ -0,0 +1,138 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ImageHashCache:
+    """Дисковый кэш перцептивных хэшей изображений по стабильному id фото VK (owner_id_id)
+
+    Ссылки на CDN VK со временем протухают, поэтому ключом служит id фото,
+    а не URL. Для каждого фото хранится дешевый dHash, миниатюра 32×32 в
+    оттенках серого и pHash, посчитанный по миниатюре (в записях старого
+    формата он может отсутствовать). Записи вытесняются по возрасту
+    (ttl_hours) и по размеру (max_size, сначала давно не использованные).
+    """
+
+    def __init__(self, path: str, ttl_hours: int = 24, max_size: int = 1000, evict_every: int = 100):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_size = max_size
+        self.evict_every = evict_every
+        self._writes_since_eviction = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+
+        # Кэш прежнего формата (только pHash) пересоздается - его можно заполнить заново
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(image_hashes)")}
+        if columns and 'dhash' not in columns:
+            self._connection.execute("DROP TABLE image_hashes")
+
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                photo_id TEXT PRIMARY KEY,
+                dhash TEXT NOT NULL,
+                thumbnail BLOB,
+                phash TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_image_hashes_accessed_at ON image_hashes (accessed_at)"
+        )
+        self._connection.commit()
+
+    def get(self, photo_id: str) -> Optional[Dict]:
+        """Хэши фото {'dhash', 'phash', 'thumbnail'} или None, если их нет или они устарели"""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT dhash, phash, thumbnail, created_at FROM image_hashes WHERE photo_id = ?",
+                (photo_id,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            if now - row[3] > self.ttl_seconds:
+                self._connection.execute("DELETE FROM image_hashes WHERE photo_id = ?", (photo_id,))
+                self._connection.commit()
+                return None
+
+            self._connection.execute(
+                "UPDATE image_hashes SET accessed_at = ? WHERE photo_id = ?",
+                (now, photo_id)
+            )
+            self._connection.commit()
+            return {'dhash': row[0], 'phash': row[1], 'thumbnail': row[2]}
+
+    def set(self, photo_id: str, dhash: str, thumbnail: Optional[bytes] = None, phash: Optional[str] = None):
+        """Сохранение dHash и миниатюры фото (pHash - если уже посчитан)"""
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO image_hashes (photo_id, dhash, thumbnail, phash, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (photo_id, dhash, thumbnail, phash, now, now)
+            )
+            self._connection.commit()
+
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= self.evict_every:
+                self._evict()
+
+    def set_phash(self, photo_id: str, phash: str):
+        """Сохранение pHash, посчитанного позже по миниатюре, для уже закэшированного фото"""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE image_hashes SET phash = ? WHERE photo_id = ?",
+                (phash, photo_id)
+            )
+            self._connection.commit()
+
+    def evict(self):
+        """Удаление устаревших записей и записей сверх лимита размера"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        self._writes_since_eviction = 0
+        try:
+            self._connection.execute(
+                "DELETE FROM image_hashes WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            self._connection.execute(
+                """
+                DELETE FROM image_hashes WHERE photo_id IN (
+                    SELECT photo_id FROM image_hashes
+                    ORDER BY accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_size,)
+            )
+            self._connection.commit()
+        except Exception as e:
+            logger.error(f"Ошибка очистки кэша хэшей изображений: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM image_hashes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
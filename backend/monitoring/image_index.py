@@ -0,0 +1,174 @@
+import os
+import pickle
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monitoring.hamming_index import popcount64
+
+logger = logging.getLogger(__name__)
+
+
+class ImageHashIndex:
+    """Глобальный индекс dHash всех фото, которые видел мониторинг
+
+    Для нового фото одним запросом находит все сохраненные фото в пределах
+    порога Хэмминга вместе с постами, в которых они опубликованы. Индекс
+    служит предфильтром: совпадения подтверждаются по pHash при детекции.
+
+    Хэши лежат подряд в массиве uint64, запрос - линейный проход XOR +
+    popcount по всему массиву. Деревья и таблицы по блокам при радиусе
+    порядка 10-16 бит из 64 почти ничего не отсекают, а проход по 500 000
+    хэшей занимает миллисекунды и отпускает GIL, поэтому его можно
+    выполнять в пуле потоков. Слоты вытесненных фото не переиспользуются до
+    перестроения массива, так что запрос по снимку (массив, размер, слоты)
+    согласован, даже если индекс пополняется во время запроса.
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, max_distance: int = 12, max_photos: int = 500000):
+        self.max_distance = max_distance
+        self.max_photos = max_photos
+
+        # Хэши по слотам; слот -> photo_id (None - фото вытеснено)
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._slot_photos: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        # photo_id -> (хэш, key поста); порядок вставки - для вытеснения старых фото
+        self.photos: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        # key поста -> компактные признаки поста
+        self.posts: Dict[str, Any] = {}
+        self._post_photo_counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.photos)
+
+    def add_post(self, post: Any) -> int:
+        """Добавление всех фото поста с уже вычисленными dHash"""
+        added = 0
+        for photo_id in post.image_ids:
+            dhash = post.image_dhashes.get(photo_id)
+            if dhash is None or photo_id in self.photos:
+                continue
+
+            self._add_photo(photo_id, int(dhash, 16), post.key)
+            added += 1
+
+        if added:
+            self.posts[post.key] = post
+            self._evict()
+
+        return added
+
+    def query(self, dhash: str, max_distance: Optional[int] = None) -> List[Tuple[str, str, int]]:
+        """Похожие фото: список (photo_id, key поста, расстояние) по возрастанию расстояния"""
+        return self.query_many([dhash], max_distance)[0]
+
+    def query_many(self, dhashes: List[str], max_distance: Optional[int] = None) -> List[List[Tuple[str, str, int]]]:
+        """Похожие фото для каждого хэша; безопасно вызывать из пула потоков"""
+        if max_distance is None:
+            max_distance = self.max_distance
+
+        # Снимок: добавления пишут только за его пределы, перестроение создает новые объекты
+        hashes, slot_photos = self._hashes, self._slot_photos
+        size = len(slot_photos)
+
+        results = []
+        for dhash in dhashes:
+            distances = popcount64(np.bitwise_xor(hashes[:size], np.uint64(int(dhash, 16))))
+            slots = np.flatnonzero(distances <= max_distance)
+            slots = slots[np.argsort(distances[slots], kind='stable')]
+
+            matches = []
+            for slot in slots.tolist():
+                photo_id = slot_photos[slot]
+                entry = self.photos.get(photo_id) if photo_id is not None else None
+                if entry is not None:
+                    matches.append((photo_id, entry[1], int(distances[slot])))
+            results.append(matches)
+
+        return results
+
+    def _add_photo(self, photo_id: str, value: int, post_key: str):
+        slot = len(self._slot_photos)
+        if slot == len(self._hashes):
+            grown = np.zeros(2 * len(self._hashes), dtype=np.uint64)
+            grown[:slot] = self._hashes
+            self._hashes = grown
+
+        self._hashes[slot] = value
+        self._slot_photos.append(photo_id)
+        self._slots[photo_id] = slot
+        self.photos[photo_id] = (value, post_key)
+        self._post_photo_counts[post_key] = self._post_photo_counts.get(post_key, 0) + 1
+
+    def _evict(self):
+        """Вытеснение старых фото; массив перестраивается, когда в нем много пустых слотов"""
+        while len(self.photos) > self.max_photos:
+            photo_id, (_, post_key) = self.photos.popitem(last=False)
+            self._slot_photos[self._slots.pop(photo_id)] = None
+            self._post_photo_counts[post_key] -= 1
+            if self._post_photo_counts[post_key] <= 0:
+                del self._post_photo_counts[post_key]
+                self.posts.pop(post_key, None)
+
+        if len(self._slot_photos) > 2 * max(len(self.photos), 1):
+            self._rebuild()
+
+    def _rebuild(self):
+        """Плотный массив без слотов вытесненных фото - новые объекты, старые снимки остаются целыми"""
+        self._hashes = np.zeros(max(1024, 2 * len(self.photos)), dtype=np.uint64)
+        self._hashes[:len(self.photos)] = np.fromiter(
+            (value for value, _ in self.photos.values()), dtype=np.uint64, count=len(self.photos)
+        )
+        self._slot_photos = list(self.photos)
+        self._slots = {photo_id: slot for slot, photo_id in enumerate(self._slot_photos)}
+
+    def snapshot(self) -> Dict:
+        """Копия состояния для сохранения в другом потоке, пока индекс пополняется"""
+        return {'version': self.FORMAT_VERSION, 'photos': list(self.photos.items()), 'posts': dict(self.posts)}
+
+    @staticmethod
+    def write_snapshot(state: Dict, path: str):
+        """Атомарная запись снимка на диск: временный файл и переименование"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def save(self, path: str):
+        """Сохранение индекса на диск"""
+        self.write_snapshot(self.snapshot(), path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'ImageHashIndex':
+        """Загрузка индекса с диска; при отсутствии - пустой индекс"""
+        index = cls(**kwargs)
+        if not os.path.exists(path):
+            return index
+
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+
+            if state.get('version') != cls.FORMAT_VERSION:
+                logger.info("Индекс изображений сохранен в старом формате - строится заново")
+                return index
+
+            index.posts = state.get('posts', {})
+            for photo_id, (value, post_key) in state.get('photos', []):
+                index._add_photo(photo_id, value, post_key)
+
+            logger.info(f"Индекс изображений загружен: {len(index)} фото")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки индекса изображений {path}: {e}")
+            index = cls(**kwargs)
+
+        return index
@@ -0,0 +1,196 @@
+import os
+import pickle
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monitoring.text_fingerprints import shingle_hashes
+
+logger = logging.getLogger(__name__)
+
+
+class MinHashLSHIndex:
+    """Индекс MinHash-сигнатур с LSH-бандингом для быстрого поиска кандидатов"""
+
+    # Версия формата сохраненного индекса (2 - посты хранятся как PostFeatures)
+    FORMAT_VERSION = 2
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, shingle_size: int = 5,
+                 shingle_mode: str = 'char', max_posts: int = 200000,
+                 max_candidates: int = 50, seed: int = 42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm должно делиться на bands без остатка")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.shingle_mode = shingle_mode
+        self.max_posts = max_posts
+        self.max_candidates = max_candidates
+        self.seed = seed
+
+        # Хэш-функции вида (a * x + b) >> 32 по модулю 2^64, a - нечетное
+        rng = np.random.RandomState(seed)
+        self._a = (rng.randint(0, 2 ** 62, size=num_perm, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self._b = rng.randint(0, 2 ** 62, size=num_perm, dtype=np.uint64)
+
+        # key -> сигнатура; порядок вставки используется для вытеснения старых постов
+        self.signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # key -> компактные признаки поста для верификации детектором
+        self.posts: Dict[str, Any] = {}
+        # Бакеты LSH: по одному словарю на каждый бэнд
+        self.buckets: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.signatures
+
+    def shingle_hashes(self, clean_text: str) -> np.ndarray:
+        """Хэши шинглов очищенного текста с параметрами индекса"""
+        return shingle_hashes(clean_text, self.shingle_size, self.shingle_mode)
+
+    def signature(self, hashes: np.ndarray) -> Optional[np.ndarray]:
+        """MinHash-сигнатура по хэшам шинглов"""
+        if hashes is None or not len(hashes):
+            return None
+
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def add(self, key: str, hashes: np.ndarray, post: Optional[Any] = None) -> bool:
+        """Добавление поста в индекс по хэшам шинглов"""
+        if key in self.signatures:
+            return False
+
+        signature = self.signature(hashes)
+        if signature is None:
+            return False
+
+        self.signatures[key] = signature
+        if post is not None:
+            self.posts[key] = post
+
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+
+        while len(self.signatures) > self.max_posts:
+            self.remove(next(iter(self.signatures)))
+
+        return True
+
+    def remove(self, key: str):
+        """Удаление поста из индекса"""
+        signature = self.signatures.pop(key, None)
+        self.posts.pop(key, None)
+        if signature is None:
+            return
+
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def query(self, hashes: np.ndarray, exclude_key: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Поиск кандидатов: список (key, оценка Жаккара), отсортированный по убыванию"""
+        signature = self.signature(hashes)
+        if signature is None:
+            return []
+
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band].get(band_key)
+            if bucket:
+                candidates.update(bucket)
+
+        candidates.discard(exclude_key)
+
+        scored = [
+            (key, float(np.count_nonzero(self.signatures[key] == signature)) / self.num_perm)
+            for key in candidates
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:self.max_candidates]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """Ключи бакетов для каждого бэнда сигнатуры"""
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def snapshot(self) -> Dict:
+        """Копия состояния для сохранения в другом потоке, пока индекс пополняется"""
+        return {
+            'params': {
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                'shingle_size': self.shingle_size,
+                'shingle_mode': self.shingle_mode,
+                'seed': self.seed,
+                'format': self.FORMAT_VERSION,
+            },
+            'signatures': list(self.signatures.items()),
+            'posts': dict(self.posts),
+        }
+
+    @staticmethod
+    def write_snapshot(state: Dict, path: str):
+        """Атомарная запись снимка на диск: временный файл и переименование"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def save(self, path: str):
+        """Сохранение индекса на диск"""
+        self.write_snapshot(self.snapshot(), path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'MinHashLSHIndex':
+        """Загрузка индекса с диска; при отсутствии или несовместимости - пустой индекс"""
+        index = cls(**kwargs)
+        if not os.path.exists(path):
+            return index
+
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+
+            params = state.get('params', {})
+            expected = {
+                'num_perm': index.num_perm,
+                'bands': index.bands,
+                'shingle_size': index.shingle_size,
+                'shingle_mode': index.shingle_mode,
+                'seed': index.seed,
+                'format': index.FORMAT_VERSION,
+            }
+            if params != expected:
+                logger.warning("Параметры MinHash-индекса изменились - индекс будет построен заново")
+                return index
+
+            posts = state.get('posts', {})
+            for key, signature in state.get('signatures', []):
+                index.signatures[key] = signature
+                if key in posts:
+                    index.posts[key] = posts[key]
+                for band, band_key in enumerate(index._band_keys(signature)):
+                    index.buckets[band].setdefault(band_key, set()).add(key)
+
+            logger.info(f"MinHash-индекс загружен: {len(index)} постов")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки MinHash-индекса {path}: {e}")
+            index = cls(**kwargs)
+
+        return index
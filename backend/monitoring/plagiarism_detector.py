@@ -1,89 +1,287 @@
 import re
-from typing import List, Dict, Tuple, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+import hashlib
+from typing import List, Dict, Tuple, Optional, Union
 import imagehash
 from PIL import Image
-import requests
 from io import BytesIO
 import numpy as np
+from scipy import sparse
 from config.settings import settings
 from datetime import datetime, timedelta
 from difflib import SequenceMatcher
+from monitoring.tfidf_model import CorpusTfidfModel
+from monitoring.text_fingerprints import kgram_hashes, shingle_hashes, kgram_coverage_similarity, simhash
+from monitoring.post_features import PostFeatures
+from monitoring.image_hash_cache import ImageHashCache
+from monitoring.image_fetcher import get_image_fetcher
+from monitoring.hamming_index import popcount64
+
+PostLike = Union[Dict, PostFeatures]
+
+# Расстояние для фото без хэша - заведомо больше любого порога
+MISSING_HASH_DISTANCE = 999
+
+
+def image_hashes_to_array(hashes: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """64-битные pHash (hex) в массив uint64 и маску наличия хэша"""
+    values = np.zeros(len(hashes), dtype=np.uint64)
+    present = np.zeros(len(hashes), dtype=bool)
+    for i, phash in enumerate(hashes):
+        if phash is not None:
+            values[i] = int(phash, 16)
+            present[i] = True
+    return values, present
+
+
+def hamming_distance_matrix(hashes1: np.ndarray, hashes2: np.ndarray) -> np.ndarray:
+    """Матрица расстояний Хэмминга K×N между массивами uint64: XOR + popcount"""
+    return popcount64(np.bitwise_xor(hashes1[:, None], hashes2[None, :]))
 
 
 class PlagiarismDetector:
+    # Типы размеров фото VK: обрезанные варианты и порядок несжатых по возрастанию
+    CROPPED_PHOTO_TYPES = ('o', 'p', 'q', 'r')
+    PHOTO_TYPE_ORDER = 'smxyzw'
+    # Наибольшая сторона несжатых вариантов по документации VK API
+    PHOTO_TYPE_MAX_SIDE = {'s': 75, 'm': 130, 'x': 604, 'y': 807, 'z': 1080, 'w': 2560}
+    
     def __init__(self):
         # Настройки для MVP
         self.text_similarity_threshold = 0.7  # 70% как в требованиях
         self.image_hamming_threshold = 10    # Расстояние Хэмминга ≤10
+        self.image_dhash_threshold = settings.IMAGE_DHASH_THRESHOLD  # Предфильтр по dHash
         self.min_text_length = 20            # Минимальная длина для анализа
+        self.image_min_size = settings.IMAGE_HASH_MIN_SIZE  # Минимальная сторона фото для хэширования
         
-        # Векторизатор для семантического анализа
-        self.text_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        # Символьное сравнение: sequence (SequenceMatcher), kgram (покрытие общими k-граммами)
+        # или auto - SequenceMatcher для коротких текстов, k-граммы для длинных
+        self.char_similarity_mode = settings.CHAR_SIMILARITY_MODE
+        self.max_sequence_length = settings.CHAR_SIMILARITY_MAX_SEQUENCE_LENGTH
+        self.kgram_size = 5
+        
+        # Каскад текстовых проверок: дорогие стадии пропускаются, когда плагиат уже доказан
+        self.use_text_cascade = settings.TEXT_CASCADE_ENABLED
+        
+        # TF-IDF модель по всему корпусу для семантического анализа
+        self.tfidf_model = CorpusTfidfModel.load(settings.TFIDF_MODEL_PATH)
+        
+        # Дисковый кэш dHash/pHash по id фото VK
+        try:
+            self.image_hash_cache = ImageHashCache(
+                settings.IMAGE_HASH_CACHE_PATH,
+                ttl_hours=settings.CACHE_DURATION_HOURS,
+                max_size=settings.MAX_CACHE_SIZE
+            )
+        except Exception as e:
+            print(f"Кэш хэшей изображений недоступен: {e}")
+            self.image_hash_cache = None
     
-    def detect_plagiarism(self, original_post: Dict, target_post: Dict) -> Dict:
+    def detect_plagiarism(self, original_post: PostLike, target_post: PostLike) -> Dict:
         """Основной метод детекции плагиата по правилам MVP"""
+        original = self.extract_features(original_post)
+        target = self.extract_features(target_post)
         
         # Проверяем, не является ли пост репостом
-        if self.is_repost(target_post):
+        if target.is_repost:
             return self._create_no_plagiarism_result("Пост является репостом")
         
         # Проверяем даты публикации
-        if not self._is_posted_after_original(original_post, target_post):
+        if not self._is_posted_after_original(original, target):
             return self._create_no_plagiarism_result("Пост опубликован раньше оригинала")
         
         # Проверяем наличие ссылки на оригинал
-        if self._has_original_attribution(target_post, original_post):
+        if self._has_original_attribution(target, original):
             return self._create_no_plagiarism_result("Пост содержит ссылку на оригинал")
         
         # Анализируем текст
-        text_analysis = self._analyze_text_plagiarism_mvp(
-            original_post.get('text', ''),
-            target_post.get('text', '')
-        )
+        text_analysis = self._analyze_text_features(original, target)
         
         # Анализируем изображения
-        image_analysis = self._analyze_image_plagiarism_mvp(
-            original_post.get('attachments', []),
-            target_post.get('attachments', [])
-        )
+        image_analysis = self._analyze_image_plagiarism_mvp(original, target)
         
         # Финальная оценка по правилам MVP
-        result = self._final_evaluation_mvp(text_analysis, image_analysis, original_post, target_post)
+        result = self._final_evaluation_mvp(text_analysis, image_analysis, original, target)
         
         return result
     
+    def extract_features(self, post: PostLike) -> PostFeatures:
+        """Однократное вычисление признаков поста для всех последующих сравнений"""
+        if isinstance(post, PostFeatures):
+            return post
+        
+        text = post.get('text', '') or ''
+        clean_text = self._clean_text(text)
+        hashes = shingle_hashes(clean_text, self.kgram_size)
+        image_refs = self._extract_image_refs(post.get('attachments', []))
+        
+        return PostFeatures(
+            owner_id=post.get('owner_id'),
+            post_id=post.get('id'),
+            date=post.get('date', 0) or 0,
+            text=text,
+            clean_text=clean_text,
+            text_hash=self._normalized_text_hash(clean_text),
+            words=frozenset(clean_text.lower().split()),
+            shingle_hashes=hashes,
+            simhash=simhash(hashes),
+            image_ids=tuple(image_id for image_id, _ in image_refs),
+            image_urls=tuple(url for _, url in image_refs),
+            is_repost=self.is_repost(post)
+        )
+    
+    def detect_plagiarism_batch(self, target_post: PostLike, candidate_posts: List[PostLike]) -> List[Dict]:
+        """Проверка одного поста против N возможных оригиналов за один проход
+        
+        Результат i совпадает с detect_plagiarism(candidate_posts[i], target_post).
+        """
+        return [row[0] for row in self.detect_plagiarism_block(candidate_posts, [target_post])]
+    
+    def detect_plagiarism_block(self, original_posts: List[PostLike],
+                                target_posts: List[PostLike]) -> List[List[Dict]]:
+        """Проверка блока N оригиналов × M постов
+        
+        Признаки вычисляются один раз на пост, семантическая схожесть и коэффициент
+        Жаккара считаются матричными операциями для всех пар сразу.
+        Результат [i][j] совпадает с detect_plagiarism(original_posts[i], target_posts[j]).
+        """
+        if not original_posts or not target_posts:
+            return [[] for _ in original_posts]
+        
+        originals = [self.extract_features(post) for post in original_posts]
+        targets = [self.extract_features(post) for post in target_posts]
+        
+        original_dates = np.array([features.date for features in originals], dtype=np.int64)
+        target_dates = np.array([features.date for features in targets], dtype=np.int64)
+        posted_after = target_dates[None, :] > original_dates[:, None]
+        
+        original_long = np.array([len(f.clean_text) >= self.min_text_length for f in originals])
+        target_long = np.array([len(f.clean_text) >= self.min_text_length for f in targets])
+        text_mask = original_long[:, None] & target_long[None, :]
+        
+        semantic_matrix = np.zeros(text_mask.shape)
+        fuzzy_matrix = np.zeros(text_mask.shape)
+        if text_mask.any():
+            semantic_matrix = self._calculate_semantic_similarity_matrix(
+                [f.clean_text for f in originals], [f.clean_text for f in targets]
+            )
+            fuzzy_matrix = self._calculate_fuzzy_similarity_matrix(
+                [f.words for f in originals], [f.words for f in targets]
+            )
+        
+        results = []
+        for i, original in enumerate(originals):
+            row = []
+            for j, target in enumerate(targets):
+                if target.is_repost:
+                    row.append(self._create_no_plagiarism_result("Пост является репостом"))
+                    continue
+                
+                if not posted_after[i, j]:
+                    row.append(self._create_no_plagiarism_result("Пост опубликован раньше оригинала"))
+                    continue
+                
+                if self._has_original_attribution(target, original):
+                    row.append(self._create_no_plagiarism_result("Пост содержит ссылку на оригинал"))
+                    continue
+                
+                if text_mask[i, j]:
+                    text_analysis = self._run_text_cascade(
+                        original, target,
+                        fuzzy_similarity=float(fuzzy_matrix[i, j]),
+                        semantic_similarity=float(semantic_matrix[i, j])
+                    )
+                else:
+                    text_analysis = self._create_short_text_result()
+                
+                image_analysis = self._analyze_image_plagiarism_mvp(original, target)
+                
+                row.append(self._final_evaluation_mvp(text_analysis, image_analysis, original, target))
+            results.append(row)
+        
+        return results
+    
     def _analyze_text_plagiarism_mvp(self, original_text: str, target_text: str) -> Dict:
         """Анализ текстового плагиата по правилам MVP"""
-        
-        # Очистка текстов
-        original_clean = self._clean_text(original_text)
-        target_clean = self._clean_text(target_text)
+        return self._analyze_text_features(
+            self.extract_features({'text': original_text}),
+            self.extract_features({'text': target_text})
+        )
+    
+    def _analyze_text_features(self, original: PostFeatures, target: PostFeatures) -> Dict:
+        """Анализ текстового плагиата по заранее вычисленным признакам"""
         
         # Проверка минимальной длины
-        if len(original_clean) < self.min_text_length or len(target_clean) < self.min_text_length:
-            return {
-                'similarity': 0.0,
-                'is_plagiarism': False,
-                'reason': 'Недостаточная длина текста для анализа'
-            }
+        if len(original.clean_text) < self.min_text_length or len(target.clean_text) < self.min_text_length:
+            return self._create_short_text_result()
         
-        # 1. Символьное сравнение (по символам)
-        char_similarity = self._calculate_char_similarity(original_clean, target_clean)
-        
-        # 2. Семантическое сравнение (по смыслу)
-        semantic_similarity = self._calculate_semantic_similarity(original_clean, target_clean)
-        
-        # 3. Fuzzy match (Levenshtein)
-        fuzzy_similarity = self._calculate_fuzzy_similarity(original_clean, target_clean)
-        
-        # Выбираем максимальную схожесть
-        text_similarity = max(char_similarity, semantic_similarity, fuzzy_similarity)
+        return self._run_text_cascade(original, target)
+    
+    def _run_text_cascade(self, original: PostFeatures, target: PostFeatures,
+                          fuzzy_similarity: Optional[float] = None,
+                          semantic_similarity: Optional[float] = None) -> Dict:
+        """Каскад текстовых проверок от дешевых к дорогим с ранним выходом
+        
+        Итоговая схожесть - максимум метрик, поэтому выйти раньше можно только
+        с положительным решением: любая метрика не ниже порога доказывает
+        плагиат. Для отрицательного решения нужны все метрики, включая
+        семантическую - у нее нет дешевой верхней границы. Поэтому решение
+        каскада всегда совпадает с полным расчетом, а при отказе совпадает и
+        схожесть. Символьное сравнение пропускается, только когда граница по
+        длинам ниже порога - полный расчет в этом случае тоже дает 0.
+        
+        Заранее посчитанные fuzzy/semantic схожести (пакетный режим) используются
+        вместо повторного вычисления, но попадают в результат только если
+        соответствующая стадия была бы выполнена.
+        """
+        original_clean, target_clean = original.clean_text, target.clean_text
+        threshold = self.text_similarity_threshold
+        
+        if not self.use_text_cascade:
+            # Без каскада считаем все метрики
+            char_similarity = self._calculate_char_similarity(original_clean, target_clean)
+            if semantic_similarity is None:
+                semantic_similarity = self._calculate_semantic_similarity(original_clean, target_clean)
+            if fuzzy_similarity is None:
+                fuzzy_similarity = self._jaccard_similarity(original.words, target.words)
+            return self._create_text_result(
+                char_similarity, semantic_similarity, fuzzy_similarity,
+                ['jaccard', 'char', 'semantic'], None
+            )
+        
+        # 1. Точное совпадение нормализованного текста
+        stages = ['exact_hash']
+        if original.text_hash == target.text_hash:
+            return self._create_text_result(1.0, 1.0, 1.0, stages, 'exact_hash')
+        
+        # 2. Жаккар по словам: уверенный плагиат
+        stages.append('jaccard')
+        if fuzzy_similarity is None:
+            fuzzy_similarity = self._jaccard_similarity(original.words, target.words)
+        if fuzzy_similarity >= threshold:
+            return self._create_text_result(None, None, fuzzy_similarity, stages, 'jaccard')
+        
+        # 3. Символьное сравнение, если граница по длинам допускает схожесть выше порога
+        char_similarity = 0.0
+        if self._char_similarity_upper_bound(len(original_clean), len(target_clean)) >= threshold:
+            stages.append('char')
+            char_similarity = self._calculate_char_similarity(original_clean, target_clean)
+            if char_similarity >= threshold:
+                return self._create_text_result(char_similarity, None, fuzzy_similarity, stages, 'char')
+        
+        # 4. Самая дорогая стадия: семантическое сравнение
+        stages.append('semantic')
+        if semantic_similarity is None:
+            semantic_similarity = self._calculate_semantic_similarity(original_clean, target_clean)
+        return self._create_text_result(char_similarity, semantic_similarity, fuzzy_similarity, stages, 'semantic')
+    
+    def _create_text_result(self, char_similarity: Optional[float], semantic_similarity: Optional[float],
+                            fuzzy_similarity: Optional[float], stages: Optional[List[str]] = None,
+                            decided_by: Optional[str] = None) -> Dict:
+        """Результат текстового анализа; None - метрика не вычислялась"""
+        # Выбираем максимальную схожесть среди вычисленных
+        computed = [value for value in (char_similarity, semantic_similarity, fuzzy_similarity) if value is not None]
+        text_similarity = max(computed) if computed else 0.0
         
         return {
             'similarity': text_similarity,
@@ -91,14 +289,24 @@ class PlagiarismDetector:
             'semantic_similarity': semantic_similarity,
             'fuzzy_similarity': fuzzy_similarity,
             'is_plagiarism': text_similarity >= self.text_similarity_threshold,
-            'reason': self._get_text_plagiarism_reason(text_similarity)
+            'reason': self._get_text_plagiarism_reason(text_similarity),
+            'stages': stages or [],
+            'decided_by': decided_by
         }
     
-    def _analyze_image_plagiarism_mvp(self, original_attachments: List, target_attachments: List) -> Dict:
+    def _create_short_text_result(self) -> Dict:
+        """Результат текстового анализа для слишком коротких текстов"""
+        return {
+            'similarity': 0.0,
+            'is_plagiarism': False,
+            'reason': 'Недостаточная длина текста для анализа'
+        }
+    
+    def _analyze_image_plagiarism_mvp(self, original: PostFeatures, target: PostFeatures) -> Dict:
         """Анализ плагиата изображений по правилам MVP"""
         
-        original_images = self._extract_images(original_attachments)
-        target_images = self._extract_images(target_attachments)
+        original_images = original.image_urls
+        target_images = target.image_urls
         
         if not original_images or not target_images:
             return {
@@ -107,31 +315,57 @@ class PlagiarismDetector:
                 'reason': 'Нет изображений для сравнения'
             }
         
-        # Сравниваем каждое изображение
+        # Стадия 1: дешевый dHash по всем парам отсекает заведомо разные изображения
+        original_dhashes = [
+            self._get_image_dhash_hex(photo_id, url, original)
+            for photo_id, url in zip(original.image_ids, original_images)
+        ]
+        target_dhashes = [
+            self._get_image_dhash_hex(photo_id, url, target)
+            for photo_id, url in zip(target.image_ids, target_images)
+        ]
+        prefilter = self.compare_image_hashes_batch(
+            original_dhashes, target_dhashes, threshold=self.image_dhash_threshold
+        )
+        passed = prefilter['distances'] <= self.image_dhash_threshold
+        
+        # Стадия 2: pHash сравнивается только для фото из прошедших пар
+        distances = np.full(passed.shape, MISSING_HASH_DISTANCE, dtype=np.int64)
+        if passed.any():
+            rows = np.flatnonzero(passed.any(axis=1))
+            cols = np.flatnonzero(passed.any(axis=0))
+            original_hashes = [
+                self._get_image_phash_hex(original.image_ids[i], original_images[i], original) for i in rows
+            ]
+            target_hashes = [
+                self._get_image_phash_hex(target.image_ids[j], target_images[j], target) for j in cols
+            ]
+            confirmation = self.compare_image_hashes_batch(original_hashes, target_hashes)
+            block = np.ix_(rows, cols)
+            distances[block] = np.where(passed[block], confirmation['distances'], MISSING_HASH_DISTANCE)
+        
+        # Лучшая пара - с минимальным расстоянием pHash (первая при равенстве)
+        i, j = np.unravel_index(np.argmin(distances), distances.shape)
+        best_distance = int(distances[i, j])
+        
         max_similarity = 0.0
         best_match = None
-        plagiarism_found = False
-        
-        for orig_img in original_images:
-            for target_img in target_images:
-                # Вычисляем perceptual hash
-                similarity, hamming_distance = self._compare_images_phash(orig_img, target_img)
-                
-                if hamming_distance <= self.image_hamming_threshold:
-                    plagiarism_found = True
-                    if similarity > max_similarity:
-                        max_similarity = similarity
-                        best_match = (orig_img, target_img, hamming_distance)
+        plagiarism_found = best_distance <= self.image_hamming_threshold
+        if plagiarism_found:
+            max_similarity = max(0.0, min(1.0, 1 - best_distance / 64))
+            best_match = (original_images[i], target_images[j], best_distance)
         
         return {
             'similarity': max_similarity,
             'is_plagiarism': plagiarism_found,
             'reason': self._get_image_plagiarism_reason(max_similarity, best_match[2] if best_match else None),
-            'best_match': best_match
+            'best_match': best_match,
+            'pairs_total': int(passed.size),
+            'pairs_confirmed': int(passed.sum())
         }
     
     def _final_evaluation_mvp(self, text_analysis: Dict, image_analysis: Dict, 
-                             original_post: Dict, target_post: Dict) -> Dict:
+                             original_post: PostFeatures, target_post: PostFeatures) -> Dict:
         """Финальная оценка по правилам MVP"""
         
         # Определяем плагиат по правилам MVP
@@ -147,15 +381,21 @@ class PlagiarismDetector:
         # Плагиат если есть плагиат текста ИЛИ изображений
         is_plagiarism = text_plagiarism or image_plagiarism
         
+        # Уверенность - схожесть по самому сильному признаку
+        confidence = max(text_analysis['similarity'], image_analysis['similarity'])
+        
         return {
             'is_plagiarism': is_plagiarism,
             'overall_similarity': overall_similarity,
+            'confidence': confidence,
             'text_similarity': text_analysis['similarity'],
             'image_similarity': image_analysis['similarity'],
             'text_plagiarism': text_plagiarism,
             'image_plagiarism': image_plagiarism,
             'text_reason': text_analysis['reason'],
             'image_reason': image_analysis['reason'],
+            'text_stages': text_analysis.get('stages', []),
+            'text_decided_by': text_analysis.get('decided_by'),
             'recommendation': self._get_mvp_recommendation(is_plagiarism, text_plagiarism, image_plagiarism)
         }
     
@@ -164,47 +404,213 @@ class PlagiarismDetector:
         if not text1 or not text2:
             return 0.0
         
-        # Используем SequenceMatcher для символьного сравнения
-        return SequenceMatcher(None, text1, text2).ratio()
+        # Быстрый отказ: даже полное совпадение короткого текста с частью
+        # длинного не дает схожести выше 2 * min / (len1 + len2)
+        if self._char_similarity_upper_bound(len(text1), len(text2)) < self.text_similarity_threshold:
+            return 0.0
+        
+        mode = self.char_similarity_mode
+        if mode == 'auto':
+            long_text = max(len(text1), len(text2)) > self.max_sequence_length
+            mode = 'kgram' if long_text else 'sequence'
+        
+        if mode == 'kgram':
+            return self._calculate_kgram_similarity(text1, text2)
+        
+        # Используем SequenceMatcher для символьного сравнения. Эвристика autojunk
+        # на текстах от 200 символов отбрасывает все частые буквы и занижает схожесть почти до 0
+        return SequenceMatcher(None, text1, text2, autojunk=False).ratio()
+    
+    @staticmethod
+    def _char_similarity_upper_bound(length1: int, length2: int) -> float:
+        """Верхняя граница символьной схожести по длинам текстов"""
+        if not length1 or not length2:
+            return 0.0
+        return 2.0 * min(length1, length2) / (length1 + length2)
+    
+    def _calculate_kgram_similarity(self, text1: str, text2: str) -> float:
+        """Символьное сравнение по покрытию общими k-граммами, почти линейное по длине
+        
+        На текстах с заменой, вставкой и удалением слов отличается от
+        SequenceMatcher в среднем на 0.02, поэтому оба режима работают с общим
+        порогом text_similarity_threshold (tests/test_char_similarity.py).
+        """
+        return kgram_coverage_similarity(
+            kgram_hashes(text1.lower(), self.kgram_size), kgram_hashes(text2.lower(), self.kgram_size), self.kgram_size
+        )
     
     def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """Семантическое сравнение текстов"""
         try:
-            tfidf_matrix = self.text_vectorizer.fit_transform([text1, text2])
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            return float(similarity)
+            return self.tfidf_model.similarity(text1, text2)
         except Exception:
             return 0.0
     
-    def _calculate_fuzzy_similarity(self, text1: str, text2: str) -> float:
-        """Fuzzy match с использованием Levenshtein"""
-        from difflib import SequenceMatcher
+    def _calculate_semantic_similarity_matrix(self, texts1: List[str], texts2: List[str]) -> np.ndarray:
+        """Семантическое сравнение всех пар текстов одним умножением матриц"""
+        try:
+            return self.tfidf_model.similarity_matrix(texts1, texts2)
+        except Exception:
+            return np.zeros((len(texts1), len(texts2)))
+    
+    def _calculate_fuzzy_similarity_matrix(self, words1: List[frozenset], words2: List[frozenset]) -> np.ndarray:
+        """Коэффициент Жаккара для всех пар множеств слов через разреженные матрицы"""
+        vocabulary = {}
+        
+        def word_rows(word_sets: List[frozenset]) -> Tuple[List[int], List[int]]:
+            indptr, indices = [0], []
+            for words in word_sets:
+                indices.extend(vocabulary.setdefault(word, len(vocabulary)) for word in words)
+                indptr.append(len(indices))
+            return indices, indptr
+        
+        rows1 = word_rows(words1)
+        rows2 = word_rows(words2)
+        matrix1, matrix2 = (
+            sparse.csr_matrix(
+                (np.ones(len(indices)), indices, indptr),
+                shape=(len(indptr) - 1, len(vocabulary))
+            )
+            for indices, indptr in (rows1, rows2)
+        )
+        
+        intersection = (matrix1 @ matrix2.T).toarray()
+        sizes1 = np.array([len(words) for words in words1], dtype=np.float64)
+        sizes2 = np.array([len(words) for words in words2], dtype=np.float64)
+        union = sizes1[:, None] + sizes2[None, :] - intersection
         
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(union > 0, intersection / union, 0.0)
+    
+    def _calculate_fuzzy_similarity(self, text1: str, text2: str) -> float:
+        """Нечеткое сравнение по коэффициенту Жаккара множеств слов"""
         # Нормализуем тексты
         text1_words = set(text1.lower().split())
         text2_words = set(text2.lower().split())
         
-        if not text1_words or not text2_words:
+        return self._jaccard_similarity(text1_words, text2_words)
+    
+    @staticmethod
+    def _jaccard_similarity(words1: set, words2: set) -> float:
+        """Коэффициент Жаккара двух множеств слов"""
+        if not words1 or not words2:
             return 0.0
         
         # Вычисляем Jaccard similarity
-        intersection = text1_words.intersection(text2_words)
-        union = text1_words.union(text2_words)
+        intersection = words1.intersection(words2)
+        union = words1.union(words2)
         
         return len(intersection) / len(union) if union else 0.0
     
-    def _compare_images_phash(self, url1: str, url2: str) -> Tuple[float, int]:
-        """Сравнение изображений с использованием perceptual hash"""
+    @staticmethod
+    def _normalized_text_hash(text: str) -> bytes:
+        """Хэш текста без учета регистра и пробелов"""
+        return hashlib.blake2b(' '.join(text.lower().split()).encode('utf-8'), digest_size=16).digest()
+    
+    def compare_image_hashes_batch(self, hashes1: List[Optional[str]], hashes2: List[Optional[str]],
+                                   threshold: Optional[int] = None) -> Dict:
+        """Пакетное сравнение K×N 64-битных хэшей (hex) за один вызов
+        
+        Возвращает полную матрицу расстояний Хэмминга, а для каждого хэша
+        из hashes1 - индекс и расстояние ближайшего хэша из hashes2. Пары
+        с отсутствующим хэшем получают расстояние MISSING_HASH_DISTANCE.
+        По умолчанию совпадением считается расстояние не больше порога pHash.
+        """
+        if threshold is None:
+            threshold = self.image_hamming_threshold
+        
+        values1, present1 = image_hashes_to_array(hashes1)
+        values2, present2 = image_hashes_to_array(hashes2)
+        
+        distances = hamming_distance_matrix(values1, values2)
+        distances[~(present1[:, None] & present2[None, :])] = MISSING_HASH_DISTANCE
+        
+        if distances.shape[1]:
+            best_indices = np.argmin(distances, axis=1)
+            best_distances = distances[np.arange(len(hashes1)), best_indices]
+        else:
+            best_indices = np.full(len(hashes1), -1, dtype=np.int64)
+            best_distances = np.full(len(hashes1), MISSING_HASH_DISTANCE, dtype=np.int64)
+        
+        return {
+            'distances': distances,
+            'best_indices': best_indices,
+            'best_distances': best_distances,
+            'matches': best_distances <= threshold
+        }
+    
+    def _get_image_phash(self, photo_id: str, url: str,
+                         post: Optional[PostFeatures] = None) -> Optional[imagehash.ImageHash]:
+        """Perceptual hash фото как объект ImageHash"""
+        phash = self._get_image_phash_hex(photo_id, url, post)
+        return imagehash.hex_to_hash(phash) if phash is not None else None
+    
+    def _get_image_phash_hex(self, photo_id: str, url: str,
+                             post: Optional[PostFeatures] = None) -> Optional[str]:
+        """pHash фото (hex): из признаков поста или по миниатюре из кэша
+        
+        Фото не загружаются: детекция работает в пуле процессов и не должна
+        блокироваться на сети. Хэши заранее собирает prefetch_image_hashes,
+        фото без хэша в сравнении не участвует.
+        """
+        try:
+            phash = post.image_hashes.get(photo_id) if post is not None else None
+            
+            if phash is None and self.image_hash_cache is not None:
+                cached = self.image_hash_cache.get(photo_id)
+                if cached is not None:
+                    phash = cached['phash']
+                    if phash is None and cached['thumbnail'] is not None:
+                        phash = self._phash_from_thumbnail(cached['thumbnail'])
+                        self.image_hash_cache.set_phash(photo_id, phash)
+            
+            if phash is not None and post is not None:
+                post.image_hashes[photo_id] = phash
+            
+            return phash
+            
+        except Exception as e:
+            print(f"Ошибка вычисления хэша изображения {photo_id}: {e}")
+            return None
+    
+    def _get_image_dhash_hex(self, photo_id: str, url: str,
+                             post: Optional[PostFeatures] = None) -> Optional[str]:
+        """dHash фото (hex): из признаков поста или из дискового кэша, без загрузки"""
         try:
-            img1 = self._download_image(url1)
-            img2 = self._download_image(url2)
+            dhash = post.image_dhashes.get(photo_id) if post is not None else None
+            
+            if dhash is None and self.image_hash_cache is not None:
+                cached = self.image_hash_cache.get(photo_id)
+                if cached is not None:
+                    dhash = cached['dhash']
             
-            if img1 is None or img2 is None:
-                return 0.0, 999
+            if dhash is not None and post is not None:
+                post.image_dhashes[photo_id] = dhash
             
-            # Вычисляем perceptual hash
-            hash1 = imagehash.phash(img1)
-            hash2 = imagehash.phash(img2)
+            return dhash
+            
+        except Exception as e:
+            print(f"Ошибка вычисления хэша изображения {photo_id}: {e}")
+            return None
+    
+    def _hash_image(self, img: Image.Image) -> Tuple[str, bytes]:
+        """dHash изображения и миниатюра 32×32 в оттенках серого для pHash"""
+        gray = img.convert('L')
+        dhash = str(imagehash.dhash(gray))
+        # Тот же размер и фильтр, что использует imagehash.phash - pHash по миниатюре совпадает с исходным
+        thumbnail = gray.resize((32, 32), Image.LANCZOS).tobytes()
+        return dhash, thumbnail
+    
+    def _phash_from_thumbnail(self, thumbnail: bytes) -> str:
+        """pHash по сохраненной миниатюре"""
+        return str(imagehash.phash(Image.frombytes('L', (32, 32), thumbnail)))
+    
+    def _compare_images_phash(self, hash1: Optional[imagehash.ImageHash],
+                              hash2: Optional[imagehash.ImageHash]) -> Tuple[float, int]:
+        """Сравнение изображений с использованием perceptual hash"""
+        try:
+            if hash1 is None or hash2 is None:
+                return 0.0, MISSING_HASH_DISTANCE
             
             # Вычисляем расстояние Хэмминга
             hamming_distance = hash1 - hash2
@@ -217,24 +623,24 @@ class PlagiarismDetector:
             
         except Exception as e:
             print(f"Ошибка сравнения изображений: {e}")
-            return 0.0, 999
+            return 0.0, MISSING_HASH_DISTANCE
     
-    def _is_posted_after_original(self, original_post: Dict, target_post: Dict) -> bool:
+    def _is_posted_after_original(self, original_post: PostFeatures, target_post: PostFeatures) -> bool:
         """Проверка, что пост опубликован позже оригинала"""
         try:
-            original_date = datetime.fromtimestamp(original_post.get('date', 0))
-            target_date = datetime.fromtimestamp(target_post.get('date', 0))
+            original_date = datetime.fromtimestamp(original_post.date or 0)
+            target_date = datetime.fromtimestamp(target_post.date or 0)
             
             return target_date > original_date
         except Exception:
             return False
     
-    def _has_original_attribution(self, target_post: Dict, original_post: Dict) -> bool:
+    def _has_original_attribution(self, target_post: PostFeatures, original_post: PostFeatures) -> bool:
         """Проверка наличия ссылки на оригинал"""
-        text = target_post.get('text', '').lower()
+        text = target_post.text.lower()
         
         # Проверяем упоминания оригинального автора/группы
-        original_owner_id = original_post.get('owner_id', 0)
+        original_owner_id = original_post.owner_id or 0
         
         # Ключевые слова для атрибуции
         attribution_keywords = [
@@ -288,38 +694,161 @@ class PlagiarismDetector:
     
     def _extract_images(self, attachments: List) -> List[str]:
         """Извлечение URL изображений из attachments"""
+        return [url for _, url in self._extract_image_refs(attachments)]
+    
+    def _extract_image_refs(self, attachments: List) -> List[Tuple[str, str]]:
+        """Извлечение пар (owner_id_id фото, URL) из attachments"""
         images = []
         for attachment in attachments:
             if attachment.get('type') == 'photo':
                 photo = attachment.get('photo', {})
-                if 'sizes' in photo:
-                    # Берем максимальный размер
-                    max_size = max(photo['sizes'], key=lambda x: x.get('width', 0))
-                    images.append(max_size['url'])
+                if photo.get('sizes'):
+                    # Берем наименьший размер, достаточный для хэширования
+                    size = self._select_photo_size(photo['sizes'])
+                    photo_id = f"{photo.get('owner_id')}_{photo.get('id')}" if 'id' in photo else size['url']
+                    images.append((photo_id, size['url']))
         return images
     
-    def _download_image(self, url: str) -> Optional[Image.Image]:
-        """Загрузка изображения по URL"""
+    def _select_photo_size(self, sizes: List[Dict]) -> Dict:
+        """Выбор наименьшего варианта фото со стороной не меньше image_min_size
+        
+        pHash все равно сжимает изображение до 32×32, поэтому загружать
+        максимальный размер не нужно. Обрезанные варианты (o, p, q, r)
+        пропускаются, чтобы у одного фото всегда хэшировался один и тот же кадр.
+        """
+        uncropped = [size for size in sizes if size.get('type') not in self.CROPPED_PHOTO_TYPES] or sizes
+        
+        if not any(size.get('width') for size in uncropped):
+            # Старые ответы API без размеров - первый по возрастанию тип, покрывающий image_min_size
+            by_type = sorted(uncropped, key=lambda x: self.PHOTO_TYPE_ORDER.find(x.get('type', '')))
+            for size in by_type:
+                if self.PHOTO_TYPE_MAX_SIDE.get(size.get('type'), 0) >= self.image_min_size:
+                    return size
+            return by_type[-1]
+        
+        sufficient = [
+            size for size in uncropped
+            if min(size.get('width', 0), size.get('height', 0) or size.get('width', 0)) >= self.image_min_size
+        ]
+        if sufficient:
+            return min(sufficient, key=lambda x: x.get('width', 0) * (x.get('height', 0) or 1))
+        
+        # Нет достаточно большого варианта - берем максимальный
+        return max(uncropped, key=lambda x: x.get('width', 0))
+    
+    def _load_image(self, content: bytes) -> Optional[Image.Image]:
+        """Декодирование загруженного изображения"""
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
+            img = Image.open(BytesIO(content))
+            if img.format == 'JPEG':
+                # JPEG декодируется сразу в уменьшенном масштабе и в оттенках серого
+                img.draft('L', (self.image_min_size, self.image_min_size))
             return img
         except Exception as e:
-            print(f"Ошибка загрузки изображения {url}: {e}")
+            print(f"Ошибка декодирования изображения: {e}")
             return None
     
+    async def prefetch_image_hashes(self, posts: List[PostFeatures]) -> int:
+        """Параллельная загрузка фото, у которых еще нет pHash, и вычисление их хэшей
+        
+        Вызывается из асинхронного кода перед детекцией: синхронный анализ
+        изображений фото не загружает. dHash и pHash сохраняются в признаках
+        поста и вместе с ними попадают в индексы, поэтому кандидатам из
+        индекса не нужен дисковый кэш с ограниченным сроком жизни. pHash
+        считается по миниатюре 32×32 сразу, а не только для пар, прошедших
+        предфильтр по dHash: для ленивого расчета признакам пришлось бы
+        хранить миниатюру (1 КБ на фото вместо 16 символов). Это около 0.1 мс
+        на фото, примерно 10% к декодированию (benchmark_image_hashing.py).
+        Чтение кэша, декодирование и хэширование выполняются в пуле потоков
+        (по одному вызову на пачку), в event loop - только загрузка и
+        раскладка готовых хэшей по признакам.
+        """
+        wanted = {}
+        for post in posts:
+            for photo_id, url in zip(post.image_ids, post.image_urls):
+                if photo_id not in post.image_hashes:
+                    wanted.setdefault(photo_id, url)
+        
+        if not wanted:
+            return 0
+        
+        loop = asyncio.get_running_loop()
+        hashes = await loop.run_in_executor(None, self._cached_image_hashes, list(wanted))
+        
+        missing = {photo_id: url for photo_id, url in wanted.items() if photo_id not in hashes}
+        downloaded = {}
+        if missing:
+            contents = await get_image_fetcher().fetch_many(missing.values())
+            downloaded = await loop.run_in_executor(None, self._hash_downloaded_images, missing, contents)
+            hashes.update(downloaded)
+        
+        # Раскладываем хэши по признакам постов
+        for post in posts:
+            for photo_id in post.image_ids:
+                if photo_id in hashes:
+                    post.image_dhashes[photo_id], post.image_hashes[photo_id] = hashes[photo_id]
+        
+        return len(downloaded)
+    
+    def _cached_image_hashes(self, photo_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """Хэши фото (dHash, pHash) из дискового кэша; pHash по миниатюре дописывается в кэш"""
+        hashes = {}
+        if self.image_hash_cache is None:
+            return hashes
+        
+        for photo_id in photo_ids:
+            try:
+                cached = self.image_hash_cache.get(photo_id)
+                if cached is None:
+                    continue
+                phash = cached['phash']
+                if phash is None and cached['thumbnail'] is not None:
+                    phash = self._phash_from_thumbnail(cached['thumbnail'])
+                    self.image_hash_cache.set_phash(photo_id, phash)
+                if phash is not None:
+                    hashes[photo_id] = (cached['dhash'], phash)
+            except Exception as e:
+                print(f"Ошибка чтения хэша изображения {photo_id}: {e}")
+        
+        return hashes
+    
+    def _hash_downloaded_images(self, urls: Dict[str, str],
+                                contents: Dict[str, Optional[bytes]]) -> Dict[str, Tuple[str, str]]:
+        """Декодирование загруженных фото, их dHash и pHash с сохранением в кэш"""
+        hashes = {}
+        for photo_id, url in urls.items():
+            content = contents.get(url)
+            img = self._load_image(content) if content else None
+            if img is None:
+                continue
+            
+            try:
+                dhash, thumbnail = self._hash_image(img)
+                phash = self._phash_from_thumbnail(thumbnail)
+            except Exception as e:
+                print(f"Ошибка вычисления хэша изображения {photo_id}: {e}")
+                continue
+            
+            hashes[photo_id] = (dhash, phash)
+            if self.image_hash_cache is not None:
+                self.image_hash_cache.set(photo_id, dhash, thumbnail, phash)
+        
+        return hashes
+    
     def _create_no_plagiarism_result(self, reason: str) -> Dict:
         """Создание результата без плагиата"""
         return {
             'is_plagiarism': False,
             'overall_similarity': 0.0,
+            'confidence': 0.0,
             'text_similarity': 0.0,
             'image_similarity': 0.0,
             'text_plagiarism': False,
             'image_plagiarism': False,
             'text_reason': reason,
             'image_reason': 'Не применимо',
+            'text_stages': [],
+            'text_decided_by': None,
             'recommendation': 'Плагиат не обнаружен'
         }
     
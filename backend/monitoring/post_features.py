@@ -0,0 +1,62 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class PostFeatures:
+    """Признаки поста, вычисляемые один раз и переиспользуемые во всех сравнениях"""
+
+    __slots__ = (
+        'key', 'owner_id', 'post_id', 'date', 'text', 'clean_text', 'text_hash',
+        'words', 'shingle_hashes', 'simhash', 'image_ids', 'image_urls',
+        'image_hashes', 'image_dhashes', 'is_repost'
+    )
+
+    def __init__(self, owner_id: Optional[int] = None, post_id: Optional[int] = None, date: int = 0,
+                 text: str = '', clean_text: str = '', text_hash: bytes = b'',
+                 words: frozenset = frozenset(), shingle_hashes: Optional[np.ndarray] = None,
+                 simhash: int = 0, image_ids: Tuple[str, ...] = (), image_urls: Tuple[str, ...] = (),
+                 image_hashes: Optional[Dict[str, str]] = None,
+                 image_dhashes: Optional[Dict[str, str]] = None, is_repost: bool = False):
+        self.key = f"{owner_id}_{post_id}"
+        self.owner_id = owner_id
+        self.post_id = post_id
+        self.date = date
+        self.text = text
+        self.clean_text = clean_text
+        self.text_hash = text_hash
+        self.words = words
+        self.shingle_hashes = shingle_hashes
+        self.simhash = simhash
+        self.image_ids = image_ids
+        self.image_urls = image_urls
+        # photo_id -> pHash (hex, для подтверждения) и dHash (hex, для предфильтра)
+        self.image_hashes = image_hashes if image_hashes is not None else {}
+        self.image_dhashes = image_dhashes if image_dhashes is not None else {}
+        self.is_repost = is_repost
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+        # Признаки, сохраненные до появления полей со словарями хэшей
+        if self.image_hashes is None:
+            self.image_hashes = {}
+        if self.image_dhashes is None:
+            self.image_dhashes = {}
+
+    def __repr__(self) -> str:
+        return f"PostFeatures(key={self.key!r}, date={self.date}, images={len(self.image_ids)})"
+
+    def compact(self) -> 'PostFeatures':
+        """Копия без хэшей шинглов - для долговременного хранения в индексах"""
+        state = self.__getstate__()
+        state['shingle_hashes'] = None
+        # Словари хэшей копируются: индекс сохраняется в другом потоке, а исходный пост еще дополняется
+        state['image_hashes'] = dict(self.image_hashes)
+        state['image_dhashes'] = dict(self.image_dhashes)
+        features = PostFeatures.__new__(PostFeatures)
+        features.__setstate__(state)
+        return features
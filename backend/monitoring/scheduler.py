@@ -1,28 +1,85 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from database.database import SessionLocal
 from models.group import Group
 from models.user import User
 from services.vk_api_service import VKAPIService
 from monitoring.plagiarism_detector import PlagiarismDetector
+from monitoring.minhash_index import MinHashLSHIndex
+from monitoring.post_features import PostFeatures
+from monitoring.hamming_index import MultiIndexHammingIndex
+from monitoring.image_index import ImageHashIndex
+from monitoring.detection_executor import DetectionExecutor
 from notifications.notification_service import NotificationService
 from datetime import datetime, timedelta
+from collections import OrderedDict
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
-import settings
+from config.settings import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class MonitoringScheduler:
+    # Сколько последних обработанных постов помнить, чтобы опрос и Callback API не проверяли пост дважды
+    CLAIMED_POSTS_LIMIT = 100000
+    # Постов истории стены, индексируемых без передачи управления event loop
+    ARCHIVE_INDEX_CHUNK_SIZE = 20
+    
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.vk_api = VKAPIService()
         self.detector = PlagiarismDetector()
         self.notification_service = NotificationService()
+        
+        # Детекция выполняется в пуле процессов, чтобы не блокировать API
+        self.detection_executor = DetectionExecutor(
+            self.detector,
+            max_workers=settings.DETECTION_WORKERS,
+            batch_size=settings.DETECTION_BATCH_SIZE
+        )
+        
+        # Индекс кандидатов по всем постам отслеживаемых групп
+        self.candidate_index = MinHashLSHIndex.load(
+            settings.MINHASH_INDEX_PATH,
+            num_perm=settings.MINHASH_NUM_PERM,
+            bands=settings.MINHASH_BANDS,
+            max_posts=settings.MINHASH_MAX_POSTS,
+            max_candidates=settings.MAX_CANDIDATES_PER_POST
+        )
+        
+        # Индекс SimHash для почти-дубликатов; восстанавливается из сохраненных признаков
+        self.simhash_index = MultiIndexHammingIndex(
+            bits=64,
+            max_distance=settings.SIMHASH_MAX_DISTANCE,
+            max_items=settings.MINHASH_MAX_POSTS
+        )
+        for key, features in self.candidate_index.posts.items():
+            self.simhash_index.add(key, features.simhash)
+        
+        self._backfill_running = False
+        self._candidate_search_lock: Optional[asyncio.Lock] = None
+        
+        # Индексы сохраняются на диск, только если изменились с прошлого сохранения
+        self._indexes_dirty = False
+        self._save_lock: Optional[asyncio.Lock] = None
+        
+        # Callback API: когда от группы приходило последнее событие и когда ее последний раз опрашивали
+        self._callback_seen_at: Dict[int, datetime] = {}
+        self._polled_at: Dict[int, datetime] = {}
+        # Отметки обработанных постов: опрос и Callback API не проверяют пост дважды
+        self._claimed_posts: "OrderedDict[str, None]" = OrderedDict()
+        
+        # Глобальный индекс dHash всех фото, которые видел мониторинг
+        self.image_index = ImageHashIndex.load(
+            settings.IMAGE_INDEX_PATH,
+            max_distance=settings.IMAGE_DHASH_THRESHOLD,
+            max_photos=settings.IMAGE_INDEX_MAX_PHOTOS
+        )
     
     def start(self):
         """Запуск планировщика мониторинга"""
@@ -36,6 +93,26 @@ class MonitoringScheduler:
                 replace_existing=True
             )
             
+            # Догрузка истории стен новых групп
+            self.scheduler.add_job(
+                self.run_backfill,
+                'interval',
+                minutes=settings.BACKFILL_INTERVAL_MINUTES,
+                id="wall_backfill",
+                name="Догрузка истории стен",
+                replace_existing=True
+            )
+            
+            # Обновление названий и фото всех сохраненных групп
+            self.scheduler.add_job(
+                self.refresh_groups_metadata,
+                'interval',
+                hours=settings.GROUP_METADATA_REFRESH_HOURS,
+                id="groups_metadata_refresh",
+                name="Обновление метаданных групп",
+                replace_existing=True
+            )
+            
             # Дополнительно запускаем мониторинг при старте
             self.scheduler.add_job(
                 self.run_monitoring,
@@ -54,11 +131,20 @@ class MonitoringScheduler:
     def stop(self):
         """Остановка планировщика"""
         self.scheduler.shutdown()
+        self.detection_executor.shutdown()
         logger.info("Планировщик мониторинга остановлен")
     
     async def run_monitoring(self):
-        """Запуск мониторинга всех активных групп"""
+        """Запуск мониторинга всех активных групп
+        
+        Группы обрабатываются одновременно, не больше MONITORING_CONCURRENCY
+        сразу: темп запросов к VK задают лимитеры токенов, а не паузы между
+        группами. У каждой группы своя сессия БД и ограничение по времени
+        MONITORING_GROUP_TIMEOUT_SECONDS - зависшая группа не задерживает цикл
+        и будет обработана в следующем.
+        """
         logger.info("Запуск мониторинга плагиата")
+        started_at = datetime.now()
         
         db = SessionLocal()
         try:
@@ -69,144 +155,576 @@ class MonitoringScheduler:
             
             logger.info(f"Найдено {len(groups)} групп для мониторинга")
             
-            # Запускаем мониторинг для каждой группы
-            for group in groups:
-                try:
-                    await self.monitor_group(group, db)
-                    # Небольшая задержка между группами
-                    await asyncio.sleep(2)
-                except Exception as e:
-                    logger.error(f"Ошибка мониторинга группы {group.vk_group_id}: {e}")
-                    continue
+            # Группы, посты которых приходят через Callback API, опрашиваются только для страховки
+            polled_groups = [group for group in groups if self._needs_polling(group)]
+            if len(polled_groups) < len(groups):
+                logger.info(f"Опрос пропущен для {len(groups) - len(polled_groups)} групп с Callback API")
+            groups = polled_groups
+            
+            # Запускаем мониторинг групп параллельно; вызовы wall.get одновременно
+            # обрабатываемых групп объединяются в execute
+            semaphore = asyncio.Semaphore(max(1, settings.MONITORING_CONCURRENCY))
+            await asyncio.gather(*(
+                self._monitor_group_limited(group.id, semaphore) for group in groups
+            ))
+            
+            logger.info(f"Мониторинг {len(groups)} групп завершен за "
+                        f"{(datetime.now() - started_at).total_seconds():.1f} с")
                     
         except Exception as e:
             logger.error(f"Ошибка мониторинга: {e}")
         finally:
             db.close()
+            await self._save_candidate_index()
     
-    async def monitor_group(self, group: Group, db: Session):
-        """Мониторинг конкретной группы"""
+    async def _monitor_group_limited(self, group_id: int, semaphore: asyncio.Semaphore):
+        """Мониторинг одной группы в своей сессии БД с ограничением параллельности и времени
+        
+        Ограничение времени действует и на загрузку новых постов: зависший
+        запрос к VK прерывает только свою группу.
+        """
+        async with semaphore:
+            db = SessionLocal()
+            group = None
+            try:
+                group = db.get(Group, group_id)
+                if group is None:
+                    return
+                
+                await asyncio.wait_for(
+                    self.monitor_group(group, db),
+                    timeout=settings.MONITORING_GROUP_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Мониторинг группы {group.vk_group_id} не уложился в "
+                             f"{settings.MONITORING_GROUP_TIMEOUT_SECONDS} с - прерван до следующего цикла")
+            except Exception as e:
+                logger.error(f"Ошибка мониторинга группы {group.vk_group_id if group else group_id}: {e}")
+            finally:
+                db.close()
+    
+    async def refresh_groups_metadata(self) -> int:
+        """Обновление названий, адресов и фото всех групп: ceil(N / 500) запросов к VK"""
+        db = SessionLocal()
         try:
-            # Получаем посты группы
-            posts = await self.vk_api.get_group_posts(
-                group.vk_group_id, 
-                count=settings.MAX_POSTS_PER_GROUP
+            groups = db.query(Group).all()
+            groups_info = await self.vk_api.get_groups_info_bulk(
+                [group.vk_group_id for group in groups],
+                use_cache=False
             )
             
-            logger.info(f"Получено {len(posts)} постов для группы {group.vk_group_id}")
+            updated = 0
+            for group in groups:
+                group_info = groups_info.get(abs(group.vk_group_id))
+                if not group_info:
+                    continue
+                
+                group.name = group_info["name"]
+                group.screen_name = group_info.get("screen_name")
+                group.photo_url = group_info.get("photo_url")
+                group.description = group_info.get("description")
+                updated += 1
             
-            # Проверяем каждый пост на плагиат
-            for post in posts:
+            db.commit()
+            logger.info(f"Метаданные обновлены для {updated} из {len(groups)} групп")
+            return updated
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Ошибка обновления метаданных групп: {e}")
+            return 0
+        finally:
+            db.close()
+    
+    def trigger_backfill(self):
+        """Немедленный запуск догрузки истории (например, после подключения группы)"""
+        try:
+            self.scheduler.add_job(
+                self.run_backfill,
+                'date',
+                id="wall_backfill_now",
+                name="Догрузка истории стен",
+                run_date=datetime.now(),
+                replace_existing=True
+            )
+        except Exception as e:
+            logger.error(f"Ошибка запуска догрузки истории: {e}")
+    
+    async def run_backfill(self):
+        """Догрузка истории стен групп, для которых она еще не завершена"""
+        if self._backfill_running:
+            return
+        
+        self._backfill_running = True
+        db = SessionLocal()
+        try:
+            groups = db.query(Group).filter(
+                Group.is_active == True,
+                or_(Group.backfill_completed == False, Group.backfill_completed.is_(None))
+            ).limit(settings.MAX_GROUPS_TO_MONITOR).all()
+            
+            for group in groups:
                 try:
-                    await self.check_post_for_plagiarism(post, group, db)
+                    await self.backfill_group(group, db)
                 except Exception as e:
-                    logger.error(f"Ошибка проверки поста {post.get('id')}: {e}")
-                    continue
+                    logger.error(f"Ошибка догрузки истории группы {group.vk_group_id}: {e}")
                     
         except Exception as e:
-            logger.error(f"Ошибка мониторинга группы {group.vk_group_id}: {e}")
+            logger.error(f"Ошибка догрузки истории: {e}")
+        finally:
+            db.close()
+            self._backfill_running = False
+            await self._save_candidate_index()
     
-    async def check_post_for_plagiarism(self, post: Dict, group: Group, db: Session) -> bool:
-        """Проверка поста на плагиат по правилам MVP"""
+    async def backfill_group(self, group: Group, db: Session) -> int:
+        """Догрузка истории стены группы с сохраняемого смещения
         
-        # Проверяем, не является ли пост репостом
-        if self.detector.is_repost(post):
-            logger.debug(f"Пост {post.get('id')} является репостом - пропускаем")
-            return False
+        Несколько страниц запрашиваются одновременно (темп задает лимитер, а
+        вызовы объединяются в execute), посты сразу попадают в индексы.
+        Смещение сохраняется после каждой пачки страниц, поэтому прерванная
+        догрузка продолжается с того же места. Посты, сдвинутые по стене
+        новыми публикациями, индексируются повторно без дублей.
+        """
+        page_size = 100
+        offset = group.backfill_offset or 0
+        processed = 0
         
-        # Получаем текст и изображения поста
-        post_text = post.get('text', '')
-        post_images = self._extract_images(post)
+        while processed < settings.BACKFILL_MAX_POSTS_PER_RUN:
+            offsets = [offset + i * page_size for i in range(settings.BACKFILL_CONCURRENT_PAGES)]
+            pages = await asyncio.gather(*(
+                self.vk_api.get_group_posts_page(group.vk_group_id, page_offset, page_size)
+                for page_offset in offsets
+            ))
+            
+            completed = False
+            failed = False
+            for page in pages:
+                if page is None:
+                    # Продолжим с этой страницы в следующий запуск
+                    failed = True
+                    break
+                
+                await self._index_archive_posts(page["posts"])
+                offset += page["fetched"]
+                processed += page["fetched"]
+                
+                if page["fetched"] < page_size or offset >= page["total"]:
+                    completed = True
+                    break
+            
+            group.backfill_offset = offset
+            group.backfill_completed = completed
+            db.commit()
+            
+            if completed or failed:
+                break
         
-        # Ищем похожие посты в других группах
-        similar_posts = await self.find_similar_posts(
-            post_text, post_images, group.vk_group_id
+        logger.info(
+            f"История группы {group.vk_group_id}: +{processed} постов, смещение {offset}"
+            f"{' - завершено' if group.backfill_completed else ''}"
         )
+        return processed
+    
+    async def _index_archive_posts(self, posts: List[Dict]):
+        """Признаки и индексирование постов из истории стены
+        
+        Признаки вычисляются в пуле потоков, а индексы, общие с поиском
+        кандидатов, пополняются в event loop небольшими частями под той же
+        блокировкой, что и поиск: догрузка тысяч постов не задерживает
+        мониторинг других групп и обработку запросов.
+        """
+        loop = asyncio.get_running_loop()
+        features = await loop.run_in_executor(None, self._extract_archive_features, posts)
         
-        plagiarism_found = False
+        with_images = [post for post in features if post.image_ids and not post.is_repost]
+        if with_images:
+            await self.detector.prefetch_image_hashes(with_images)
         
-        for similar_post in similar_posts:
+        if self._candidate_search_lock is None:
+            self._candidate_search_lock = asyncio.Lock()
+        
+        for start in range(0, len(features), self.ARCHIVE_INDEX_CHUNK_SIZE):
+            async with self._candidate_search_lock:
+                for post_features in features[start:start + self.ARCHIVE_INDEX_CHUNK_SIZE]:
+                    self.index_post(post_features)
+            await asyncio.sleep(0)
+    
+    def _extract_archive_features(self, posts: List[Dict]) -> List[PostFeatures]:
+        """Признаки постов из истории стены (выполняется в пуле потоков)"""
+        features = []
+        for post in posts:
             try:
-                # Проверяем плагиат по правилам MVP
-                analysis_result = self.detector.detect_plagiarism(similar_post, post)
-                
-                if analysis_result['is_plagiarism']:
-                    # Создаем запись о плагиате
-                    await self.create_plagiarism_record_improved(
-                        similar_post, post, group, analysis_result, db
-                    )
-                    plagiarism_found = True
-                    logger.info(f"Обнаружен плагиат: {analysis_result['recommendation']}")
-                
+                features.append(self.detector.extract_features(post))
             except Exception as e:
-                logger.error(f"Ошибка анализа плагиата: {e}")
-                continue
+                logger.error(f"Ошибка обработки поста {post.get('id')}: {e}")
+        return features
+    
+    async def _save_candidate_index(self):
+        """Сохранение индексов кандидатов и TF-IDF модели на диск, если они изменились
+        
+        Снимки состояния снимаются в event loop, а сериализация и запись во
+        временный файл с переименованием идут в пуле потоков - цикл
+        мониторинга и прием событий не ждут диска.
+        """
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
         
-        return plagiarism_found
+        async with self._save_lock:
+            if not self._indexes_dirty:
+                return
+            self._indexes_dirty = False
+            
+            snapshots = [
+                (self.candidate_index.write_snapshot, self.candidate_index.snapshot(), settings.MINHASH_INDEX_PATH),
+                (self.image_index.write_snapshot, self.image_index.snapshot(), settings.IMAGE_INDEX_PATH),
+                (self.detector.tfidf_model.write_snapshot, self.detector.tfidf_model.snapshot(),
+                 settings.TFIDF_MODEL_PATH),
+            ]
+            
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_snapshots, snapshots)
+            except Exception as e:
+                # Повторим при следующем сохранении
+                self._indexes_dirty = True
+                logger.error(f"Ошибка сохранения индекса кандидатов: {e}")
     
-    def _extract_images(self, post: Dict) -> List[str]:
-        """Извлечение URL изображений из поста"""
-        images = []
-        attachments = post.get('attachments', [])
-        
-        for attachment in attachments:
-            if attachment.get('type') == 'photo':
-                sizes = attachment['photo'].get('sizes', [])
-                if sizes:
-                    # Берем самое большое изображение
-                    largest_size = max(sizes, key=lambda x: x.get('width', 0))
-                    images.append(largest_size['url'])
-        
-        return images
+    @staticmethod
+    def _write_snapshots(snapshots):
+        for write_snapshot, state, path in snapshots:
+            write_snapshot(state, path)
     
-    async def find_similar_posts(self, text: str, images: List[str], exclude_group_id: int) -> List[Dict]:
-        """Поиск похожих постов в реальных группах"""
-        similar_posts = []
-        
-        # Получаем список групп для мониторинга из базы данных
-        db = SessionLocal()
+    async def monitor_group(self, group: Group, db: Session):
+        """Мониторинг конкретной группы: анализируются только посты новее сохраненной отметки"""
         try:
-            monitored_groups = db.query(Group).filter(
-                Group.is_active == True,
-                Group.vk_group_id != exclude_group_id
-            ).limit(10).all()  # Ограничиваем количество групп для производительности
+            # Получаем новые посты группы
+            fetched = await self.vk_api.get_new_group_posts(
+                group.vk_group_id,
+                group.last_post_id,
+                max_count=settings.MAX_NEW_POSTS_PER_CYCLE
+            )
+            posts = fetched["posts"]
             
-            for group in monitored_groups:
+            logger.info(f"Получено {len(posts)} новых постов для группы {group.vk_group_id}")
+            
+            # Признаки каждого поста вычисляются один раз
+            features = []
+            for post in posts:
                 try:
-                    # Получаем посты группы
-                    posts = await self.vk_api.get_group_posts(group.vk_group_id, count=10)
-                    
-                    for post in posts:
-                        post_text = post.get('text', '')
-                        post_images = self._extract_images(post)
-                        
-                        # Проверяем схожесть текста
-                        if text and post_text and len(text) > 20 and len(post_text) > 20:
-                            # Используем новую логику детекции
-                            analysis_result = self.detector.detect_plagiarism(
-                                {'text': text, 'attachments': [{'type': 'photo', 'photo': {'sizes': [{'url': img}]}} for img in images]},
-                                {'text': post_text, 'attachments': [{'type': 'photo', 'photo': {'sizes': [{'url': img}]}} for img in post_images]}
-                            )
-                            
-                            # Добавляем пост если есть схожесть
-                            if analysis_result['text_similarity'] > 0.3 or analysis_result['image_similarity'] > 0.3:
-                                similar_posts.append({
-                                    'id': post['id'],
-                                    'owner_id': post['owner_id'],
-                                    'text': post_text,
-                                    'images': post_images,
-                                    'attachments': post.get('attachments', [])
-                                })
-                
+                    features.append(self.detector.extract_features(post))
                 except Exception as e:
-                    logger.error(f"Ошибка поиска в группе {group.vk_group_id}: {e}")
-                    continue
+                    logger.error(f"Ошибка обработки поста {post.get('id')}: {e}")
+            
+            # Посты, уже пришедшие через Callback API, повторно не проверяются
+            claimed = self._claim_posts(features)
+            try:
+                # Проверяем все посты группы на плагиат одной пачкой и делаем их кандидатами для других групп
+                await self.check_posts_for_plagiarism(claimed, group, db, index_posts=True)
+            except BaseException:
+                # Включая отмену по таймауту: посты проверятся в следующем цикле
+                self._release_posts(claimed)
+                raise
+            
+            # Отметка сдвигается только после успешной обработки
+            self._update_high_water_mark(group, fetched, len(features), db)
+            self._polled_at[abs(group.vk_group_id)] = datetime.now()
                     
         except Exception as e:
-            logger.error(f"Ошибка получения групп для поиска: {e}")
+            logger.error(f"Ошибка мониторинга группы {group.vk_group_id}: {e}")
+    
+    def _update_high_water_mark(self, group: Group, fetched: Optional[Dict], posts_checked: int, db: Session):
+        """Сохранение самого нового обработанного опросом поста группы
+        
+        Без результата опроса (fetched=None) обновляются только счетчики.
+        """
+        try:
+            # Отметка только растет
+            last_post_id = fetched["last_post_id"] if fetched else None
+            if last_post_id is not None and (group.last_post_id is None or last_post_id > group.last_post_id):
+                group.last_post_id = last_post_id
+                if fetched["last_post_date"]:
+                    group.last_post_date = datetime.fromtimestamp(fetched["last_post_date"])
+            group.posts_checked = (group.posts_checked or 0) + posts_checked
+            group.last_check = datetime.now()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Ошибка сохранения отметки группы {group.vk_group_id}: {e}")
+    
+    def _claim_posts(self, posts: List[PostFeatures]) -> List[PostFeatures]:
+        """Посты, которые еще не обрабатывались; они сразу отмечаются как обрабатываемые"""
+        claimed = []
+        for post in posts:
+            if post.key in self._claimed_posts:
+                continue
+            self._claimed_posts[post.key] = None
+            claimed.append(post)
+        
+        while len(self._claimed_posts) > self.CLAIMED_POSTS_LIMIT:
+            self._claimed_posts.popitem(last=False)
+        return claimed
+    
+    def _release_posts(self, posts: List[PostFeatures]):
+        """Снятие отметки после ошибки, чтобы пост проверился при следующем получении"""
+        for post in posts:
+            self._claimed_posts.pop(post.key, None)
+    
+    def mark_callback_alive(self, group_id: int):
+        """Отметка, что Callback API группы работает: ее опрос становится страховочным"""
+        self._callback_seen_at[abs(group_id)] = datetime.now()
+    
+    def _needs_polling(self, group: Group) -> bool:
+        """Опрашивать ли группу в этом цикле
+        
+        Группы без событий Callback API опрашиваются каждый цикл. Группы, от
+        которых события приходят, - не чаще раза в CALLBACK_POLL_FALLBACK_HOURS,
+        чтобы посты, потерянные при доставке, все равно были проверены.
+        """
+        group_id = abs(group.vk_group_id)
+        if group_id not in self._callback_seen_at:
+            return True
+        
+        polled_at = self._polled_at.get(group_id)
+        return polled_at is None or datetime.now() - polled_at >= timedelta(hours=settings.CALLBACK_POLL_FALLBACK_HOURS)
+    
+    async def ingest_wall_post(self, post: Dict, group_id: Optional[int] = None) -> bool:
+        """Проверка нового поста из Callback API (событие wall_post_new) сразу после публикации
+        
+        Событие служит только уведомлением: пост перечитывается через
+        wall.getById, содержимое из запроса не используется. Отметку опроса
+        (last_post_id) проверка не сдвигает - ее двигает только опрос, иначе он
+        пропустил бы посты, опубликованные до пришедшего по событию. Повторная
+        проверка тех же постов опросом исключается отметками обработанных постов.
+        
+        Возвращает True, если пост проверен; уже обработанные посты, репосты,
+        предложенные и отложенные записи пропускаются.
+        """
+        owner_id = abs(post.get("owner_id") or group_id or 0)
+        post_id = post.get("id")
+        if not owner_id or not isinstance(post_id, int):
+            return False
+        
+        self.mark_callback_alive(owner_id)
+        
+        db = SessionLocal()
+        try:
+            group = db.query(Group).filter(
+                or_(Group.vk_group_id == owner_id, Group.vk_group_id == -owner_id),
+                Group.is_active == True
+            ).first()
+            if group is None:
+                logger.debug(f"Пост {owner_id}_{post_id} из неотслеживаемой группы - пропускаем")
+                return False
+            
+            if group.last_post_id is not None and post_id <= group.last_post_id:
+                return False
+            
+            post = await self.vk_api.get_post_by_id(-owner_id, str(post_id))
+            if not post or abs(post.get("owner_id") or 0) != owner_id or post.get("id") != post_id:
+                logger.warning(f"Пост {owner_id}_{post_id} из Callback API не найден через wall.getById")
+                return False
+            
+            if post.get("post_type") in ("suggest", "postpone") or self.vk_api.is_repost(post):
+                return False
+            
+            claimed = self._claim_posts([self.detector.extract_features(post)])
+            if not claimed:
+                return False
+            
+            try:
+                await self.check_posts_for_plagiarism(claimed, group, db, index_posts=True)
+            except BaseException:
+                self._release_posts(claimed)
+                raise
+            
+            self._update_high_water_mark(group, None, len(claimed), db)
+            
+            logger.info(f"Пост {owner_id}_{post_id} из Callback API проверен")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка обработки поста {owner_id}_{post_id} из Callback API: {e}")
+            return False
         finally:
             db.close()
+    
+    async def check_post_for_plagiarism(self, post: PostFeatures, group: Group, db: Session) -> bool:
+        """Проверка поста на плагиат по правилам MVP"""
+        return await self.check_posts_for_plagiarism([post], group, db) > 0
+    
+    async def check_posts_for_plagiarism(self, posts: List[PostFeatures], group: Group, db: Session,
+                                         index_posts: bool = False) -> int:
+        """Проверка постов группы на плагиат; возвращает число найденных случаев
+        
+        Кандидаты ищутся в индексах, фото загружаются параллельно, а сама
+        детекция отправляется в пул процессов пачкой задач. С index_posts
+        посты добавляются в индексы сразу после поиска кандидатов под общей
+        блокировкой: группы проверяются одновременно, и каждая пара постов
+        двух групп сравнивается ровно один раз - той группой, которая искала
+        кандидатов позже.
+        """
+        tasks = []
+        posts_with_images = {}
+        
+        posts = [self.detector.extract_features(post) for post in posts]
+        
+        # Хэши всех фото группы нужны для поиска в индексе изображений и для его пополнения
+        own_images = [post for post in posts if post.image_ids and not post.is_repost]
+        if own_images:
+            await self.detector.prefetch_image_hashes(own_images)
+        
+        # Поиск по индексу изображений уступает event loop - другие группы не
+        # должны искать и индексировать свои посты между поиском и индексацией этой
+        if self._candidate_search_lock is None:
+            self._candidate_search_lock = asyncio.Lock()
+        
+        async with self._candidate_search_lock:
+            for post in posts:
+                # Проверяем, не является ли пост репостом
+                if post.is_repost:
+                    logger.debug(f"Пост {post.key} является репостом - пропускаем")
+                    continue
+                
+                # Ищем похожие посты в других группах
+                similar_posts = await self.find_similar_posts(post, group.vk_group_id)
+                if not similar_posts:
+                    continue
+                
+                if post.image_ids:
+                    posts_with_images[post.key] = post
+                    posts_with_images.update(
+                        (candidate.key, candidate) for candidate in similar_posts if candidate.image_ids
+                    )
+                
+                # Оригиналом считается более ранний из двух постов
+                earlier_posts = [p for p in similar_posts if p.date <= post.date]
+                later_posts = [p for p in similar_posts if p.date > post.date]
+                if earlier_posts:
+                    tasks.append((earlier_posts, [post]))
+                if later_posts:
+                    tasks.append(([post], later_posts))
+            
+            # Посты становятся кандидатами для проверки других групп
+            if index_posts:
+                for post in posts:
+                    self.index_post(post)
+        
+        if not tasks:
+            return 0
+        
+        # Фото кандидатов, найденных по тексту, загружаются и хэшируются параллельно заранее
+        if posts_with_images:
+            await self.detector.prefetch_image_hashes(list(posts_with_images.values()))
+        
+        # Пакетная детекция вне event loop
+        try:
+            blocks = await self.detection_executor.detect_blocks(tasks)
+        except Exception as e:
+            logger.error(f"Ошибка анализа плагиата: {e}")
+            return 0
+        
+        plagiarism_count = 0
+        owner_groups = {abs(group.vk_group_id): group}
+        
+        for (original_posts, target_posts), block in zip(tasks, blocks):
+            for original_post, row in zip(original_posts, block):
+                for target_post, analysis_result in zip(target_posts, row):
+                    try:
+                        if not analysis_result['is_plagiarism']:
+                            continue
+                        
+                        # Случай принадлежит группе автора оригинала - ее владелец получает уведомление
+                        owner_group = self._get_owner_group(original_post, owner_groups, db)
+                        if owner_group is None:
+                            logger.debug(f"Оригинал {original_post.key} из неотслеживаемой группы - пропускаем")
+                            continue
+                        
+                        # Создаем запись о плагиате
+                        if await self.create_plagiarism_record_improved(
+                            original_post, target_post, owner_group, analysis_result, db
+                        ):
+                            plagiarism_count += 1
+                            logger.info(f"Обнаружен плагиат: {analysis_result['recommendation']}")
+                        
+                    except Exception as e:
+                        logger.error(f"Ошибка сохранения плагиата: {e}")
+                        continue
+        
+        return plagiarism_count
+    
+    @staticmethod
+    def _get_owner_group(post: PostFeatures, owner_groups: Dict[int, Optional[Group]], db: Session) -> Optional[Group]:
+        """Отслеживаемая группа, опубликовавшая пост (с кэшем в пределах одной проверки)"""
+        owner_id = abs(post.owner_id or 0)
+        if owner_id not in owner_groups:
+            owner_groups[owner_id] = db.query(Group).filter(
+                or_(Group.vk_group_id == owner_id, Group.vk_group_id == -owner_id)
+            ).first()
+        return owner_groups[owner_id]
+    
+    def index_post(self, post: PostFeatures) -> bool:
+        """Добавление поста в индексы кандидатов"""
+        if post.is_repost:
+            return False
+        
+        # Пост уже проиндексирован (например, при догрузке истории)
+        if post.key in self.candidate_index.signatures or post.key in self.image_index.posts:
+            return False
+        
+        compact_post = post.compact()
+        
+        # Фото попадают в индекс изображений независимо от длины текста
+        added = self.image_index.add_post(compact_post) > 0
         
+        if len(post.clean_text) >= settings.MIN_TEXT_LENGTH:
+            # Документные частоты обновляются по всему отслеживаемому корпусу
+            if self.detector.tfidf_model.partial_fit(post.clean_text):
+                self._indexes_dirty = True
+            
+            self.simhash_index.add(post.key, post.simhash)
+            added = self.candidate_index.add(post.key, post.shingle_hashes, compact_post) or added
+        
+        if added:
+            self._indexes_dirty = True
+        return added
+    
+    def _get_indexed_post(self, key: str) -> Optional[PostFeatures]:
+        """Признаки поста из индекса текстов или индекса изображений"""
+        post = self.candidate_index.posts.get(key)
+        if post is None:
+            post = self.image_index.posts.get(key)
+        return post
+    
+    async def find_similar_posts(self, post: PostFeatures, exclude_group_id: int) -> List[PostFeatures]:
+        """Поиск кандидатов в индексах постов других групп"""
+        candidate_keys = []
+        
+        if len(post.clean_text) >= settings.MIN_TEXT_LENGTH:
+            # Почти-дубликаты по SimHash идут первыми, затем кандидаты LSH
+            candidate_keys.extend(key for key, distance in self.simhash_index.query(post.simhash))
+            candidate_keys.extend(
+                key for key, estimated_similarity in self.candidate_index.query(post.shingle_hashes)
+            )
+        
+        # Похожие фото: линейный проход по индексу изображений в пуле потоков, не блокируя event loop
+        dhashes = [post.image_dhashes[photo_id] for photo_id in post.image_ids if photo_id in post.image_dhashes]
+        if dhashes and len(self.image_index):
+            loop = asyncio.get_running_loop()
+            for matches in await loop.run_in_executor(None, self.image_index.query_many, dhashes):
+                candidate_keys.extend(post_key for matched_photo_id, post_key, distance in matches)
+        
+        similar_posts = []
+        seen_keys = {post.key}
+        for key in candidate_keys:
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            
+            candidate = self._get_indexed_post(key)
+            if candidate is None or abs(candidate.owner_id or 0) == abs(exclude_group_id):
+                continue
+            similar_posts.append(candidate)
+        
+        logger.debug(f"Найдено {len(similar_posts)} кандидатов для поста {post.key}")
         return similar_posts
     
     async def create_plagiarism_record(self, original_post: Dict, plagiarized_post: Dict,
@@ -240,22 +758,36 @@ class MonitoringScheduler:
             group.user_id, plagiarism, db
         )
     
-    async def create_plagiarism_record_improved(self, original_post: Dict, plagiarized_post: Dict,
-                                              group: Group, analysis_result: Dict, db: Session):
-        """Создание записи о найденном плагиате с улучшенной логикой"""
+    async def create_plagiarism_record_improved(self, original_post: PostFeatures, plagiarized_post: PostFeatures,
+                                              group: Group, analysis_result: Dict, db: Session) -> bool:
+        """Создание записи о найденном плагиате с улучшенной логикой
+        
+        Пара постов записывается один раз, в каком бы порядке ее ни нашли:
+        при повторной проверке (следующий цикл, Callback API и опрос) запись
+        и уведомление не дублируются. Возвращает True, если запись создана.
+        """
         from models.plagiarism import Plagiarism
         
+        pair = (original_post.key, plagiarized_post.key)
+        existing = db.query(Plagiarism.id).filter(or_(
+            and_(Plagiarism.original_post_id == pair[0], Plagiarism.plagiarized_post_id == pair[1]),
+            and_(Plagiarism.original_post_id == pair[1], Plagiarism.plagiarized_post_id == pair[0])
+        )).first()
+        if existing is not None:
+            logger.debug(f"Плагиат {pair[1]} -> {pair[0]} уже записан")
+            return False
+        
         # Создаем запись о плагиате
         plagiarism = Plagiarism(
             group_id=group.id,
-            original_post_id=f"{original_post['owner_id']}_{original_post['id']}",
-            original_group_id=original_post['owner_id'],
-            original_text=original_post.get('text', ''),
-            original_images=self._extract_images(original_post),
-            plagiarized_post_id=f"{plagiarized_post['owner_id']}_{plagiarized_post['id']}",
-            plagiarized_group_id=plagiarized_post['owner_id'],
-            plagiarized_text=plagiarized_post.get('text', ''),
-            plagiarized_images=self._extract_images(plagiarized_post),
+            original_post_id=original_post.key,
+            original_group_id=original_post.owner_id,
+            original_text=original_post.text,
+            original_images=list(original_post.image_urls),
+            plagiarized_post_id=plagiarized_post.key,
+            plagiarized_group_id=plagiarized_post.owner_id,
+            plagiarized_text=plagiarized_post.text,
+            plagiarized_images=list(plagiarized_post.image_urls),
             text_similarity=analysis_result['text_similarity'],
             image_similarity=analysis_result['image_similarity'],
             overall_similarity=analysis_result['overall_similarity']
@@ -271,4 +803,6 @@ class MonitoringScheduler:
             )
             logger.info(f"Уведомление отправлено для плагиата с уверенностью {analysis_result['confidence']}")
         else:
-            logger.info(f"Уведомление не отправлено из-за низкой уверенности: {analysis_result['confidence']}") 
\ No newline at end of file
+            logger.info(f"Уведомление не отправлено из-за низкой уверенности: {analysis_result['confidence']}")
+        
+        return True 
\ No newline at end of file
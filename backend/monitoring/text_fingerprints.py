@@ -0,0 +1,93 @@
+import hashlib
+
+import numpy as np
+
+
+_POLY_BASE = np.uint64(0x100000001B3)
+_MIX_MULTIPLIER = np.uint64(0xFF51AFD7ED558CCD)
+
+
+def _word_shingles(text: str, size: int) -> set:
+    """Словесные n-граммы текста"""
+    words = text.split()
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def kgram_hashes(text: str, size: int = 5) -> np.ndarray:
+    """Хэши всех символьных k-грамм текста в порядке следования"""
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+
+    # Полиномиальный хэш всех k-грамм за один проход NumPy
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    windows = max(len(codes) - size + 1, 1)
+    hashes = np.zeros(windows, dtype=np.uint64)
+    for offset in range(min(size, len(codes))):
+        hashes = hashes * _POLY_BASE + codes[offset:offset + windows]
+
+    # Перемешивание битов, чтобы близкие k-граммы не давали близких хэшей
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= _MIX_MULTIPLIER
+    hashes ^= hashes >> np.uint64(33)
+    return hashes
+
+
+def shingle_hashes(text: str, size: int = 5, mode: str = 'char') -> np.ndarray:
+    """Уникальные стабильные 64-битные хэши шинглов очищенного текста"""
+    text = text.lower()
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+
+    if mode == 'word':
+        shingles = _word_shingles(text, size)
+        return np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+             for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+
+    return np.unique(kgram_hashes(text, size))
+
+
+def _covered_length(hashes: np.ndarray, shared: np.ndarray, size: int) -> int:
+    """Число символов текста, входящих хотя бы в одну общую k-грамму"""
+    if not len(hashes):
+        return 0
+
+    length = len(hashes) + size - 1
+    positions = np.arange(length)
+    # Для каждого символа - начало последней общей k-граммы не правее него
+    starts = np.full(length, -size, dtype=np.int64)
+    hits = np.flatnonzero(np.isin(hashes, shared))
+    starts[hits] = hits
+    starts = np.maximum.accumulate(starts)
+    return int(np.count_nonzero(positions - starts < size))
+
+
+def kgram_coverage_similarity(hashes1: np.ndarray, hashes2: np.ndarray, size: int = 5) -> float:
+    """Доля символов обоих текстов, покрытых общими k-граммами - аналог SequenceMatcher.ratio() (2M / T)
+
+    Хэши - все k-граммы текста по порядку (kgram_hashes). В отличие от
+    SequenceMatcher совпадения не обязаны идти в одном порядке, поэтому
+    переставленные абзацы не снижают схожесть.
+    """
+    total = (len(hashes1) + size - 1 if len(hashes1) else 0) + (len(hashes2) + size - 1 if len(hashes2) else 0)
+    if not total:
+        return 0.0
+
+    shared = np.intersect1d(hashes1, hashes2)
+    matched = _covered_length(hashes1, shared, size) + _covered_length(hashes2, shared, size)
+    return matched / total
+
+
+def simhash(hashes: np.ndarray) -> int:
+    """64-битный SimHash по хэшам шинглов: знак суммы голосов для каждого бита"""
+    if not len(hashes):
+        return 0
+
+    bits = np.unpackbits(hashes.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(np.packbits(votes > 0, bitorder='little').view('<u8')[0])
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusTfidfModel:
+    """TF-IDF по всему корпусу отслеживаемых постов с инкрементальным обновлением"""
+
+    def __init__(self, n_features: int = 2 ** 20, cache_size: int = 10000):
+        self.n_features = n_features
+        self.cache_size = cache_size
+
+        # Хэширующий векторизатор не требует обучения словаря
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+
+        # Документные частоты по корпусу
+        self.document_frequencies = np.zeros(n_features, dtype=np.int32)
+        self.n_documents = 0
+        self._seen_documents = set()
+
+        # Кэш TF-строк: хэш текста -> разреженная строка
+        self._tf_cache: "OrderedDict[bytes, sparse.csr_matrix]" = OrderedDict()
+        self._idf = None
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def partial_fit(self, text: str) -> bool:
+        """Учет документа в документных частотах корпуса (каждый текст - один раз)"""
+        digest = self._digest(text)
+        if not text or digest in self._seen_documents:
+            return False
+
+        row = self.term_frequencies(text, digest)
+        if not row.nnz:
+            return False
+
+        self._seen_documents.add(digest)
+        self.document_frequencies[row.indices] += 1
+        self.n_documents += 1
+        self._idf = None
+        return True
+
+    def partial_fit_many(self, texts: Iterable[str]) -> int:
+        """Учет нескольких документов"""
+        return sum(1 for text in texts if self.partial_fit(text))
+
+    @property
+    def idf(self) -> np.ndarray:
+        """Сглаженный IDF, как в TfidfVectorizer(smooth_idf=True)"""
+        if self._idf is None:
+            self._idf = (
+                np.log((1.0 + self.n_documents) / (1.0 + self.document_frequencies)) + 1.0
+            ).astype(np.float32)
+        return self._idf
+
+    def term_frequencies(self, text: str, digest: Optional[bytes] = None) -> sparse.csr_matrix:
+        """TF-строка текста; векторизация выполняется один раз на текст"""
+        digest = digest or self._digest(text)
+        row = self._tf_cache.get(digest)
+        if row is not None:
+            self._tf_cache.move_to_end(digest)
+            return row
+
+        row = self.vectorizer.transform([text]).tocsr()
+        self._tf_cache[digest] = row
+        while len(self._tf_cache) > self.cache_size:
+            self._tf_cache.popitem(last=False)
+        return row
+
+    def transform(self, text: str) -> sparse.csr_matrix:
+        """Нормированный TF-IDF вектор текста"""
+        row = self.term_frequencies(text).copy()
+        row.data = row.data * self.idf[row.indices]
+        norm = np.sqrt(row.multiply(row).sum())
+        if norm > 0:
+            row.data /= norm
+        return row
+
+    def transform_many(self, texts: List[str]) -> sparse.csr_matrix:
+        """Матрица нормированных TF-IDF векторов (по строке на текст)"""
+        if not texts:
+            return sparse.csr_matrix((0, self.n_features), dtype=np.float64)
+
+        matrix = sparse.vstack([self.term_frequencies(text) for text in texts], format='csr')
+        matrix = matrix @ sparse.diags(self.idf.astype(np.float64))
+        return normalize(matrix, norm='l2', copy=False).tocsr()
+
+    def similarity_matrix(self, texts1: List[str], texts2: List[str]) -> np.ndarray:
+        """Косинусные схожести всех пар одним умножением матриц"""
+        return (self.transform_many(texts1) @ self.transform_many(texts2).T).toarray()
+
+    def similarity(self, text1: str, text2: str) -> float:
+        """Косинусная схожесть - скалярное произведение нормированных векторов"""
+        vector1 = self.transform(text1)
+        vector2 = self.transform(text2)
+        if not vector1.nnz or not vector2.nnz:
+            return 0.0
+        return float(vector1.multiply(vector2).sum())
+
+    def snapshot(self) -> Dict:
+        """Копия документных частот для сохранения в другом потоке"""
+        return {
+            'document_frequencies': self.document_frequencies.copy(),
+            'n_documents': self.n_documents,
+            'seen_documents': b''.join(self._seen_documents),
+        }
+
+    @staticmethod
+    def write_snapshot(state: Dict, path: str):
+        """Атомарная запись снимка на диск: временный файл и переименование"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            document_frequencies=state['document_frequencies'],
+            n_documents=np.array([state['n_documents']]),
+            seen_documents=np.frombuffer(state['seen_documents'], dtype=np.uint8).reshape(-1, 16)
+        )
+        os.replace(tmp_path, path)
+
+    def save(self, path: str):
+        """Сохранение документных частот на диск"""
+        self.write_snapshot(self.snapshot(), path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'CorpusTfidfModel':
+        """Загрузка модели с диска; при отсутствии - пустая модель"""
+        model = cls(**kwargs)
+        if not os.path.exists(path):
+            return model
+
+        try:
+            with np.load(path) as data:
+                if data['document_frequencies'].shape[0] != model.n_features:
+                    logger.warning("Размерность TF-IDF модели изменилась - модель будет построена заново")
+                    return model
+
+                model.document_frequencies = data['document_frequencies'].astype(np.int32)
+                model.n_documents = int(data['n_documents'][0])
+                seen = data['seen_documents'].tobytes()
+                model._seen_documents = {seen[i:i + 16] for i in range(0, len(seen), 16)}
+
+            logger.info(f"TF-IDF модель загружена: {model.n_documents} документов")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки TF-IDF модели {path}: {e}")
+            model = cls(**kwargs)
+
+        return model
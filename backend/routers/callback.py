@@ -0,0 +1,73 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Optional
+from config.settings import settings
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _confirmation_codes() -> Dict[int, str]:
+    """Строки подтверждения из настроек: group_id -> код"""
+    codes = {}
+    for item in settings.VK_CALLBACK_CONFIRMATION_CODES.split(','):
+        group_id, _, code = item.strip().partition(':')
+        if group_id.strip().lstrip('-').isdigit() and code.strip():
+            codes[abs(int(group_id))] = code.strip()
+    return codes
+
+
+def _check_secret(secret: Optional[str]) -> bool:
+    """Без настроенного секретного ключа события не принимаются: их мог прислать кто угодно"""
+    if not settings.VK_CALLBACK_SECRET:
+        return False
+    return hmac.compare_digest(str(secret or ''), settings.VK_CALLBACK_SECRET)
+
+
+@router.post("/callback", response_class=PlainTextResponse)
+async def vk_callback(request: Request, background_tasks: BackgroundTasks):
+    """Прием событий VK Callback API
+    
+    Новые посты (wall_post_new) проверяются на плагиат в фоне сразу после
+    публикации, VK получает "ok" без ожидания проверки. Содержимое события
+    используется только как уведомление: сам пост перечитывается через
+    wall.getById. Периодический опрос стен остается страховкой для потерянных
+    событий.
+    """
+    try:
+        event = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректное тело запроса")
+    
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="Некорректное тело запроса")
+    
+    event_type = event.get("type")
+    try:
+        group_id = int(event.get("group_id") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Некорректный group_id")
+    
+    if not _check_secret(event.get("secret")):
+        logger.warning(f"Событие {event_type} группы {group_id} отклонено: неверный или не настроенный секретный ключ")
+        raise HTTPException(status_code=403, detail="Неверный секретный ключ")
+    
+    if event_type == "confirmation":
+        code = _confirmation_codes().get(abs(group_id))
+        if code is None:
+            logger.warning(f"Нет строки подтверждения Callback API для группы {group_id}")
+            raise HTTPException(status_code=404, detail="Группа не настроена для Callback API")
+        return code
+    
+    if event_type == "wall_post_new":
+        post = event.get("object")
+        if not isinstance(post, dict):
+            raise HTTPException(status_code=400, detail="Некорректный объект события")
+        
+        scheduler = getattr(request.app.state, "scheduler", None)
+        if scheduler is not None:
+            background_tasks.add_task(scheduler.ingest_wall_post, post, group_id)
+    
+    return "ok"
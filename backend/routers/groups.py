@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from database.database import get_db
 from models.user import User
@@ -14,6 +14,7 @@ router = APIRouter()
 @router.post("/", response_model=GroupResponse)
 async def add_group(
     group_data: GroupCreate,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -70,6 +71,11 @@ async def add_group(
     db.commit()
     db.refresh(group)
     
+    # История стены догружается в индексы сразу после добавления
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if scheduler is not None:
+        scheduler.trigger_backfill()
+    
     return group
 
 
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from database.database import get_db
 from models.group import Group
@@ -7,7 +8,9 @@ from models.plagiarism import Plagiarism
 from models.user import User
 from services.vk_api_service import VKAPIService
 from monitoring.plagiarism_detector import PlagiarismDetector
+from schemas.group import GroupBulkConnect
 from datetime import datetime, timedelta
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +21,13 @@ vk_api = VKAPIService()
 detector = PlagiarismDetector()
 
 
+def _trigger_backfill(request: Request):
+    """Запуск догрузки истории в планировщике приложения"""
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if scheduler is not None:
+        scheduler.trigger_backfill()
+
+
 @router.get("/groups")
 async def get_user_groups(user_id: int, db: Session = Depends(get_db)):
     """Получение групп пользователя для подключения"""
@@ -55,6 +65,7 @@ async def get_user_groups(user_id: int, db: Session = Depends(get_db)):
 async def connect_group(
     user_id: int,
     vk_group_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Подключение группы к мониторингу"""
@@ -94,6 +105,9 @@ async def connect_group(
         db.add(new_group)
         db.commit()
         
+        # История стены догружается в индексы сразу после подключения
+        _trigger_backfill(request)
+        
         return {"message": "Группа успешно подключена", "group": group_info}
         
     except HTTPException:
@@ -103,6 +117,94 @@ async def connect_group(
         raise HTTPException(status_code=500, detail="Ошибка подключения группы")
 
 
+@router.post("/groups/connect/bulk")
+async def connect_groups_bulk(
+    data: GroupBulkConnect,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Подключение нескольких групп к мониторингу одним запросом
+    
+    Для каждой группы возвращается статус: connected, activated,
+    already_connected, not_found, taken (группа подключена другим
+    пользователем) или limit_exceeded (исчерпан лимит групп подписки).
+    """
+    user = db.query(User).filter(User.id == data.user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    
+    try:
+        vk_group_ids = list(dict.fromkeys(abs(group_id) for group_id in data.vk_group_ids))
+        
+        # vk_group_id уникален для всех пользователей - проверяются все владельцы
+        existing_groups = {
+            group.vk_group_id: group
+            for group in db.query(Group).filter(Group.vk_group_id.in_(vk_group_ids)).all()
+        }
+        
+        # Лимит подписки считается по активным группам, как в /groups
+        free_slots = user.max_groups - db.query(Group).filter(
+            Group.user_id == user.id,
+            Group.is_active == True
+        ).count()
+        
+        # Информация о всех новых группах - по 500 групп в одном запросе к VK API
+        new_ids = [group_id for group_id in vk_group_ids if group_id not in existing_groups]
+        groups_info = await vk_api.get_groups_info_bulk(new_ids) if new_ids else {}
+        
+        results = []
+        
+        for group_id in vk_group_ids:
+            existing_group = existing_groups.get(group_id)
+            group_info = groups_info.get(group_id)
+            
+            if existing_group is not None and existing_group.user_id != user.id:
+                status = "taken"
+            elif existing_group is not None and existing_group.is_active:
+                status = "already_connected"
+            elif existing_group is None and not group_info:
+                status = "not_found"
+            elif free_slots <= 0:
+                status = "limit_exceeded"
+            elif existing_group is not None:
+                existing_group.is_active = True
+                free_slots -= 1
+                status = "activated"
+            else:
+                db.add(Group(
+                    user_id=user.id,
+                    vk_group_id=group_id,
+                    name=group_info["name"],
+                    screen_name=group_info.get("screen_name"),
+                    photo_url=group_info.get("photo_url"),
+                    description=group_info.get("description"),
+                    is_active=True
+                ))
+                free_slots -= 1
+                status = "connected"
+            
+            item = {"vk_group_id": group_id, "status": status}
+            if status == "connected":
+                item["group"] = group_info
+            results.append(item)
+        
+        db.commit()
+        
+    except IntegrityError:
+        # Группу успели подключить параллельным запросом
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Группы уже подключаются другим запросом, повторите попытку")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка массового подключения групп: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка подключения групп")
+    
+    if any(item["status"] == "connected" for item in results):
+        _trigger_backfill(request)
+    
+    return {"results": results}
+
+
 @router.post("/groups/disconnect")
 async def disconnect_group(
     user_id: int,
@@ -206,25 +308,20 @@ async def get_plagiarism_case(
         if not case:
             raise HTTPException(status_code=404, detail="Случай плагиата не найден")
         
-        # Получаем информацию о постах из VK API
-        original_post = None
-        plagiarized_post = None
-        
-        try:
-            original_post = await vk_api.get_post_by_id(
-                case.original_group_id, 
-                case.original_post_id.split('_')[-1]
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось получить оригинальный пост: {e}")
-        
-        try:
-            plagiarized_post = await vk_api.get_post_by_id(
-                case.plagiarized_group_id,
-                case.plagiarized_post_id.split('_')[-1]
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось получить плагиатный пост: {e}")
+        # Получаем информацию о постах из VK API (оба запроса одновременно, ответы кэшируются)
+        original_post, plagiarized_post = await asyncio.gather(
+            vk_api.get_post_by_id(case.original_group_id, case.original_post_id.split('_')[-1]),
+            vk_api.get_post_by_id(case.plagiarized_group_id, case.plagiarized_post_id.split('_')[-1]),
+            return_exceptions=True
+        )
+        
+        if isinstance(original_post, Exception):
+            logger.warning(f"Не удалось получить оригинальный пост: {original_post}")
+            original_post = None
+        
+        if isinstance(plagiarized_post, Exception):
+            logger.warning(f"Не удалось получить плагиатный пост: {plagiarized_post}")
+            plagiarized_post = None
         
         return {
             "id": case.id,
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -10,6 +10,11 @@ class GroupCreate(BaseModel):
     exclude_reposts: bool = True
 
 
+class GroupBulkConnect(BaseModel):
+    user_id: int
+    vk_group_ids: List[int]
+
+
 class GroupUpdate(BaseModel):
     check_text: Optional[bool] = None
     check_images: Optional[bool] = None
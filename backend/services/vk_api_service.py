@@ -1,7 +1,12 @@
-import vk_api
-import httpx
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Any
 from config.settings import settings
+from services.vk_client import get_vk_client
+from services.vk_execute import get_vk_batcher
+from services.vk_client import VKAPIError
+from services.vk_rate_limiter import backoff_delay
+from services.vk_token_pool import get_token_pool
+from services.vk_cache import get_vk_response_cache
+import asyncio
 import time
 import logging
 
@@ -12,93 +17,215 @@ class VKAPIService:
     def __init__(self):
         self.access_token = settings.VK_ACCESS_TOKEN
         self.group_token = settings.VK_GROUP_TOKEN
-        self.vk_session = vk_api.VkApi(token=self.access_token)
-        self.vk = self.vk_session.get_api()
+        # Общий для процесса асинхронный клиент VK API и пул токенов
+        self.client = get_vk_client()
+        self.token_pool = get_token_pool()
+        # Общий кэш ответов для групп, постов и пользователей
+        self.cache = get_vk_response_cache()
+        # Одновременные вызовы чтения объединяются в execute
+        self.batcher = get_vk_batcher() if settings.VK_EXECUTE_ENABLED else None
         
-        # Настройки для обработки ошибок
-        self.max_retries = 3
-        self.retry_delay = 1  # секунды
+    async def _call(self, method: str, **params) -> Any:
+        """Вызов метода VK API с токеном из пула
         
-    def _handle_vk_error(self, error, operation: str):
-        """Обработка ошибок VK API"""
+        Токен выбирается по типу метода и запасу лимита. Темп запросов задает
+        общий лимитер токена; при ошибке 6 вызов повторяется с экспоненциальной
+        задержкой и джиттером, при ошибках 5/29 - сразу с другим токеном.
+        """
+        for attempt in range(settings.VK_API_MAX_RETRIES + 1):
+            token = self.token_pool.acquire(method)
+            try:
+                if self.batcher is not None:
+                    return await self.batcher.call(method, token, **params)
+                return await self.client.call(method, token, **params)
+            except VKAPIError as e:
+                if attempt == settings.VK_API_MAX_RETRIES:
+                    raise
+                if self.token_pool.report_error(token, e):
+                    continue
+                if e.code != 6:
+                    raise
+                await asyncio.sleep(backoff_delay(
+                    attempt,
+                    base=settings.VK_API_BACKOFF_BASE_SECONDS,
+                    maximum=settings.VK_API_BACKOFF_MAX_SECONDS
+                ))
+    
+    def _log_vk_error(self, error: Exception, operation: str):
+        """Запись ошибки вызова, повторы которого уже исчерпаны в _call"""
         error_code = getattr(error, 'code', None)
         
         if error_code == 6:  # Too many requests per second
-            logger.warning(f"VK API: Слишком много запросов для {operation}")
-            time.sleep(self.retry_delay)
-            return True  # Повторить
+            logger.warning(f"VK API: Слишком много запросов для {operation} - повторы исчерпаны")
         elif error_code == 5:  # Invalid token
             logger.error(f"VK API: Неверный токен для {operation}")
-            return False
         elif error_code == 15:  # Access denied
             logger.warning(f"VK API: Доступ запрещен для {operation}")
-            return False
-        else:
+        elif error_code is not None:
             logger.error(f"VK API ошибка {error_code} для {operation}: {error}")
-            return False
+        else:
+            logger.error(f"Ошибка {operation}: {error}")
     
     async def get_group_info(self, group_id: int) -> Optional[Dict]:
+        """Получение информации о группе (через кэш)"""
+        return await self.cache.get_or_load(
+            ("groups.getById", abs(group_id)),
+            lambda: self._fetch_group_info(group_id)
+        )
+    
+    async def get_groups_info_bulk(self, group_ids: List[int], use_cache: bool = True) -> Dict[int, Dict]:
+        """Информация о многих группах: по 500 id в одном вызове groups.getById
+        
+        Возвращает словарь id группы -> информация в формате get_group_info;
+        ненайденные группы в него не попадают. Полученные ответы кладутся в
+        кэш; с use_cache=False кэш только обновляется (для периодического
+        обновления метаданных).
+        """
+        result = {}
+        missing = []
+        for group_id in dict.fromkeys(abs(group_id) for group_id in group_ids):
+            cached = self.cache.get(("groups.getById", group_id)) if use_cache else None
+            if cached is not None:
+                result[group_id] = cached
+            else:
+                missing.append(group_id)
+        
+        chunks = [missing[i:i + 500] for i in range(0, len(missing), 500)]
+        responses = await asyncio.gather(*(
+            self._call("groups.getById", group_ids=chunk, fields="description,photo_100")
+            for chunk in chunks
+        ), return_exceptions=True)
+        
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Ошибка получения информации о {len(chunk)} группах: {response}")
+                continue
+            
+            for group in response or []:
+                info = {
+                    "id": group["id"],
+                    "name": group["name"],
+                    "screen_name": group.get("screen_name"),
+                    "photo_url": group.get("photo_100"),
+                    "description": group.get("description")
+                }
+                result[group["id"]] = info
+                self.cache.set(("groups.getById", group["id"]), info)
+        
+        return result
+    
+    async def _fetch_group_info(self, group_id: int) -> Optional[Dict]:
         """Получение информации о группе с обработкой ошибок"""
-        for attempt in range(self.max_retries):
-            try:
-                # Убираем минус для групп
-                group_id_positive = abs(group_id)
-                
-                response = self.vk.groups.getById(
-                    group_id=group_id_positive,
-                    fields="description,photo_100"
-                )
-                
-                if response:
-                    group = response[0]
-                    return {
-                        "id": group["id"],
-                        "name": group["name"],
-                        "screen_name": group.get("screen_name"),
-                        "photo_url": group.get("photo_100"),
-                        "description": group.get("description")
-                    }
-                
-            except Exception as e:
-                if hasattr(e, 'code') and self._handle_vk_error(e, f"get_group_info({group_id})"):
-                    continue  # Повторить
-                else:
-                    logger.error(f"Ошибка получения информации о группе {group_id}: {e}")
-                    break
+        try:
+            # Убираем минус для групп
+            group_id_positive = abs(group_id)
+            
+            response = await self._call(
+                "groups.getById",
+                group_id=group_id_positive,
+                fields="description,photo_100"
+            )
+            
+            if response:
+                group = response[0]
+                return {
+                    "id": group["id"],
+                    "name": group["name"],
+                    "screen_name": group.get("screen_name"),
+                    "photo_url": group.get("photo_100"),
+                    "description": group.get("description")
+                }
+            
+        except Exception as e:
+            self._log_vk_error(e, f"get_group_info({group_id})")
         
         return None
     
-    async def get_group_posts(self, group_id: int, count: int = 100) -> List[Dict]:
-        """Получение постов группы с обработкой ошибок"""
-        for attempt in range(self.max_retries):
-            try:
-                # Убираем минус для групп
-                group_id_positive = abs(group_id)
-                
-                response = self.vk.wall.get(
+    async def get_new_group_posts(self, group_id: int, last_post_id: Optional[int] = None,
+                                  max_count: int = 1000) -> Dict:
+        """Получение постов группы, опубликованных после last_post_id
+        
+        Стена листается от новых постов к старым, пока не встретится уже
+        обработанный пост (закрепленный пост не в счет). Без last_post_id
+        загружается одна страница из 100 постов. Если новых постов больше
+        max_count, возвращаются самые старые из них, а остальные получит
+        следующий цикл. Возвращает посты без репостов и самый новый из
+        возвращенных постов - его id и дату нужно сохранить после обработки.
+        При ошибке новых постов нет, чтобы отметка не сдвинулась через
+        пропущенные посты.
+        """
+        group_id_positive = abs(group_id)
+        new_posts = {}
+        offset = 0
+        page_size = min(settings.INCREMENTAL_FIRST_PAGE_SIZE if last_post_id else 100, max_count)
+        
+        try:
+            while True:
+                response = await self._call(
+                    "wall.get",
                     owner_id=-group_id_positive,
-                    count=min(count, 100),  # Ограничиваем количество
+                    offset=offset,
+                    count=page_size,
                     extended=1
                 )
+                items = response.get("items", [])
                 
-                posts = response.get("items", [])
-                
-                # Фильтруем репосты если нужно
-                filtered_posts = []
-                for post in posts:
-                    if not self._is_repost(post):
-                        filtered_posts.append(post)
+                reached_seen = False
+                for post in items:
+                    if last_post_id is not None and post["id"] <= last_post_id:
+                        if not post.get("is_pinned"):
+                            reached_seen = True
+                        continue
+                    # Новые посты во время листания сдвигают смещение - дубликаты отбрасываются
+                    new_posts.setdefault(post["id"], post)
                 
-                return filtered_posts
-                
-            except Exception as e:
-                if hasattr(e, 'code') and self._handle_vk_error(e, f"get_group_posts({group_id})"):
-                    continue  # Повторить
-                else:
-                    logger.error(f"Ошибка получения постов группы {group_id}: {e}")
+                offset += len(items)
+                if (last_post_id is None or reached_seen or len(items) < page_size
+                        or offset >= response.get("count", 0)):
                     break
+                page_size = 100
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения новых постов группы {group_id}: {e}")
+            return {"posts": [], "last_post_id": last_post_id, "last_post_date": None}
         
-        return []
+        posts = sorted(new_posts.values(), key=lambda post: post["id"], reverse=True)
+        if last_post_id is not None:
+            # Отметка сдвигается только через обработанные посты: при всплеске сначала самые старые
+            posts = posts[-max_count:]
+        else:
+            posts = posts[:max_count]
+        newest = posts[0] if posts else None
+        
+        return {
+            "posts": [post for post in posts if not self.is_repost(post)],
+            "last_post_id": newest["id"] if newest else last_post_id,
+            "last_post_date": newest.get("date") if newest else None
+        }
+    
+    async def get_group_posts_page(self, group_id: int, offset: int, count: int = 100) -> Optional[Dict]:
+        """Страница стены группы по смещению (для догрузки истории)
+        
+        Возвращает посты без репостов, число полученных записей и общее
+        число записей на стене; None при ошибке.
+        """
+        try:
+            response = await self._call(
+                "wall.get",
+                owner_id=-abs(group_id),
+                offset=offset,
+                count=min(count, 100),
+                extended=1
+            )
+            items = response.get("items", [])
+            return {
+                "posts": [post for post in items if not self.is_repost(post)],
+                "fetched": len(items),
+                "total": response.get("count", 0)
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы стены группы {group_id} (offset={offset}): {e}")
+            return None
     
     async def get_post_info(self, post_id: str) -> Optional[Dict]:
         """Получение информации о конкретном посте"""
@@ -111,19 +238,13 @@ class VKAPIService:
             owner_id = int(parts[0])
             post_id_num = int(parts[1])
             
-            response = self.vk.wall.getById(
-                posts=f"{owner_id}_{post_id_num}"
-            )
-            
-            if response:
-                return response[0]
-            
         except Exception as e:
             print(f"Ошибка получения информации о посте {post_id}: {e}")
+            return None
         
-        return None
+        return await self.get_post_by_id(owner_id, str(post_id_num))
     
-    def _is_repost(self, post: Dict) -> bool:
+    def is_repost(self, post: Dict) -> bool:
         """Проверка, является ли пост репостом"""
         # Проверка copy_history
         if 'copy_history' in post and post['copy_history']:
@@ -147,34 +268,37 @@ class VKAPIService:
     
     async def send_message(self, user_id: int, message: str, keyboard: Optional[Dict] = None) -> bool:
         """Отправка сообщения пользователю с обработкой ошибок"""
-        for attempt in range(self.max_retries):
-            try:
-                params = {
-                    "user_id": user_id,
-                    "message": message,
-                    "random_id": int(time.time() * 1000)  # Уникальный ID
-                }
-                
-                if keyboard:
-                    params["keyboard"] = keyboard
-                
-                self.vk.messages.send(**params)
-                logger.info(f"Сообщение отправлено пользователю {user_id}")
-                return True
-                
-            except Exception as e:
-                if hasattr(e, 'code') and self._handle_vk_error(e, f"send_message({user_id})"):
-                    continue  # Повторить
-                else:
-                    logger.error(f"Ошибка отправки сообщения пользователю {user_id}: {e}")
-                    break
+        try:
+            params = {
+                "user_id": user_id,
+                "message": message,
+                "random_id": int(time.time() * 1000)  # Уникальный ID
+            }
+            
+            if keyboard:
+                params["keyboard"] = keyboard
+            
+            await self._call("messages.send", **params)
+            logger.info(f"Сообщение отправлено пользователю {user_id}")
+            return True
+            
+        except Exception as e:
+            self._log_vk_error(e, f"send_message({user_id})")
         
         return False
     
     async def get_user_info(self, user_id: int) -> Optional[Dict]:
+        """Получение информации о пользователе (через кэш)"""
+        return await self.cache.get_or_load(
+            ("users.get", user_id),
+            lambda: self._fetch_user_info(user_id)
+        )
+    
+    async def _fetch_user_info(self, user_id: int) -> Optional[Dict]:
         """Получение информации о пользователе"""
         try:
-            response = self.vk.users.get(
+            response = await self._call(
+                "users.get",
                 user_ids=user_id,
                 fields="screen_name,photo_100"
             )
@@ -227,42 +351,41 @@ class VKAPIService:
     
     async def get_user_groups(self, user_id: int) -> List[Dict]:
         """Получение групп пользователя"""
-        for attempt in range(self.max_retries):
-            try:
-                response = self.vk.groups.get(
-                    user_id=user_id,
-                    extended=1,
-                    fields="description,photo_100"
-                )
-                
-                groups = response.get("items", [])
-                return groups
-                
-            except Exception as e:
-                if hasattr(e, 'code') and self._handle_vk_error(e, f"get_user_groups({user_id})"):
-                    continue  # Повторить
-                else:
-                    logger.error(f"Ошибка получения групп пользователя {user_id}: {e}")
-                    break
+        try:
+            response = await self._call(
+                "groups.get",
+                user_id=user_id,
+                extended=1,
+                fields="description,photo_100"
+            )
+            
+            groups = response.get("items", [])
+            return groups
+            
+        except Exception as e:
+            self._log_vk_error(e, f"get_user_groups({user_id})")
         
         return []
     
     async def get_post_by_id(self, owner_id: int, post_id: str) -> Optional[Dict]:
+        """Получение поста по ID (через кэш)"""
+        return await self.cache.get_or_load(
+            ("wall.getById", f"{owner_id}_{post_id}"),
+            lambda: self._fetch_post_by_id(owner_id, post_id)
+        )
+    
+    async def _fetch_post_by_id(self, owner_id: int, post_id: str) -> Optional[Dict]:
         """Получение поста по ID"""
-        for attempt in range(self.max_retries):
-            try:
-                response = self.vk.wall.getById(
-                    posts=f"{owner_id}_{post_id}"
-                )
-                
-                if response:
-                    return response[0]
-                
-            except Exception as e:
-                if hasattr(e, 'code') and self._handle_vk_error(e, f"get_post_by_id({owner_id}_{post_id})"):
-                    continue  # Повторить
-                else:
-                    logger.error(f"Ошибка получения поста {owner_id}_{post_id}: {e}")
-                    break
+        try:
+            response = await self._call(
+                "wall.getById",
+                posts=f"{owner_id}_{post_id}"
+            )
+            
+            if response:
+                return response[0]
+            
+        except Exception as e:
+            self._log_vk_error(e, f"get_post_by_id({owner_id}_{post_id})")
         
         return None 
\ No newline at end of file
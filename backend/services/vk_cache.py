@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TTLResponseCache:
+    """Read-through кэш ответов VK API с TTL и вытеснением давно не использованных
+
+    Одновременные запросы одного ключа объединяются (single-flight): в VK
+    уходит один запрос, остальные ждут его результат. Пустые ответы (None)
+    не кэшируются, чтобы ошибка не закреплялась на весь TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_size: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение из кэша без загрузки; None, если его нет или оно устарело"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Сохранение значения (например, полученного пакетным запросом)"""
+        if value is None:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение из кэша или результат loader(); одновременные промахи делят один вызов"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(loader())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+        self.set(key, value)
+        return value
+
+    def metrics(self) -> Dict:
+        """Размер кэша и доля запросов, обслуженных без обращения к VK"""
+        requests = self.hits + self.coalesced + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.coalesced) / requests if requests else 0.0
+        }
+
+
+_response_cache: Optional[TTLResponseCache] = None
+
+
+def get_vk_response_cache() -> TTLResponseCache:
+    """Общий для процесса кэш ответов VK API"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = TTLResponseCache(
+            ttl_seconds=settings.CACHE_DURATION_HOURS * 3600,
+            max_size=settings.MAX_CACHE_SIZE
+        )
+    return _response_cache
@@ -0,0 +1,124 @@
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config.settings import settings
+from services.vk_rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class VKAPIError(Exception):
+    """Ошибка, возвращенная VK API (поле error ответа)"""
+
+    def __init__(self, code: Optional[int], message: str, method: str = ''):
+        super().__init__(f"[{code}] {message} ({method})")
+        self.code = code
+        self.message = message
+        self.method = method
+
+
+class VKAPIClient:
+    """Асинхронный клиент VK API на общем пуле соединений httpx
+
+    Все запросы идут через один httpx.AsyncClient, поэтому много вызовов
+    могут выполняться одновременно, не блокируя event loop. Перед каждым
+    запросом ожидается разрешение лимитера токена.
+    """
+
+    def __init__(self, base_url: str = "https://api.vk.com/method", version: str = "5.131",
+                 timeout: float = 10.0, max_connections: int = 20):
+        self.base_url = base_url.rstrip('/')
+        self.version = version
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        # Клиент создается лениво внутри работающего event loop
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    @staticmethod
+    def _prepare_params(params: Dict[str, Any]) -> Dict[str, str]:
+        """Приведение параметров к формату VK API: списки через запятую, словари в JSON"""
+        prepared = {}
+        for name, value in params.items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            elif isinstance(value, (list, tuple, set)):
+                value = ','.join(str(item) for item in value)
+            elif isinstance(value, dict):
+                value = json.dumps(value, ensure_ascii=False)
+            prepared[name] = str(value)
+        return prepared
+
+    async def request(self, method: str, access_token: Optional[str] = None, **params) -> Dict:
+        """Запрос к методу VK API; возвращает ответ целиком, вместе с полями ошибок"""
+        data = self._prepare_params(params)
+        data['v'] = self.version
+        if access_token:
+            data['access_token'] = access_token
+
+        limiter = get_rate_limiter(access_token)
+        await limiter.acquire()
+
+        response = await self._get_client().post(f"{self.base_url}/{method}", data=data)
+        response.raise_for_status()
+        payload = response.json()
+
+        # Too many requests per second: токен ставится на паузу для всех ожидающих
+        if payload.get('error', {}).get('error_code') == 6:
+            limiter.penalize(settings.VK_API_PENALTY_SECONDS)
+
+        return payload
+
+    async def call(self, method: str, access_token: Optional[str] = None, **params) -> Any:
+        """Вызов метода VK API; возвращает поле response или бросает VKAPIError"""
+        payload = await self.request(method, access_token, **params)
+
+        if 'error' in payload:
+            error = payload['error']
+            raise VKAPIError(error.get('error_code'), error.get('error_msg', ''), method)
+
+        return payload.get('response')
+
+    async def close(self):
+        """Закрытие пула соединений"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+_vk_client: Optional[VKAPIClient] = None
+
+
+def get_vk_client() -> VKAPIClient:
+    """Общий для процесса клиент VK API"""
+    global _vk_client
+    if _vk_client is None:
+        _vk_client = VKAPIClient(
+            base_url=settings.VK_API_BASE_URL,
+            version=settings.VK_API_VERSION,
+            timeout=settings.VK_API_TIMEOUT_SECONDS,
+            max_connections=settings.VK_API_MAX_CONNECTIONS
+        )
+    return _vk_client
+
+
+async def close_vk_client():
+    """Закрытие общего клиента при остановке приложения"""
+    if _vk_client is not None:
+        await _vk_client.close()
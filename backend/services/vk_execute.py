@@ -0,0 +1,155 @@
+import json
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.vk_client import VKAPIClient, VKAPIError, get_vk_client
+
+logger = logging.getLogger(__name__)
+
+# Отложенный вызов: метод, параметры и future вызывающего
+PendingCall = Tuple[str, Dict[str, Any], asyncio.Future]
+
+
+class VKExecuteBatcher:
+    """Объединение вызовов VK API в один запрос execute (до 25 вызовов)
+
+    Вызовы, пришедшие в течение короткого окна с одним токеном, собираются
+    в VKScript вида return [API.wall.get({...}), ...]; и отправляются одним
+    запросом. Результаты раздаются вызывающим по порядку, ошибки отдельных
+    вызовов (false в ответе + execute_errors) - как VKAPIError.
+
+    Ошибка всего execute (например, 13 - слишком большой ответ) не должна
+    ронять все объединенные вызовы: пачка делится пополам и отправляется
+    заново, одиночный вызов идет напрямую. Ошибки токена и лимитов
+    относятся к каждому вызову одинаково и отдаются всем вызывающим - их
+    повтор с паузой или другим токеном выполняет VKAPIService._call.
+    """
+
+    BATCHABLE_METHODS = frozenset({'wall.get', 'groups.getById', 'wall.getById'})
+    MAX_CALLS = 25
+    # Ошибки токена и лимитов запросов: деление пачки не поможет
+    TOKEN_ERROR_CODES = frozenset({5, 6, 9, 29})
+
+    def __init__(self, client: VKAPIClient, max_calls: int = 25, window_ms: int = 20):
+        self.client = client
+        self.max_calls = max(1, min(max_calls, self.MAX_CALLS))
+        self.window = window_ms / 1000
+
+        self._pending: Dict[Optional[str], List[PendingCall]] = {}
+        self._timers: Dict[Optional[str], asyncio.TimerHandle] = {}
+
+    async def call(self, method: str, access_token: Optional[str] = None, **params) -> Any:
+        """Вызов метода; поддерживаемые методы откладываются до ближайшего execute"""
+        if method not in self.BATCHABLE_METHODS:
+            return await self.client.call(method, access_token, **params)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._pending.setdefault(access_token, [])
+        queue.append((method, params, future))
+
+        if len(queue) >= self.max_calls:
+            self._flush(access_token)
+        elif access_token not in self._timers:
+            self._timers[access_token] = loop.call_later(self.window, self._flush, access_token)
+
+        return await future
+
+    def _flush(self, access_token: Optional[str]):
+        timer = self._timers.pop(access_token, None)
+        if timer is not None:
+            timer.cancel()
+
+        calls = self._pending.pop(access_token, [])
+        if calls:
+            asyncio.ensure_future(self._execute(access_token, calls))
+
+    @staticmethod
+    def _script_value(value: Any) -> Any:
+        """Значение параметра для VKScript: списки через запятую, словари строкой JSON"""
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (list, tuple, set)):
+            return ','.join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def _build_code(self, calls: List[PendingCall]) -> str:
+        """VKScript, возвращающий массив результатов всех вызовов"""
+        expressions = []
+        for method, params, _ in calls:
+            arguments = {name: self._script_value(value) for name, value in params.items() if value is not None}
+            expressions.append(f"API.{method}({json.dumps(arguments, ensure_ascii=False)})")
+        return f"return [{','.join(expressions)}];"
+
+    async def _execute(self, access_token: Optional[str], calls: List[PendingCall]):
+        # Одиночный вызов не оборачивается в execute
+        if len(calls) == 1:
+            method, params, future = calls[0]
+            try:
+                result = await self.client.call(method, access_token, **params)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        try:
+            payload = await self.client.request('execute', access_token, code=self._build_code(calls))
+        except Exception as e:
+            for _, _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if 'error' in payload:
+            error = payload['error']
+            if error.get('error_code') in self.TOKEN_ERROR_CODES:
+                for method, _, future in calls:
+                    if not future.done():
+                        future.set_exception(VKAPIError(error.get('error_code'), error.get('error_msg', ''), method))
+                return
+
+            logger.warning(f"VK execute из {len(calls)} вызовов вернул ошибку {error.get('error_code')} "
+                           f"({error.get('error_msg', '')}) - пачка делится")
+            middle = len(calls) // 2
+            await asyncio.gather(
+                self._execute(access_token, calls[:middle]),
+                self._execute(access_token, calls[middle:])
+            )
+            return
+
+        results = payload.get('response') or []
+        # execute_errors перечислены в порядке неудачных вызовов, на их местах в ответе - false
+        errors = iter(payload.get('execute_errors', []))
+
+        for index, (method, _, future) in enumerate(calls):
+            result = results[index] if index < len(results) else False
+            if result is False:
+                error = next(errors, {})
+                exception = VKAPIError(error.get('error_code'), error.get('error_msg', 'Ошибка в execute'), method)
+                if not future.done():
+                    future.set_exception(exception)
+            elif not future.done():
+                future.set_result(result)
+
+        logger.debug(f"VK execute: {len(calls)} вызовов одним запросом")
+
+
+_vk_batcher: Optional[VKExecuteBatcher] = None
+
+
+def get_vk_batcher() -> VKExecuteBatcher:
+    """Общий для процесса батчер вызовов VK API"""
+    global _vk_batcher
+    if _vk_batcher is None:
+        _vk_batcher = VKExecuteBatcher(
+            get_vk_client(),
+            max_calls=settings.VK_EXECUTE_MAX_CALLS,
+            window_ms=settings.VK_EXECUTE_WINDOW_MS
+        )
+    return _vk_batcher
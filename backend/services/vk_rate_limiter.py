@@ -0,0 +1,125 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketRateLimiter:
+    """Асинхронный token bucket для запросов одного токена VK API
+
+    Корзина пополняется со скоростью rate запросов в секунду до capacity.
+    Ожидающие вызовы обслуживаются строго по очереди (asyncio.Lock отдает
+    блокировку в порядке ожидания), поэтому поток запросов держится на
+    разрешенном потолке без всплесков. После ошибки 6 корзина
+    приостанавливается на время штрафа.
+    """
+
+    def __init__(self, rate: float = 3.0, capacity: float = 3.0):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Метрики
+        self.waiting = 0
+        self.acquired = 0
+        self.penalties = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """Ожидание разрешения на один запрос"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self._blocked_until:
+                        await asyncio.sleep(self._blocked_until - now)
+                        continue
+
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+        wait_time = time.monotonic() - started
+        self.acquired += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def available(self) -> float:
+        """Запас запросов, доступных без ожидания, за вычетом очереди"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return -self.waiting - (self._blocked_until - now) * self.rate
+        self._refill(now)
+        return self._tokens - self.waiting
+
+    def penalize(self, seconds: float):
+        """Пауза после ответа "слишком много запросов": корзина опустошается"""
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self.penalties += 1
+
+    def metrics(self) -> Dict:
+        """Глубина очереди и время ожидания"""
+        return {
+            'rate': self.rate,
+            'queue_depth': self.waiting,
+            'acquired': self.acquired,
+            'penalties': self.penalties,
+            'avg_wait_seconds': self.total_wait_time / self.acquired if self.acquired else 0.0,
+            'max_wait_seconds': self.max_wait_time
+        }
+
+
+def backoff_delay(attempt: int, base: float = 0.5, maximum: float = 8.0) -> float:
+    """Экспоненциальная задержка с полным джиттером для попытки attempt (с нуля)"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+# Лимитеры по токенам - общие для всех экземпляров сервисов в процессе
+_rate_limiters: Dict[Optional[str], TokenBucketRateLimiter] = {}
+
+
+def get_rate_limiter(access_token: Optional[str]) -> TokenBucketRateLimiter:
+    """Лимитер для токена; создается при первом обращении"""
+    limiter = _rate_limiters.get(access_token)
+    if limiter is None:
+        limiter = TokenBucketRateLimiter(
+            rate=settings.VK_API_REQUESTS_PER_SECOND,
+            capacity=settings.VK_API_BURST
+        )
+        _rate_limiters[access_token] = limiter
+    return limiter
+
+
+def rate_limiter_metrics() -> Dict[str, Dict]:
+    """Метрики всех лимитеров; токены показываются только последними символами"""
+    return {
+        (f"...{token[-4:]}" if token else "anonymous"): limiter.metrics()
+        for token, limiter in _rate_limiters.items()
+    }
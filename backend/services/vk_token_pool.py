@@ -0,0 +1,122 @@
+import time
+import logging
+from typing import Dict, List, Optional
+
+from config.settings import settings
+from services.vk_client import VKAPIError
+from services.vk_rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TOKEN = 'service'
+USER_TOKEN = 'user'
+GROUP_TOKEN = 'group'
+
+# Какими типами токенов можно вызывать метод; прочие методы - только пользовательским
+METHOD_TOKEN_KINDS = {
+    'wall.get': (SERVICE_TOKEN, USER_TOKEN),
+    'wall.getById': (SERVICE_TOKEN, USER_TOKEN),
+    'groups.getById': (SERVICE_TOKEN, USER_TOKEN, GROUP_TOKEN),
+    'users.get': (SERVICE_TOKEN, USER_TOKEN, GROUP_TOKEN),
+    'execute': (SERVICE_TOKEN, USER_TOKEN, GROUP_TOKEN),
+    'groups.get': (USER_TOKEN,),
+    'messages.send': (GROUP_TOKEN,),
+}
+
+# Ошибки, после которых токен временно выводится из пула:
+# 5 - токен недействителен, 29 - исчерпан суточный лимит метода
+QUARANTINE_ERROR_CODES = (5, 29)
+
+
+class VKTokenPool:
+    """Пул токенов VK API с балансировкой по запасу лимита
+
+    Для каждого вызова выбирается токен, которому разрешен метод и у
+    которого лимитер дает наибольший запас запросов. Токены с ошибками
+    5/29 уходят на карантин, поэтому пропускная способность растет
+    вместе с числом выданных токенов.
+    """
+
+    def __init__(self, quarantine_seconds: float = 600):
+        self.quarantine_seconds = quarantine_seconds
+        self.tokens: Dict[str, str] = {}  # токен -> тип
+        self._quarantined_until: Dict[str, float] = {}
+        self._rotation = 0
+
+    def add(self, token: Optional[str], kind: str):
+        """Добавление токена в пул; пустые значения пропускаются"""
+        token = (token or '').strip()
+        if token and token not in self.tokens:
+            self.tokens[token] = kind
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def _is_available(self, token: str, now: float) -> bool:
+        return self._quarantined_until.get(token, 0) <= now
+
+    def acquire(self, method: str) -> Optional[str]:
+        """Токен для вызова метода; None, если пул пуст (запрос без токена)"""
+        if not self.tokens:
+            return None
+
+        now = time.monotonic()
+        kinds = METHOD_TOKEN_KINDS.get(method, (USER_TOKEN,))
+        candidates = [
+            token for token, kind in self.tokens.items()
+            if kind in kinds and self._is_available(token, now)
+        ]
+        if not candidates:
+            raise VKAPIError(None, "Нет доступного токена для метода", method)
+
+        # При равном запасе токены чередуются
+        self._rotation += 1
+        offset = self._rotation % len(candidates)
+        candidates = candidates[offset:] + candidates[:offset]
+        return max(candidates, key=lambda token: get_rate_limiter(token).available())
+
+    def report_error(self, token: Optional[str], error: VKAPIError) -> bool:
+        """Учет ошибки токена; True, если токен отправлен на карантин"""
+        if token is None or error.code not in QUARANTINE_ERROR_CODES:
+            return False
+
+        self._quarantined_until[token] = time.monotonic() + self.quarantine_seconds
+        logger.warning(
+            f"Токен ...{token[-4:]} ({self.tokens.get(token)}) на карантине "
+            f"{self.quarantine_seconds} с после ошибки {error.code}"
+        )
+        return True
+
+    def status(self) -> List[Dict]:
+        """Состояние токенов пула; токены показываются только последними символами"""
+        now = time.monotonic()
+        return [
+            {
+                'token': f"...{token[-4:]}",
+                'kind': kind,
+                'quarantine_seconds_left': max(0.0, self._quarantined_until.get(token, 0) - now)
+            }
+            for token, kind in self.tokens.items()
+        ]
+
+
+def _split_tokens(value: Optional[str]) -> List[str]:
+    return [token.strip() for token in (value or '').split(',') if token.strip()]
+
+
+_token_pool: Optional[VKTokenPool] = None
+
+
+def get_token_pool() -> VKTokenPool:
+    """Общий для процесса пул токенов из настроек"""
+    global _token_pool
+    if _token_pool is None:
+        _token_pool = VKTokenPool(quarantine_seconds=settings.VK_TOKEN_QUARANTINE_SECONDS)
+        for token in _split_tokens(settings.VK_SERVICE_TOKENS):
+            _token_pool.add(token, SERVICE_TOKEN)
+        for token in [settings.VK_ACCESS_TOKEN] + _split_tokens(settings.VK_USER_TOKENS):
+            _token_pool.add(token, USER_TOKEN)
+        for token in [settings.VK_GROUP_TOKEN] + _split_tokens(settings.VK_GROUP_TOKENS):
+            _token_pool.add(token, GROUP_TOKEN)
+        logger.info(f"Пул токенов VK: {len(_token_pool)} токенов")
+    return _token_pool
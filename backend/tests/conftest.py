@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+# Тесты не трогают рабочие индексы, кэши и базу: все хранилища - во временном каталоге
+_workdir = tempfile.mkdtemp(prefix='vk_plagiat_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['MINHASH_INDEX_PATH'] = os.path.join(_workdir, 'minhash_index.pkl')
+os.environ['TFIDF_MODEL_PATH'] = os.path.join(_workdir, 'tfidf_model.npz')
+os.environ['IMAGE_HASH_CACHE_PATH'] = os.path.join(_workdir, 'image_hashes.sqlite3')
+os.environ['IMAGE_INDEX_PATH'] = os.path.join(_workdir, 'image_index.pkl')
+# Детекция в текущем процессе: воркеры пула не нужны для проверки логики
+os.environ['DETECTION_WORKERS'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def clean_database():
+    """Пустые таблицы во временной SQLite базе"""
+    from database.database import Base, engine
+    from models.user import User  # noqa: F401 - таблицы для create_all
+    from models.group import Group  # noqa: F401
+    from models.plagiarism import Plagiarism  # noqa: F401
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clean_indexes():
+    """Каждый тест начинает с пустых индексов: планировщик сохраняет их на диск"""
+    for name in ('MINHASH_INDEX_PATH', 'IMAGE_INDEX_PATH', 'TFIDF_MODEL_PATH', 'IMAGE_HASH_CACHE_PATH'):
+        path = os.environ[name]
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    yield
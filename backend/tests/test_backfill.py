@@ -0,0 +1,108 @@
+"""Догрузка истории стены не останавливает цикл мониторинга других групп"""
+import asyncio
+import random
+import time
+
+import pytest
+
+from database.database import SessionLocal
+from models.user import User
+from models.group import Group
+from monitoring.scheduler import MonitoringScheduler
+
+ARCHIVE_GROUP = 4001
+MONITORED_GROUP = 4002
+ARCHIVE_POSTS = 2000
+
+WORDS = (
+    "новости город погода концерт выставка музей парк театр фестиваль скидка акция магазин "
+    "школа спорт матч команда победа рецепт пирог кофе книга фильм премьера билеты вход"
+).split()
+
+
+class ArchiveStub:
+    """Длинная стена одной группы для догрузки и несколько новых постов другой"""
+
+    def __init__(self):
+        rng = random.Random(1)
+        self.archive = [
+            {'id': post_id, 'owner_id': -ARCHIVE_GROUP, 'date': post_id,
+             'text': ' '.join(rng.choice(WORDS) for _ in range(40))}
+            for post_id in range(ARCHIVE_POSTS, 0, -1)
+        ]
+
+    async def get_group_posts_page(self, group_id, offset, count=100):
+        await asyncio.sleep(0)
+        items = self.archive[offset:offset + count]
+        return {'posts': items, 'fetched': len(items), 'total': len(self.archive)}
+
+    async def get_new_group_posts(self, group_id, last_post_id=None, max_count=1000):
+        await asyncio.sleep(0.01)
+        posts = [
+            {'id': post_id, 'owner_id': -MONITORED_GROUP, 'date': 10 ** 6 + post_id,
+             'text': f"Новый пост номер {post_id} о городском фестивале уличной еды"}
+            for post_id in (1, 2, 3)
+        ]
+        return {'posts': posts, 'last_post_id': 3, 'last_post_date': 10 ** 6 + 3}
+
+    @staticmethod
+    def is_repost(post):
+        return False
+
+
+@pytest.fixture
+def scheduler(clean_database):
+    db = SessionLocal()
+    for vk_id, group_id in ((1, ARCHIVE_GROUP), (2, MONITORED_GROUP)):
+        user = User(vk_id=vk_id)
+        db.add(user)
+        db.flush()
+        db.add(Group(vk_group_id=group_id, name=str(group_id), user_id=user.id,
+                     backfill_completed=group_id == MONITORED_GROUP))
+    db.commit()
+    db.close()
+
+    scheduler = MonitoringScheduler()
+    scheduler.vk_api = ArchiveStub()
+    yield scheduler
+    scheduler.detection_executor.shutdown()
+
+
+def test_backfill_does_not_starve_monitoring(scheduler):
+    async def scenario():
+        stalls = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            # Самая долгая пауза event loop - столько ждали бы остальные задачи
+            previous = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                stalls.append(now - previous)
+                previous = now
+
+        ticker = asyncio.ensure_future(heartbeat())
+        backfill = asyncio.ensure_future(scheduler.run_backfill())
+        await asyncio.sleep(0)
+
+        await scheduler.run_monitoring()
+        monitoring_done_first = not backfill.done()
+
+        await backfill
+        stop.set()
+        await ticker
+        return monitoring_done_first, max(stalls)
+
+    monitoring_done_first, max_stall = asyncio.run(scenario())
+
+    db = SessionLocal()
+    try:
+        archive = db.query(Group).filter(Group.vk_group_id == ARCHIVE_GROUP).one()
+        assert archive.backfill_completed and archive.backfill_offset == ARCHIVE_POSTS
+        assert db.query(Group).filter(Group.vk_group_id == MONITORED_GROUP).one().last_post_id == 3
+    finally:
+        db.close()
+
+    assert monitoring_done_first
+    assert max_stall < 0.25, max_stall
@@ -0,0 +1,136 @@
+"""Отметка опроса (last_post_id) при одновременной работе Callback API и опроса"""
+import asyncio
+
+import pytest
+
+from database.database import SessionLocal
+from models.user import User
+from models.group import Group
+from monitoring.scheduler import MonitoringScheduler
+
+GROUP_ID = 1001
+
+
+class WallStub:
+    """Стена одной группы вместо VKAPIService: wall.get и wall.getById"""
+
+    def __init__(self, posts):
+        self.posts = {post['id']: post for post in posts}
+
+    async def get_post_by_id(self, owner_id, post_id):
+        return self.posts.get(int(post_id))
+
+    async def get_new_group_posts(self, group_id, last_post_id=None, max_count=1000):
+        posts = sorted(
+            (post for post in self.posts.values() if last_post_id is None or post['id'] > last_post_id),
+            key=lambda post: post['id'], reverse=True
+        )[:max_count]
+        newest = posts[0] if posts else None
+        return {
+            'posts': posts,
+            'last_post_id': newest['id'] if newest else last_post_id,
+            'last_post_date': newest['date'] if newest else None
+        }
+
+    @staticmethod
+    def is_repost(post):
+        return bool(post.get('copy_history'))
+
+
+def _post(post_id, text):
+    return {'id': post_id, 'owner_id': -GROUP_ID, 'date': 1700000000 + post_id, 'text': text}
+
+
+@pytest.fixture
+def scheduler(clean_database):
+    db = SessionLocal()
+    user = User(vk_id=1)
+    db.add(user)
+    db.flush()
+    db.add(Group(vk_group_id=GROUP_ID, name="Группа", user_id=user.id, last_post_id=100))
+    db.commit()
+    db.close()
+
+    scheduler = MonitoringScheduler()
+    scheduler.vk_api = WallStub([
+        _post(100, "Старый пост, уже обработанный опросом в прошлом цикле"),
+        _post(101, "Пост, опубликованный до события и еще не опрошенный"),
+        _post(102, "Еще один пост, который увидит только опрос стены"),
+        _post(103, "Настоящий текст поста, который пришел через Callback API"),
+    ])
+
+    checked = []
+    check_posts = scheduler.check_posts_for_plagiarism
+
+    async def recording_check(posts, group, db, index_posts=False):
+        checked.extend((post.post_id, post.text) for post in posts)
+        return await check_posts(posts, group, db, index_posts=index_posts)
+
+    scheduler.check_posts_for_plagiarism = recording_check
+    scheduler.checked = checked
+    yield scheduler
+    scheduler.detection_executor.shutdown()
+
+
+def _group():
+    db = SessionLocal()
+    try:
+        return db.query(Group).filter(Group.vk_group_id == GROUP_ID).one()
+    finally:
+        db.close()
+
+
+def _poll(scheduler):
+    db = SessionLocal()
+    try:
+        group = db.query(Group).filter(Group.vk_group_id == GROUP_ID).one()
+        asyncio.run(scheduler.monitor_group(group, db))
+    finally:
+        db.close()
+
+
+def test_callback_does_not_move_poll_mark(scheduler):
+    forged = dict(_post(103, "Подмененный текст из тела запроса"))
+
+    assert asyncio.run(scheduler.ingest_wall_post(forged, GROUP_ID))
+    # Проверяется пост, перечитанный через wall.getById, а не тело события
+    assert scheduler.checked == [(103, "Настоящий текст поста, который пришел через Callback API")]
+    assert _group().last_post_id == 100
+
+    # Опрос видит посты до события, а пришедший по событию повторно не проверяет
+    _poll(scheduler)
+    assert sorted(post_id for post_id, _ in scheduler.checked) == [101, 102, 103]
+    assert _group().last_post_id == 103
+
+
+def test_repeated_callback_and_old_posts_are_skipped(scheduler):
+    assert asyncio.run(scheduler.ingest_wall_post(_post(103, ""), GROUP_ID))
+    assert not asyncio.run(scheduler.ingest_wall_post(_post(103, ""), GROUP_ID))
+    assert not asyncio.run(scheduler.ingest_wall_post(_post(100, ""), GROUP_ID))
+    assert not asyncio.run(scheduler.ingest_wall_post(_post(999, ""), GROUP_ID))
+    assert [post_id for post_id, _ in scheduler.checked] == [103]
+
+
+async def _send_event(event):
+    import httpx
+    from fastapi import FastAPI
+    from routers import callback
+
+    app = FastAPI()
+    app.include_router(callback.router, prefix="/api/vk")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/api/vk/callback", json=event)
+
+
+def test_callback_requires_configured_secret(monkeypatch):
+    from config.settings import settings
+
+    event = {'type': 'wall_post_new', 'group_id': GROUP_ID, 'object': _post(103, "")}
+
+    monkeypatch.setattr(settings, 'VK_CALLBACK_SECRET', None)
+    assert asyncio.run(_send_event(event)).status_code == 403
+
+    monkeypatch.setattr(settings, 'VK_CALLBACK_SECRET', 'secret')
+    assert asyncio.run(_send_event(dict(event, secret='wrong'))).status_code == 403
+    assert asyncio.run(_send_event(dict(event, secret='secret'))).text == 'ok'
+    assert asyncio.run(_send_event(dict(event, secret='secret', group_id='abc'))).status_code == 400
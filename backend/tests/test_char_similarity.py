@@ -0,0 +1,76 @@
+"""Режим kgram для длинных текстов дает ту же шкалу схожести, что и SequenceMatcher"""
+import random
+
+import pytest
+
+from monitoring.plagiarism_detector import PlagiarismDetector
+
+ALPHABET = "абвгдежзийклмнопрстуфхцчшщыьэюяоеаи"
+
+
+def _vocabulary(rng, size=3000):
+    return [''.join(rng.choice(ALPHABET) for _ in range(max(2, int(rng.gauss(6, 2.5))))) for _ in range(size)]
+
+
+def _paraphrase(rng, vocabulary, text, rate):
+    """Пересказ: замена, вставка и удаление слов с вероятностью rate"""
+    words = []
+    for word in text.split():
+        if rng.random() >= rate:
+            words.append(word)
+            continue
+        edit = rng.choice(('replace', 'insert', 'delete'))
+        if edit == 'replace':
+            words.append(rng.choice(vocabulary))
+        elif edit == 'insert':
+            words.extend((word, rng.choice(vocabulary)))
+    return ' '.join(words)
+
+
+def _detector(mode):
+    detector = PlagiarismDetector()
+    detector.char_similarity_mode = mode
+    return detector
+
+
+@pytest.fixture(scope='module')
+def long_pairs():
+    rng = random.Random(11)
+    vocabulary = _vocabulary(rng)
+    pairs = []
+    for rate in (0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5) * 5:
+        original = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(160, 320)))
+        pairs.append((rate, original, _paraphrase(rng, vocabulary, original, rate)))
+    return pairs
+
+
+def test_kgram_mode_matches_sequence_matcher_on_long_texts(long_pairs):
+    sequence, kgram = _detector('sequence'), _detector('kgram')
+    threshold = sequence.text_similarity_threshold
+
+    differences, disagreements = [], []
+    for rate, original, target in long_pairs:
+        assert len(original) > kgram.max_sequence_length
+        expected = sequence._calculate_char_similarity(original, target)
+        actual = kgram._calculate_char_similarity(original, target)
+        differences.append(abs(actual - expected))
+        if (actual >= threshold) != (expected >= threshold):
+            disagreements.append((rate, expected, actual))
+
+    # Нет систематического занижения, расхождения решений - только у самого порога
+    assert sum(differences) / len(differences) < 0.04
+    assert len(disagreements) <= len(long_pairs) // 10
+    assert all(abs(expected - threshold) < 0.05 for _, expected, _ in disagreements)
+
+
+@pytest.mark.parametrize('rate', [0.2, 0.3])
+def test_auto_mode_scores_long_substitution_like_sequence_matcher(rate):
+    rng = random.Random(int(rate * 100))
+    vocabulary = _vocabulary(rng)
+    original = ' '.join(rng.choice(vocabulary) for _ in range(300))
+    target = ' '.join(rng.choice(vocabulary) if rng.random() < rate else word for word in original.split())
+
+    expected = _detector('sequence')._calculate_char_similarity(original, target)
+    actual = _detector('auto')._calculate_char_similarity(original, target)
+
+    assert actual == pytest.approx(expected, abs=0.05)
@@ -0,0 +1,73 @@
+"""Массовое подключение групп: лимит подписки, чужие группы и статус каждой группы"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from database.database import SessionLocal
+from models.user import User
+from models.group import Group
+from routers import monitoring
+
+
+async def _groups_info_stub(group_ids, use_cache=True):
+    # Группа 404 в VK не найдена
+    return {group_id: {"id": group_id, "name": f"Группа {group_id}"} for group_id in group_ids if group_id != 404}
+
+
+def _prepare():
+    db = SessionLocal()
+    try:
+        owner = User(vk_id=1, first_name="Владелец", max_groups=3)
+        other = User(vk_id=2, first_name="Другой", max_groups=3)
+        db.add_all([owner, other])
+        db.flush()
+        db.add_all([
+            Group(vk_group_id=10, name="Активная", user_id=owner.id, is_active=True),
+            Group(vk_group_id=11, name="Отключенная", user_id=owner.id, is_active=False),
+            Group(vk_group_id=20, name="Чужая", user_id=other.id, is_active=True),
+        ])
+        db.commit()
+        return owner.id
+    finally:
+        db.close()
+
+
+async def _connect(user_id, vk_group_ids):
+    app = FastAPI()
+    app.include_router(monitoring.router, prefix="/api/monitoring")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/api/monitoring/groups/connect/bulk",
+                                 json={"user_id": user_id, "vk_group_ids": vk_group_ids})
+
+
+def test_bulk_connect_reports_status_per_group(clean_database, monkeypatch):
+    monkeypatch.setattr(monitoring.vk_api, 'get_groups_info_bulk', _groups_info_stub)
+    user_id = _prepare()
+
+    response = asyncio.run(_connect(user_id, [10, 20, 404, 11, 30, 31]))
+
+    assert response.status_code == 200
+    statuses = {item["vk_group_id"]: item["status"] for item in response.json()["results"]}
+    # Лимит 3: активная группа 10 уже занимает место, 11 и 30 - последние свободные
+    assert statuses == {
+        10: "already_connected",
+        20: "taken",
+        404: "not_found",
+        11: "activated",
+        30: "connected",
+        31: "limit_exceeded",
+    }
+
+    db = SessionLocal()
+    try:
+        owned = {group.vk_group_id for group in db.query(Group).filter(Group.user_id == user_id, Group.is_active == True)}
+        assert owned == {10, 11, 30}
+        assert db.query(Group).filter(Group.vk_group_id == 20).one().user_id != user_id
+    finally:
+        db.close()
+
+
+def test_bulk_connect_unknown_user(clean_database):
+    response = asyncio.run(_connect(999, [10]))
+    assert response.status_code == 404
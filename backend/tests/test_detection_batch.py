@@ -0,0 +1,100 @@
+"""Пакетная детекция дает те же результаты, что и попарные вызовы detect_plagiarism"""
+import random
+
+import pytest
+
+from monitoring.plagiarism_detector import PlagiarismDetector
+from test_text_cascade import FOOTER, _mutate, _random_text
+
+
+def _photo(owner_id, photo_id):
+    return {'type': 'photo', 'photo': {
+        'owner_id': owner_id, 'id': photo_id,
+        'sizes': [{'type': 'x', 'url': f"http://img/{owner_id}_{photo_id}.jpg", 'width': 640, 'height': 480}]
+    }}
+
+
+def _posts(detector, rng):
+    """Оригиналы и посты с копиями, перепечатками со ссылкой, репостами и общими фото"""
+    originals, targets = [], []
+    phashes = {}
+
+    for i in range(12):
+        owner_id = -(i + 1)
+        text = _random_text(rng, rng.randint(3, 40))
+        originals.append({'id': i, 'owner_id': owner_id, 'date': 1000 + i, 'text': text,
+                          'attachments': [_photo(owner_id, i)]})
+        phashes[f"{owner_id}_{i}"] = rng.getrandbits(64)
+
+    for j in range(15):
+        owner_id = -(100 + j)
+        source = rng.choice(originals)
+        kind = j % 5
+        if kind == 0:
+            text = _mutate(rng, source['text'], 0.1)
+        elif kind == 1:
+            text = f"{source['text']} {FOOTER}"
+        elif kind == 2:
+            text = f"{source['text']} vk.com/wall{source['owner_id']}_{source['id']}"
+        else:
+            text = _random_text(rng, rng.randint(3, 40))
+        post = {'id': j, 'owner_id': owner_id, 'date': 500 if j % 7 == 6 else 2000, 'text': text,
+                'attachments': [_photo(owner_id, j)]}
+        if kind == 3:
+            post['copy_history'] = [source]
+        targets.append(post)
+        # Половина фото - копии фото оригинала с небольшим расхождением хэшей
+        source_hash = phashes[f"{source['owner_id']}_{source['id']}"]
+        phashes[f"{owner_id}_{j}"] = (
+            source_hash ^ (1 << rng.randrange(64)) if j % 2 else rng.getrandbits(64)
+        )
+
+    def features(post):
+        post_features = detector.extract_features(post)
+        for photo_id in post_features.image_ids:
+            # dHash для предфильтра берется тем же: важно только расстояние между копиями
+            post_features.image_hashes[photo_id] = f"{phashes[photo_id]:016x}"
+            post_features.image_dhashes[photo_id] = f"{phashes[photo_id]:016x}"
+        return post_features
+
+    return [features(post) for post in originals], [features(post) for post in targets]
+
+
+@pytest.fixture(scope='module')
+def detector_and_posts():
+    detector = PlagiarismDetector()
+    detector.image_hash_cache = None
+    originals, targets = _posts(detector, random.Random(3))
+    detector.tfidf_model.partial_fit_many([post.clean_text for post in originals + targets])
+    return detector, originals, targets
+
+
+def _comparable(result):
+    return {key: pytest.approx(value) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def test_block_matches_single_detection(detector_and_posts):
+    detector, originals, targets = detector_and_posts
+
+    block = detector.detect_plagiarism_block(originals, targets)
+
+    decisions = set()
+    for i, original in enumerate(originals):
+        for j, target in enumerate(targets):
+            single = detector.detect_plagiarism(original, target)
+            assert block[i][j] == _comparable(single), (i, j)
+            decisions.add((single['text_plagiarism'], single['image_plagiarism'], single['text_reason']))
+    # Набор покрывает плагиат только по тексту и только по фото, репосты, ранние посты и ссылки на оригинал
+    assert any(text and not image for text, image, _ in decisions)
+    assert any(image and not text for text, image, _ in decisions)
+    assert {reason for _, _, reason in decisions} >= {
+        "Пост является репостом", "Пост опубликован раньше оригинала", "Пост содержит ссылку на оригинал"
+    }
+
+
+def test_batch_matches_single_detection(detector_and_posts):
+    detector, originals, targets = detector_and_posts
+
+    for target in targets:
+        batch = detector.detect_plagiarism_batch(target, originals)
+        assert batch == [_comparable(detector.detect_plagiarism(original, target)) for original in originals]
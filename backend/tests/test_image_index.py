@@ -0,0 +1,175 @@
+"""Индекс изображений: запрос должен совпадать с полным перебором"""
+import random
+
+import numpy as np
+
+from monitoring.hamming_index import hamming_distance, popcount64
+from monitoring.image_index import ImageHashIndex
+from monitoring.post_features import PostFeatures
+
+
+def _random_hash(rng):
+    return rng.getrandbits(64)
+
+
+def _near_hash(rng, value, bits):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def _post(post_id, hashes):
+    ids = tuple(f"-1_{post_id}_{i}" for i in range(len(hashes)))
+    return PostFeatures(owner_id=-1, post_id=post_id, image_ids=ids,
+                        image_dhashes={photo_id: f"{value:016x}" for photo_id, value in zip(ids, hashes)})
+
+
+def _linear_scan(index, value, max_distance):
+    matches = []
+    for photo_id, (stored, post_key) in index.photos.items():
+        distance = hamming_distance(stored, value)
+        if distance <= max_distance:
+            matches.append((photo_id, post_key, distance))
+    return sorted(matches, key=lambda item: (item[2], item[0]))
+
+
+def _build(rng, max_photos):
+    index = ImageHashIndex(max_distance=12, max_photos=max_photos)
+    base = [_random_hash(rng) for _ in range(50)]
+    for post_id in range(600):
+        # Часть фото - близкие копии небольшого набора, чтобы совпадений было много
+        hashes = [_near_hash(rng, rng.choice(base), rng.randint(0, 16)) if rng.random() < 0.6 else _random_hash(rng)
+                  for _ in range(rng.randint(1, 4))]
+        index.add_post(_post(post_id, hashes))
+    return index, base
+
+
+def _assert_matches_scan(index, rng, base):
+    for _ in range(200):
+        value = _near_hash(rng, rng.choice(base), rng.randint(0, 20)) if rng.random() < 0.7 else _random_hash(rng)
+        for max_distance in (0, 6, 12, 16):
+            result = index.query(f"{value:016x}", max_distance)
+            assert sorted(result, key=lambda item: (item[2], item[0])) == _linear_scan(index, value, max_distance)
+            assert [distance for _, _, distance in result] == sorted(distance for _, _, distance in result)
+
+
+def test_popcount_matches_python():
+    rng = random.Random(1)
+    values = [0, 1, 2 ** 64 - 1, 2 ** 63] + [_random_hash(rng) for _ in range(1000)]
+    counts = popcount64(np.array(values, dtype=np.uint64))
+    assert counts.tolist() == [bin(value).count('1') for value in values]
+
+
+def test_query_matches_linear_scan():
+    rng = random.Random(2)
+    index, base = _build(rng, max_photos=100000)
+    _assert_matches_scan(index, rng, base)
+
+
+def test_query_matches_linear_scan_after_eviction_and_reload(tmp_path):
+    rng = random.Random(3)
+    index, base = _build(rng, max_photos=300)
+    assert len(index) == 300
+    _assert_matches_scan(index, rng, base)
+
+    path = str(tmp_path / 'image_index.pkl')
+    index.save(path)
+    loaded = ImageHashIndex.load(path, max_distance=12, max_photos=300)
+    assert loaded.photos == index.photos
+    _assert_matches_scan(loaded, rng, base)
+
+
+def test_query_many_matches_query():
+    rng = random.Random(4)
+    index, base = _build(rng, max_photos=100000)
+    hashes = [f"{_near_hash(rng, value, 3):016x}" for value in base[:10]]
+    assert index.query_many(hashes) == [index.query(dhash) for dhash in hashes]
+
+
+class _FetcherStub:
+    def __init__(self, contents):
+        self.contents = contents
+        self.requested = []
+
+    async def fetch_many(self, urls):
+        urls = list(urls)
+        self.requested.extend(urls)
+        return {url: self.contents.get(url) for url in urls}
+
+
+def _jpeg(seed):
+    from io import BytesIO
+    from PIL import Image, ImageFilter
+
+    pixels = (np.random.default_rng(seed).random((48, 64, 3)) * 255).astype('uint8')
+    img = Image.fromarray(pixels).resize((640, 480), Image.BICUBIC).filter(ImageFilter.GaussianBlur(6))
+    buffer = BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _photo_post(detector, post_id, photo_id, url, date):
+    return detector.extract_features({
+        'id': post_id, 'owner_id': -post_id, 'date': date, 'text': '',
+        'attachments': [{'type': 'photo', 'photo': {
+            'owner_id': -post_id, 'id': int(photo_id.split('_')[1]),
+            'sizes': [{'type': 'x', 'url': url, 'width': 640, 'height': 480}]
+        }}]
+    })
+
+
+def test_prefetch_keeps_phash_with_post_and_detection_does_not_download(monkeypatch):
+    import asyncio
+    from monitoring import plagiarism_detector
+    from monitoring.plagiarism_detector import PlagiarismDetector
+
+    detector = PlagiarismDetector()
+    detector.image_hash_cache = None
+    fetcher = _FetcherStub({'http://img/1.jpg': _jpeg(1), 'http://img/2.jpg': _jpeg(1)})
+    monkeypatch.setattr(plagiarism_detector, 'get_image_fetcher', lambda: fetcher)
+
+    original = _photo_post(detector, 1, '-1_10', 'http://img/1.jpg', 100)
+    copy = _photo_post(detector, 2, '-2_20', 'http://img/2.jpg', 200)
+    # Известный только dHash (pHash вытеснен вместе с кэшем) не избавляет от загрузки
+    copy.image_dhashes['-2_20'] = '0' * 16
+
+    assert asyncio.run(detector.prefetch_image_hashes([original, copy])) == 2
+    assert set(original.image_hashes) == {'-1_10'} and set(copy.image_hashes) == {'-2_20'}
+
+    # Компактные признаки из индекса несут pHash - детекция обходится без кэша и сети
+    fetcher.contents.clear()
+    result = detector.detect_plagiarism(original.compact(), copy.compact())
+    assert result['image_plagiarism']
+    assert asyncio.run(detector.prefetch_image_hashes([original, copy])) == 0
+    assert len(fetcher.requested) == 2
+
+
+def test_prefetch_hashes_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+    from monitoring import plagiarism_detector
+    from monitoring.plagiarism_detector import PlagiarismDetector
+
+    detector = PlagiarismDetector()
+    fetcher = _FetcherStub({'http://img/1.jpg': _jpeg(1)})
+    monkeypatch.setattr(plagiarism_detector, 'get_image_fetcher', lambda: fetcher)
+
+    threads = []
+    hash_image = detector._hash_image
+    cache_get = detector.image_hash_cache.get
+
+    def record(func):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return func(*args)
+        return wrapper
+
+    monkeypatch.setattr(detector, '_hash_image', record(hash_image))
+    monkeypatch.setattr(detector.image_hash_cache, 'get', record(cache_get))
+
+    post = _photo_post(detector, 1, '-1_10', 'http://img/1.jpg', 100)
+    assert asyncio.run(detector.prefetch_image_hashes([post])) == 1
+    assert set(post.image_hashes) == {'-1_10'}
+
+    # Декодирование, хэширование и SQLite - в пуле потоков, не в event loop
+    assert threads and threading.main_thread() not in threads
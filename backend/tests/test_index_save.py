@@ -0,0 +1,38 @@
+"""Индексы сохраняются на диск только после изменений"""
+import asyncio
+import os
+
+from config.settings import settings
+from monitoring.scheduler import MonitoringScheduler
+from monitoring.minhash_index import MinHashLSHIndex
+from monitoring.image_index import ImageHashIndex
+
+
+def test_indexes_saved_only_when_changed():
+    scheduler = MonitoringScheduler()
+    try:
+        for path in (settings.MINHASH_INDEX_PATH, settings.IMAGE_INDEX_PATH, settings.TFIDF_MODEL_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+        asyncio.run(scheduler._save_candidate_index())
+        assert not os.path.exists(settings.MINHASH_INDEX_PATH)
+
+        post = scheduler.detector.extract_features({
+            'id': 1, 'owner_id': -5, 'date': 100,
+            'text': "Текст поста достаточной длины, чтобы попасть в индекс кандидатов",
+        })
+        assert scheduler.index_post(post)
+        asyncio.run(scheduler._save_candidate_index())
+
+        assert post.key in MinHashLSHIndex.load(settings.MINHASH_INDEX_PATH).posts
+        assert os.path.exists(settings.TFIDF_MODEL_PATH)
+        assert len(ImageHashIndex.load(settings.IMAGE_INDEX_PATH)) == 0
+
+        # Без новых постов файл не перезаписывается
+        modified = os.path.getmtime(settings.MINHASH_INDEX_PATH)
+        assert not scheduler.index_post(post)
+        asyncio.run(scheduler._save_candidate_index())
+        assert os.path.getmtime(settings.MINHASH_INDEX_PATH) == modified
+    finally:
+        scheduler.detection_executor.shutdown()
@@ -0,0 +1,49 @@
+"""Новые посты группы после отметки: всплеск больше max_count разбирается за несколько циклов"""
+import asyncio
+
+from services.vk_api_service import VKAPIService
+
+
+class WallService(VKAPIService):
+    """VKAPIService со стеной из памяти вместо вызова wall.get"""
+
+    def __init__(self, post_ids, pinned=None):
+        super().__init__()
+        posts = [{'id': post_id, 'date': post_id, 'text': ''} for post_id in sorted(post_ids, reverse=True)]
+        if pinned is not None:
+            posts.insert(0, {'id': pinned, 'date': pinned, 'text': '', 'is_pinned': 1})
+        self.wall = posts
+        self.calls = 0
+
+    async def _call(self, method, **params):
+        assert method == 'wall.get'
+        self.calls += 1
+        offset, count = params['offset'], params['count']
+        return {'count': len(self.wall), 'items': self.wall[offset:offset + count]}
+
+
+def _poll(service, last_post_id, max_count):
+    return asyncio.run(service.get_new_group_posts(1, last_post_id, max_count=max_count))
+
+
+def test_burst_larger_than_max_count_is_processed_over_cycles():
+    service = WallService(range(1, 351), pinned=5)
+    mark = 10
+    seen = []
+
+    for _ in range(4):
+        fetched = _poll(service, mark, max_count=120)
+        seen.extend(post['id'] for post in fetched['posts'])
+        assert fetched['last_post_id'] == max([mark] + [post['id'] for post in fetched['posts']])
+        mark = fetched['last_post_id']
+
+    assert sorted(seen) == list(range(11, 351))
+    assert len(seen) == len(set(seen))
+    assert _poll(service, mark, max_count=120)['posts'] == []
+
+
+def test_first_poll_takes_newest_page():
+    fetched = _poll(WallService(range(1, 351)), None, max_count=1000)
+
+    assert [post['id'] for post in fetched['posts']] == list(range(350, 250, -1))
+    assert fetched['last_post_id'] == 350
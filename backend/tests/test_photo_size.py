@@ -0,0 +1,32 @@
+"""Выбор наименьшего достаточного для хэширования варианта фото"""
+from monitoring.plagiarism_detector import PlagiarismDetector
+
+
+def _detector(min_size):
+    detector = PlagiarismDetector()
+    detector.image_min_size = min_size
+    return detector
+
+
+def test_smallest_sufficient_size_by_dimensions():
+    sizes = [
+        {'type': 's', 'url': 's', 'width': 75, 'height': 50},
+        {'type': 'm', 'url': 'm', 'width': 130, 'height': 87},
+        {'type': 'o', 'url': 'o', 'width': 130, 'height': 130},
+        {'type': 'x', 'url': 'x', 'width': 604, 'height': 403},
+        {'type': 'w', 'url': 'w', 'width': 2560, 'height': 1707},
+    ]
+
+    assert _detector(80)._select_photo_size(sizes)['url'] == 'm'
+    assert _detector(300)._select_photo_size(sizes)['url'] == 'x'
+    # Нет достаточно большого варианта - максимальный
+    assert _detector(3000)._select_photo_size(sizes)['url'] == 'w'
+
+
+def test_smallest_sufficient_size_by_type():
+    sizes = [{'type': size_type, 'url': size_type} for size_type in 'wzrxms']
+
+    assert _detector(90)._select_photo_size(sizes)['url'] == 'm'
+    assert _detector(300)._select_photo_size(sizes)['url'] == 'x'
+    assert _detector(700)._select_photo_size(sizes)['url'] == 'z'
+    assert _detector(5000)._select_photo_size(sizes)['url'] == 'w'
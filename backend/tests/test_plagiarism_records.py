@@ -0,0 +1,90 @@
+"""Запись случаев плагиата: принадлежность группе автора оригинала и отсутствие дублей"""
+import asyncio
+
+import pytest
+
+from database.database import SessionLocal
+from models.user import User
+from models.group import Group
+from models.plagiarism import Plagiarism
+from monitoring.scheduler import MonitoringScheduler
+
+ORIGINAL_GROUP, COPY_GROUP = 2001, 2002
+TEXT = "Завтра в городском парке пройдет большой фестиваль уличной еды, музыки и ремесел для всей семьи"
+
+
+@pytest.fixture
+def scheduler(clean_database):
+    db = SessionLocal()
+    for vk_id, group_id in ((1, ORIGINAL_GROUP), (2, COPY_GROUP)):
+        user = User(vk_id=vk_id)
+        db.add(user)
+        db.flush()
+        db.add(Group(vk_group_id=group_id, name=str(group_id), user_id=user.id))
+    db.commit()
+    db.close()
+
+    scheduler = MonitoringScheduler()
+    scheduler.notified = []
+
+    async def send_plagiarism_notification(user_id, plagiarism, db):
+        scheduler.notified.append((user_id, plagiarism.original_post_id, plagiarism.plagiarized_post_id))
+        return True
+
+    scheduler.notification_service.send_plagiarism_notification = send_plagiarism_notification
+    yield scheduler
+    scheduler.detection_executor.shutdown()
+
+
+def _check(scheduler, group_id, post_id, date):
+    db = SessionLocal()
+    try:
+        group = db.query(Group).filter(Group.vk_group_id == group_id).one()
+        post = {'id': post_id, 'owner_id': -group_id, 'date': date, 'text': TEXT}
+        return asyncio.run(scheduler.check_posts_for_plagiarism([post], group, db, index_posts=True))
+    finally:
+        db.close()
+
+
+def _owner(group_id):
+    db = SessionLocal()
+    try:
+        return db.query(Group).filter(Group.vk_group_id == group_id).one().user_id
+    finally:
+        db.close()
+
+
+def _records():
+    db = SessionLocal()
+    try:
+        return [
+            (case.group.vk_group_id, case.original_post_id, case.plagiarized_post_id)
+            for case in db.query(Plagiarism).all()
+        ]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize('copy_checked_first', [True, False])
+def test_case_belongs_to_original_group_in_both_orders(scheduler, copy_checked_first):
+    if copy_checked_first:
+        _check(scheduler, COPY_GROUP, 20, 200)
+        _check(scheduler, ORIGINAL_GROUP, 10, 100)
+    else:
+        _check(scheduler, ORIGINAL_GROUP, 10, 100)
+        _check(scheduler, COPY_GROUP, 20, 200)
+
+    assert _records() == [(ORIGINAL_GROUP, f"-{ORIGINAL_GROUP}_10", f"-{COPY_GROUP}_20")]
+    # Уведомление получает владелец группы с оригиналом
+    assert scheduler.notified == [(_owner(ORIGINAL_GROUP), f"-{ORIGINAL_GROUP}_10", f"-{COPY_GROUP}_20")]
+
+
+def test_repeated_check_does_not_duplicate_case(scheduler):
+    _check(scheduler, ORIGINAL_GROUP, 10, 100)
+    _check(scheduler, COPY_GROUP, 20, 200)
+
+    # Повторная проверка тех же постов (прерванный цикл, потерянные отметки) - новых записей нет
+    assert _check(scheduler, COPY_GROUP, 20, 200) == 0
+    assert _check(scheduler, ORIGINAL_GROUP, 10, 100) == 0
+    assert len(_records()) == 1
+    assert len(scheduler.notified) == 1
@@ -0,0 +1,111 @@
+"""Цикл мониторинга: ограничение времени на группу и повторный цикл после прерывания"""
+import asyncio
+
+import pytest
+
+from config.settings import settings
+from database.database import SessionLocal
+from models.user import User
+from models.group import Group
+from models.plagiarism import Plagiarism
+from monitoring.scheduler import MonitoringScheduler
+
+TEXT = "Завтра в городском парке пройдет большой фестиваль уличной еды, музыки и ремесел для всей семьи"
+
+
+class WallsStub:
+    """Стены нескольких групп; стена из hanging отвечает бесконечно долго"""
+
+    def __init__(self, walls, hanging=()):
+        self.walls = walls
+        self.hanging = set(hanging)
+
+    async def get_new_group_posts(self, group_id, last_post_id=None, max_count=1000):
+        if abs(group_id) in self.hanging:
+            await asyncio.sleep(3600)
+        posts = [post for post in self.walls.get(abs(group_id), []) if last_post_id is None or post['id'] > last_post_id]
+        newest = max(posts, key=lambda post: post['id']) if posts else None
+        return {
+            'posts': posts,
+            'last_post_id': newest['id'] if newest else last_post_id,
+            'last_post_date': newest['date'] if newest else None
+        }
+
+    @staticmethod
+    def is_repost(post):
+        return False
+
+
+def _post(group_id, post_id, date, text=TEXT):
+    return {'id': post_id, 'owner_id': -group_id, 'date': date, 'text': text}
+
+
+@pytest.fixture
+def scheduler(clean_database, monkeypatch):
+    monkeypatch.setattr(settings, 'MONITORING_GROUP_TIMEOUT_SECONDS', 0.5)
+
+    db = SessionLocal()
+    for vk_id, group_id in ((1, 3001), (2, 3002), (3, 3003)):
+        user = User(vk_id=vk_id)
+        db.add(user)
+        db.flush()
+        db.add(Group(vk_group_id=group_id, name=str(group_id), user_id=user.id))
+    db.commit()
+    db.close()
+
+    scheduler = MonitoringScheduler()
+    yield scheduler
+    scheduler.detection_executor.shutdown()
+
+
+def _marks():
+    db = SessionLocal()
+    try:
+        return {group.vk_group_id: group.last_post_id for group in db.query(Group).all()}
+    finally:
+        db.close()
+
+
+def _cases():
+    db = SessionLocal()
+    try:
+        return db.query(Plagiarism).count()
+    finally:
+        db.close()
+
+
+def test_hanging_wall_fetch_times_out_only_its_group(scheduler):
+    scheduler.vk_api = WallsStub({
+        3001: [_post(3001, 1, 100, "Первый пост первой группы про концерт в субботу вечером")],
+        3002: [_post(3002, 5, 100, "Пост второй группы про выставку современного искусства")],
+        3003: [_post(3003, 9, 100, "Пост третьей группы, стена которой не отвечает")],
+    }, hanging={3003})
+
+    asyncio.run(asyncio.wait_for(scheduler.run_monitoring(), timeout=30))
+
+    assert _marks() == {3001: 1, 3002: 5, 3003: None}
+
+
+def test_cycle_after_timeout_does_not_duplicate_cases(scheduler):
+    scheduler.vk_api = WallsStub({
+        3001: [_post(3001, 1, 100)],
+        3002: [_post(3002, 2, 200)],
+    })
+    notifications = []
+
+    async def hanging_notification(user_id, plagiarism, db):
+        notifications.append(plagiarism.id)
+        await asyncio.sleep(3600)
+
+    scheduler.notification_service.send_plagiarism_notification = hanging_notification
+
+    # Первый цикл: случай записан, но группа с копией прервана на уведомлении - ее отметка не сдвинулась
+    asyncio.run(asyncio.wait_for(scheduler.run_monitoring(), timeout=30))
+    assert _cases() == 1
+    assert _marks()[3002] is None
+
+    # Следующий цикл проверяет копию заново, но запись и уведомление не повторяются
+    asyncio.run(asyncio.wait_for(scheduler.run_monitoring(), timeout=30))
+    assert _cases() == 1
+    assert len(notifications) == 1
+    assert _marks()[3002] == 2
@@ -0,0 +1,29 @@
+"""Новые столбцы моделей добавляются в базу, созданную прежней версией"""
+import os
+import tempfile
+
+from sqlalchemy import create_engine, text
+
+from database.database import Base, add_missing_columns
+from models.user import User  # noqa: F401 - таблицы для create_all
+from models.group import Group  # noqa: F401
+from models.plagiarism import Plagiarism  # noqa: F401
+
+
+def test_missing_group_columns_are_added():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'old.db')}")
+    Base.metadata.create_all(bind=engine)
+    # Таблица groups без столбцов отметки опроса и догрузки истории
+    added = ('last_post_id', 'last_post_date', 'backfill_offset', 'backfill_completed')
+    with engine.begin() as connection:
+        for column in added:
+            connection.execute(text(f"ALTER TABLE groups DROP COLUMN {column}"))
+        connection.execute(text("INSERT INTO users (vk_id, first_name) VALUES (1, 'Владелец')"))
+        connection.execute(text("INSERT INTO groups (vk_group_id, name, user_id) VALUES (10, 'Группа', 1)"))
+
+    add_missing_columns(engine)
+    add_missing_columns(engine)
+
+    with engine.connect() as connection:
+        row = connection.execute(text(f"SELECT {', '.join(added)} FROM groups")).one()
+    assert tuple(row) == (None, None, 0, 0)
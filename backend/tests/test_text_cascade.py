@@ -0,0 +1,103 @@
+"""Каскад текстовых проверок должен принимать те же решения, что и полный расчет"""
+import random
+
+import pytest
+
+from monitoring.plagiarism_detector import PlagiarismDetector
+
+WORDS = (
+    "новости город погода концерт выставка музей парк театр фестиваль скидка "
+    "акция магазин школа спорт матч команда победа рецепт пирог кофе книга "
+    "фильм премьера билеты вход бесплатно суббота воскресенье утро вечер"
+).split()
+
+FOOTER = (
+    "Подписывайтесь на наше сообщество, ставьте лайки и делитесь записями с друзьями, "
+    "чтобы не пропустить самые свежие новости нашего города каждый день"
+)
+
+
+def _random_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _mutate(rng, text, rate):
+    words = text.split()
+    return " ".join(rng.choice(WORDS) if rng.random() < rate else word for word in words)
+
+
+def _pairs():
+    rng = random.Random(7)
+    pairs = []
+    for _ in range(120):
+        original = _random_text(rng, rng.randint(5, 60))
+        kind = rng.random()
+        if kind < 0.3:
+            target = _mutate(rng, original, rng.choice([0.05, 0.2, 0.4, 0.6]))
+        elif kind < 0.5:
+            # Копия с подписью, которая встречается почти в каждом посте корпуса
+            target = f"{_mutate(rng, original, 0.1)} {FOOTER}"
+        elif kind < 0.7:
+            # Сильное расхождение по длине
+            target = f"{original} {_random_text(rng, rng.randint(40, 120))}"
+        else:
+            target = _random_text(rng, rng.randint(5, 60))
+        pairs.append((original, target))
+    return pairs
+
+
+def _detector(use_cascade, corpus):
+    detector = PlagiarismDetector()
+    detector.use_text_cascade = use_cascade
+    detector.tfidf_model.partial_fit_many(corpus)
+    return detector
+
+
+@pytest.fixture(scope='module')
+def detectors():
+    pairs = _pairs()
+    corpus = [text for pair in pairs for text in pair] + [f"{text} {FOOTER}" for text, _ in pairs]
+    return _detector(True, corpus), _detector(False, corpus), pairs
+
+
+def _post(post_id, text, date):
+    return {'id': post_id, 'owner_id': -1, 'text': text, 'date': date}
+
+
+def test_cascade_matches_full_score(detectors):
+    cascade, full, pairs = detectors
+
+    for index, (original, target) in enumerate(pairs):
+        cascade_result = cascade._analyze_text_plagiarism_mvp(original, target)
+        full_result = full._analyze_text_plagiarism_mvp(original, target)
+
+        assert cascade_result['is_plagiarism'] == full_result['is_plagiarism'], (index, original, target)
+        if not full_result['is_plagiarism']:
+            assert cascade_result['similarity'] == pytest.approx(full_result['similarity'])
+
+
+def test_cascade_keeps_copy_with_common_footer(detectors):
+    cascade, full, _ = detectors
+    original = "Завтра в городском парке пройдет большой фестиваль уличной еды и музыки"
+    target = f"{original} {FOOTER} {FOOTER}"
+
+    full_result = full._analyze_text_plagiarism_mvp(original, target)
+    cascade_result = cascade._analyze_text_plagiarism_mvp(original, target)
+
+    assert cascade_result['is_plagiarism'] == full_result['is_plagiarism']
+    assert cascade_result['similarity'] == pytest.approx(full_result['similarity'])
+
+
+def test_block_cascade_matches_full_score(detectors):
+    cascade, full, pairs = detectors
+    originals = [_post(i, original, 100) for i, (original, _) in enumerate(pairs)]
+    targets = [_post(1000 + i, target, 200) for i, (_, target) in enumerate(pairs)]
+
+    cascade_block = cascade.detect_plagiarism_block(originals, targets)
+    full_block = full.detect_plagiarism_block(originals, targets)
+
+    for cascade_row, full_row in zip(cascade_block, full_block):
+        for cascade_result, full_result in zip(cascade_row, full_row):
+            assert cascade_result['is_plagiarism'] == full_result['is_plagiarism']
+            if not full_result['is_plagiarism']:
+                assert cascade_result['overall_similarity'] == pytest.approx(full_result['overall_similarity'])
@@ -0,0 +1,46 @@
+"""Повторы вызовов VK API выполняются в одном месте - VKAPIService._call"""
+import asyncio
+
+from config.settings import settings
+from services.vk_api_service import VKAPIService
+from services.vk_client import VKAPIError
+
+
+class FlakyClient:
+    """Клиент, отвечающий ошибкой заданное число раз подряд"""
+
+    def __init__(self, failures, code):
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+
+    async def call(self, method, access_token=None, **params):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise VKAPIError(self.code, 'error', method)
+        return 1
+
+
+def _service(client, monkeypatch):
+    monkeypatch.setattr(settings, 'VK_API_BACKOFF_BASE_SECONDS', 0.0)
+    monkeypatch.setattr(settings, 'VK_API_BACKOFF_MAX_SECONDS', 0.0)
+    service = VKAPIService()
+    service.client = client
+    service.batcher = None
+    return service
+
+
+def test_rate_limit_error_is_retried(monkeypatch):
+    client = FlakyClient(failures=2, code=6)
+    service = _service(client, monkeypatch)
+
+    assert asyncio.run(service.send_message(1, "текст")) is True
+    assert client.calls == 3
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    client = FlakyClient(failures=1, code=15)
+    service = _service(client, monkeypatch)
+
+    assert asyncio.run(service.send_message(1, "текст")) is False
+    assert client.calls == 1
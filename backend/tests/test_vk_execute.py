@@ -0,0 +1,99 @@
+"""Объединение вызовов в execute: результаты и ошибки как у прямых вызовов"""
+import asyncio
+
+import pytest
+
+from services.vk_client import VKAPIError
+from services.vk_execute import VKExecuteBatcher
+from vk_fake_api import parse_execute_code
+
+
+class ClientStub:
+    """VK API, в котором execute больше max_batch вызовов падает целиком с заданной ошибкой"""
+
+    def __init__(self, max_batch=25, batch_error=13, failing_posts=()):
+        self.max_batch = max_batch
+        self.batch_error = batch_error
+        self.failing_posts = set(failing_posts)
+        self.executes = []
+        self.direct_calls = []
+
+    def _result(self, method, params):
+        posts = str(params.get('posts'))
+        if posts in self.failing_posts:
+            return None
+        return [{'id': posts, 'method': method}]
+
+    async def request(self, method, access_token=None, **params):
+        await asyncio.sleep(0)
+        calls = parse_execute_code(params['code'])
+        self.executes.append(len(calls))
+        if len(calls) > self.max_batch:
+            return {'error': {'error_code': self.batch_error, 'error_msg': 'Response size is too big'}}
+
+        results = [self._result(name, arguments) for name, arguments in calls]
+        return {
+            'response': [False if result is None else result for result in results],
+            'execute_errors': [
+                {'method': name, 'error_code': 15, 'error_msg': 'Access denied'}
+                for (name, _), result in zip(calls, results) if result is None
+            ]
+        }
+
+    async def call(self, method, access_token=None, **params):
+        await asyncio.sleep(0)
+        self.direct_calls.append(method)
+        result = self._result(method, params)
+        if result is None:
+            raise VKAPIError(15, 'Access denied', method)
+        return result
+
+
+async def _call_all(batcher, posts):
+    return await asyncio.gather(
+        *(batcher.call('wall.getById', 'token', posts=post) for post in posts),
+        return_exceptions=True
+    )
+
+
+def _run(client, posts):
+    batcher = VKExecuteBatcher(client, max_calls=25, window_ms=5)
+    return asyncio.run(_call_all(batcher, posts))
+
+
+def _expected(client, posts):
+    async def direct():
+        return await asyncio.gather(
+            *(client.call('wall.getById', 'token', posts=post) for post in posts), return_exceptions=True
+        )
+    return asyncio.run(direct())
+
+
+def _normalize(results):
+    return [(type(result).__name__, result.code) if isinstance(result, VKAPIError) else result for result in results]
+
+
+@pytest.mark.parametrize('max_batch', [25, 7, 1, 0])
+def test_batched_results_match_direct_calls(max_batch):
+    posts = [f"-1_{i}" for i in range(20)]
+    client = ClientStub(max_batch=max_batch, failing_posts={"-1_3", "-1_17"})
+
+    assert _normalize(_run(client, posts)) == _normalize(_expected(ClientStub(failing_posts={"-1_3", "-1_17"}), posts))
+
+
+def test_execute_error_splits_batch():
+    client = ClientStub(max_batch=5)
+    results = _run(client, [f"-1_{i}" for i in range(20)])
+
+    assert all(not isinstance(result, Exception) for result in results)
+    assert client.executes[0] == 20
+    assert max(client.executes[1:]) <= 20 // 2
+
+
+def test_token_error_is_not_split():
+    client = ClientStub(max_batch=0, batch_error=6)
+    results = _run(client, [f"-1_{i}" for i in range(10)])
+
+    assert [result.code for result in results] == [6] * 10
+    assert client.executes == [10]
+    assert client.direct_calls == []
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Локальная замена VK API для офлайн-прогонов и бенчмарков
+
+Режимы:
+  record   - прокси к api.vk.com: ответы wall.get, wall.getById, groups.getById,
+             users.get и фотографии из постов сохраняются в каталог записи
+  replay   - ответы отдаются из записи с заданной задержкой и долей ошибок 6
+  generate - синтетическая запись (сообщества, посты с копиями, картинки) без сети
+
+Сервис переключается на замену настройкой
+VK_API_BASE_URL=http://127.0.0.1:8081/method
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+UPSTREAM_URL = "https://api.vk.com/method"
+RECORDED_METHODS = frozenset({'wall.get', 'wall.getById', 'groups.getById', 'users.get'})
+
+
+class VKRecording:
+    """Записанные ответы VK API: сообщества, стены, пользователи и фотографии
+
+    Хранится в каталоге: recording.json с данными и photos/ с файлами
+    изображений. Стены объединяются по id постов, поэтому при воспроизведении
+    wall.get отвечает на любые offset/count, а не только на записанные.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.groups: Dict[int, Dict] = {}
+        self.walls: Dict[int, Dict[int, Dict]] = {}  # owner_id -> id поста -> пост
+        self.wall_counts: Dict[int, int] = {}
+        self.users: Dict[int, Dict] = {}
+        self.photo_sources: Dict[str, str] = {}  # ключ фото -> исходный URL
+        self._lock = threading.Lock()
+
+    @property
+    def photos_dir(self) -> str:
+        return os.path.join(self.path, 'photos')
+
+    @classmethod
+    def load(cls, path: str) -> 'VKRecording':
+        recording = cls(path)
+        data_path = os.path.join(path, 'recording.json')
+        if os.path.exists(data_path):
+            with open(data_path, encoding='utf-8') as f:
+                data = json.load(f)
+            recording.groups = {int(k): v for k, v in data.get('groups', {}).items()}
+            recording.walls = {
+                int(owner_id): {post['id']: post for post in posts}
+                for owner_id, posts in data.get('walls', {}).items()
+            }
+            recording.wall_counts = {int(k): v for k, v in data.get('wall_counts', {}).items()}
+            recording.users = {int(k): v for k, v in data.get('users', {}).items()}
+            recording.photo_sources = data.get('photos', {})
+        return recording
+
+    def save(self):
+        os.makedirs(self.photos_dir, exist_ok=True)
+        with self._lock:
+            data = {
+                'groups': self.groups,
+                'walls': {owner_id: list(posts.values()) for owner_id, posts in self.walls.items()},
+                'wall_counts': self.wall_counts,
+                'users': self.users,
+                'photos': self.photo_sources
+            }
+        tmp_path = os.path.join(self.path, 'recording.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, 'recording.json'))
+
+    # --- Запись ---
+
+    @staticmethod
+    def photo_key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+
+    def photo_path(self, key: str) -> str:
+        return os.path.join(self.photos_dir, f"{key}.jpg")
+
+    def add_photo(self, url: str, content: Optional[bytes] = None) -> str:
+        key = self.photo_key(url)
+        with self._lock:
+            self.photo_sources[key] = url
+        if content is not None:
+            os.makedirs(self.photos_dir, exist_ok=True)
+            with open(self.photo_path(key), 'wb') as f:
+                f.write(content)
+        return key
+
+    def read_photo(self, url: str) -> bytes:
+        with open(self.photo_path(self.photo_key(url)), 'rb') as f:
+            return f.read()
+
+    def add_groups(self, items: List[Dict]):
+        with self._lock:
+            for item in items or []:
+                if isinstance(item, dict) and 'id' in item:
+                    self.groups[item['id']] = item
+
+    def add_users(self, items: List[Dict]):
+        with self._lock:
+            for item in items or []:
+                if isinstance(item, dict) and 'id' in item:
+                    self.users[item['id']] = item
+
+    def add_posts(self, items: List[Dict], owner_id: Optional[int] = None, count: Optional[int] = None):
+        for item in items or []:
+            if isinstance(item, dict) and 'id' in item:
+                for photo in self._iter_photo_sizes(item):
+                    self.add_photo(photo['url'])
+        with self._lock:
+            for item in items or []:
+                if isinstance(item, dict) and 'id' in item:
+                    self.walls.setdefault(item.get('owner_id', owner_id), {})[item['id']] = item
+            if owner_id is not None and count is not None:
+                self.wall_counts[owner_id] = max(count, self.wall_counts.get(owner_id, 0))
+
+    def absorb(self, method: str, params: Dict[str, Any], response: Any):
+        """Сохранение успешного ответа записываемого метода"""
+        if method == 'groups.getById':
+            self.add_groups(response if isinstance(response, list) else (response or {}).get('groups', []))
+        elif method == 'users.get':
+            self.add_users(response)
+        elif method == 'wall.getById':
+            self.add_posts(response if isinstance(response, list) else (response or {}).get('items', []))
+        elif method == 'wall.get' and isinstance(response, dict):
+            owner_id = int(params['owner_id']) if params.get('owner_id') is not None else None
+            self.add_posts(response.get('items', []), owner_id, response.get('count'))
+
+    # --- Воспроизведение ---
+
+    @staticmethod
+    def _iter_photo_sizes(value: Any):
+        """Все варианты размеров фото внутри поста, включая репосты"""
+        if isinstance(value, dict):
+            sizes = value.get('sizes')
+            if isinstance(sizes, list):
+                for size in sizes:
+                    if isinstance(size, dict) and size.get('url'):
+                        yield size
+            for item in value.values():
+                if isinstance(item, (dict, list)):
+                    yield from VKRecording._iter_photo_sizes(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from VKRecording._iter_photo_sizes(item)
+
+    def localize(self, value: Any, base_url: str) -> Any:
+        """Копия ответа, в которой фото ссылаются на эту замену, а не на CDN VK"""
+        value = json.loads(json.dumps(value))
+        for size in self._iter_photo_sizes(value):
+            size['url'] = f"{base_url}/photos/{self.photo_key(size['url'])}.jpg"
+        return value
+
+    def wall_get(self, owner_id: int, offset: int, count: int, max_date: Optional[int] = None) -> Dict:
+        # Закрепленный пост - первым, дальше от новых к старым, как отдает VK
+        posts = sorted(
+            (post for post in self.walls.get(owner_id, {}).values()
+             if max_date is None or post.get('date', 0) <= max_date),
+            key=lambda post: (not post.get('is_pinned'), -post['id'])
+        )
+        if max_date is not None:
+            return {'count': len(posts), 'items': posts[offset:offset + count]}
+        return {
+            'count': max(self.wall_counts.get(owner_id, 0), len(posts)),
+            'items': posts[offset:offset + count]
+        }
+
+    def wall_get_by_id(self, keys: List[str]) -> List[Dict]:
+        posts = []
+        for key in keys:
+            owner_id, _, post_id = key.partition('_')
+            post = self.walls.get(int(owner_id), {}).get(int(post_id))
+            if post is not None:
+                posts.append(post)
+        return posts
+
+    def groups_get_by_id(self, ids: List[str]) -> List[Dict]:
+        by_screen_name = {group.get('screen_name'): group for group in self.groups.values()}
+        groups = []
+        for group_id in ids:
+            group_id = group_id.strip()
+            if group_id.lstrip('-').isdigit():
+                group = self.groups.get(abs(int(group_id)))
+            else:
+                group = by_screen_name.get(group_id)
+            if group is not None:
+                groups.append(group)
+        return groups
+
+    def users_get(self, ids: List[str]) -> List[Dict]:
+        # Незаписанные пользователи отдаются заглушкой - уведомлениям нужен только id
+        return [
+            self.users.get(int(user_id), {'id': int(user_id), 'first_name': 'Пользователь', 'last_name': user_id})
+            for user_id in ids if user_id.strip().isdigit()
+        ]
+
+
+def parse_execute_code(code: str) -> List[Tuple[str, Dict]]:
+    """Разбор VKScript вида return [API.method({...}), ...]; который собирает VKExecuteBatcher"""
+    decoder = json.JSONDecoder()
+    calls = []
+    position = 0
+    pattern = re.compile(r'\s*API\.([\w.]+)\(')
+    while True:
+        match = pattern.search(code, position)
+        if match is None:
+            break
+        arguments, position = decoder.raw_decode(code, match.end())
+        if code[position] != ')':
+            raise ValueError(f"Неподдерживаемый VKScript около позиции {position}")
+        calls.append((match.group(1), arguments))
+        position += 1
+    return calls
+
+
+def _vk_error(code: int, message: str, params: Optional[Dict] = None) -> Dict:
+    return {'error': {'error_code': code, 'error_msg': message, 'request_params': [
+        {'key': key, 'value': str(value)} for key, value in (params or {}).items() if key != 'access_token'
+    ]}}
+
+
+def _split_ids(value: Any) -> List[str]:
+    return [item for item in str(value or '').split(',') if item.strip()]
+
+
+class FakeVKAPI:
+    """Замена VK API поверх записи
+
+    Отвечает на wall.get, wall.getById, groups.getById, users.get,
+    groups.get, messages.send и execute из записанных батчей. Задержка,
+    доля ошибок 6 и лимит запросов в секунду на токен настраиваются, так что
+    один и тот же прогон воспроизводим без сети. С upstream работает как
+    записывающий прокси. Если задан clock (unixtime), стены показывают только
+    посты, опубликованные не позже него: сдвигая clock между циклами, можно
+    воспроизвести появление новых постов.
+    """
+
+    def __init__(self, recording: VKRecording, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, rps_limit: float = 0.0,
+                 upstream: Optional[str] = None, seed: int = 0):
+        self.recording = recording
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rps_limit = rps_limit
+        self.upstream = upstream.rstrip('/') if upstream else None
+
+        self._random = random.Random(seed)
+        self._requests_by_token: Dict[str, deque] = {}
+        self._upstream_client: Optional[httpx.AsyncClient] = None
+        self._message_id = 0
+
+        self.clock: Optional[int] = None
+
+        self.stats: Counter = Counter()
+
+    def reset_stats(self):
+        self.stats = Counter()
+
+    def _get_upstream_client(self) -> httpx.AsyncClient:
+        if self._upstream_client is None or self._upstream_client.is_closed:
+            self._upstream_client = httpx.AsyncClient(timeout=httpx.Timeout(30.0), follow_redirects=True)
+        return self._upstream_client
+
+    async def _delay(self):
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _inject_error(self, method: str, params: Dict) -> Optional[Dict]:
+        """Ошибка 6 при превышении лимита токена или случайно с долей error_rate"""
+        if self.rps_limit > 0:
+            now = time.monotonic()
+            window = self._requests_by_token.setdefault(params.get('access_token', ''), deque())
+            while window and window[0] <= now - 1.0:
+                window.popleft()
+            if len(window) >= self.rps_limit:
+                self.stats['errors_rate_limit'] += 1
+                return _vk_error(6, "Too many requests per second", params)
+            window.append(now)
+
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            self.stats['errors_injected'] += 1
+            return _vk_error(6, "Too many requests per second", params)
+
+        return None
+
+    def _dispatch(self, method: str, params: Dict) -> Dict:
+        """Ответ на вызов одного метода из записи"""
+        recording = self.recording
+
+        if method == 'wall.get':
+            if params.get('owner_id') is None:
+                return _vk_error(100, "One of the parameters specified was missing or invalid: owner_id", params)
+            return {'response': recording.wall_get(
+                int(params['owner_id']), int(params.get('offset', 0)), min(int(params.get('count', 20)), 100),
+                max_date=self.clock
+            )}
+
+        if method == 'wall.getById':
+            return {'response': recording.wall_get_by_id(_split_ids(params.get('posts')))}
+
+        if method == 'groups.getById':
+            groups = recording.groups_get_by_id(_split_ids(params.get('group_ids') or params.get('group_id')))
+            if not groups:
+                return _vk_error(100, "One of the parameters specified was missing or invalid: group_ids", params)
+            return {'response': groups}
+
+        if method == 'users.get':
+            return {'response': recording.users_get(_split_ids(params.get('user_ids') or params.get('user_id')))}
+
+        if method == 'groups.get':
+            groups = list(recording.groups.values())
+            if str(params.get('extended', '0')) == '1':
+                return {'response': {'count': len(groups), 'items': groups}}
+            return {'response': {'count': len(groups), 'items': [group['id'] for group in groups]}}
+
+        if method == 'messages.send':
+            self._message_id += 1
+            self.stats['messages_sent'] += 1
+            return {'response': self._message_id}
+
+        return _vk_error(3, "Unknown method passed", params)
+
+    def _execute(self, params: Dict) -> Dict:
+        try:
+            calls = parse_execute_code(params.get('code', ''))
+        except ValueError as e:
+            return _vk_error(12, f"Unable to compile code: {e}", params)
+
+        results = []
+        errors = []
+        for method, arguments in calls:
+            self.stats[f"execute:{method}"] += 1
+            payload = self._dispatch(method, {key: str(value) for key, value in arguments.items()})
+            if 'error' in payload:
+                results.append(False)
+                errors.append({'method': method, **payload['error']})
+            else:
+                results.append(payload['response'])
+
+        response = {'response': results}
+        if errors:
+            response['execute_errors'] = errors
+        return response
+
+    async def _proxy(self, method: str, params: Dict) -> Dict:
+        """Запрос к настоящему VK API с сохранением ответа в запись"""
+        response = await self._get_upstream_client().post(f"{self.upstream}/{method}", data=params)
+        response.raise_for_status()
+        payload = response.json()
+
+        if 'response' in payload:
+            if method in RECORDED_METHODS:
+                self.recording.absorb(method, params, payload['response'])
+            elif method == 'execute':
+                calls = parse_execute_code(params.get('code', ''))
+                for (call_method, arguments), result in zip(calls, payload['response'] or []):
+                    if call_method in RECORDED_METHODS and result is not False:
+                        self.recording.absorb(call_method, arguments, result)
+
+        return payload
+
+    async def handle_method(self, method: str, params: Dict, base_url: str) -> Dict:
+        self.stats['requests'] += 1
+        self.stats[f"method:{method}"] += 1
+        await self._delay()
+
+        if self.upstream:
+            payload = await self._proxy(method, params)
+        else:
+            payload = self._inject_error(method, params)
+            if payload is None:
+                payload = self._execute(params) if method == 'execute' else self._dispatch(method, params)
+
+        if 'response' in payload:
+            payload['response'] = self.recording.localize(payload['response'], base_url)
+        return payload
+
+    async def handle_photo(self, key: str) -> Optional[bytes]:
+        self.stats['photos'] += 1
+        path = self.recording.photo_path(key)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        source = self.recording.photo_sources.get(key)
+        if self.upstream and source:
+            response = await self._get_upstream_client().get(source)
+            response.raise_for_status()
+            self.recording.add_photo(source, response.content)
+            return response.content
+
+        return None
+
+    async def close(self):
+        if self._upstream_client is not None and not self._upstream_client.is_closed:
+            await self._upstream_client.aclose()
+        if self.upstream:
+            self.recording.save()
+
+
+def create_app(fake_api: FakeVKAPI) -> FastAPI:
+    """FastAPI приложение с методами VK API по адресу /method/<метод>"""
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await fake_api.close()
+
+    app = FastAPI(title="VK API stand-in", lifespan=lifespan)
+    app.state.fake_api = fake_api
+
+    @app.api_route("/method/{method}", methods=["GET", "POST"])
+    async def vk_method(method: str, request: Request):
+        params = dict(request.query_params)
+        if request.method == "POST":
+            params.update(dict(await request.form()))
+        base_url = str(request.base_url).rstrip('/')
+        return JSONResponse(await fake_api.handle_method(method, params, base_url))
+
+    @app.get("/photos/{key}.jpg")
+    async def photo(key: str):
+        content = await fake_api.handle_photo(key)
+        if content is None:
+            return Response(status_code=404)
+        return Response(content, media_type="image/jpeg")
+
+    @app.get("/stats")
+    async def stats():
+        return dict(fake_api.stats)
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        fake_api.reset_stats()
+        return {"status": "ok"}
+
+    return app
+
+
+def _random_image(rng: random.Random, size: int = 320) -> bytes:
+    """Картинка из случайных фигур - pHash таких картинок заметно различается"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(4, 10)):
+        x1, y1 = rng.randrange(size), rng.randrange(size)
+        x2, y2 = x1 + rng.randint(20, size // 2), y1 + rng.randint(20, size // 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x1, y1, x2, y2), fill=color)
+        else:
+            draw.ellipse((x1, y1, x2, y2), fill=color)
+
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _recompress(content: bytes, rng: random.Random) -> bytes:
+    """Копия картинки после пересохранения и небольшого масштабирования, как при перезаливе"""
+    from PIL import Image
+
+    img = Image.open(BytesIO(content))
+    scale = rng.uniform(0.8, 1.2)
+    img = img.resize((int(img.width * scale), int(img.height * scale)))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=rng.randint(60, 90))
+    return buffer.getvalue()
+
+
+def generate_recording(path: str, groups: int = 10, posts_per_group: int = 100,
+                       copy_rate: float = 0.05, image_rate: float = 0.5, seed: int = 42) -> VKRecording:
+    """Синтетическая запись: сообщества с постами, часть постов - копии чужих"""
+    rng = random.Random(seed)
+    recording = VKRecording(path)
+    syllables = ['ка', 'ро', 'ми', 'то', 'на', 'ле', 'ви', 'сто', 'пра', 'ду', 'же', 'ло', 'ри', 'за', 'бе']
+    words = list({''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(5000)})
+
+    group_ids = list(range(1001, 1001 + groups))
+    recording.add_groups([
+        {
+            'id': group_id,
+            'name': f"Тестовое сообщество {group_id}",
+            'screen_name': f"club{group_id}",
+            'is_closed': 0,
+            'type': 'page',
+            'photo_100': '',
+            'description': 'Синтетическое сообщество для офлайн-прогонов'
+        }
+        for group_id in group_ids
+    ])
+
+    next_post_id = {group_id: 1 for group_id in group_ids}
+    photo_id = 0
+    published: List[Dict] = []
+    date = 1700000000
+
+    for _ in range(groups * posts_per_group):
+        group_id = rng.choice(group_ids)
+        date += rng.randint(30, 600)
+
+        original = rng.choice(published) if published and rng.random() < copy_rate else None
+        if original is not None and original['owner_id'] != -group_id:
+            # Копия: тот же текст с мелкими правками и перезалитые картинки
+            text_words = original['text'].split()
+            for _ in range(max(1, len(text_words) // 20)):
+                text_words[rng.randrange(len(text_words))] = rng.choice(words)
+            text = ' '.join(text_words)
+            images = [
+                _recompress(recording.read_photo(size['url']), rng)
+                for attachment in original['attachments']
+                for size in attachment['photo']['sizes']
+            ]
+        else:
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(15, 80)))
+            images = [_random_image(rng) for _ in range(rng.randint(1, 2))] if rng.random() < image_rate else []
+
+        attachments = []
+        for content in images:
+            photo_id += 1
+            url = f"https://sun9-fake.userapi.com/impg/{photo_id}.jpg"
+            recording.add_photo(url, content)
+            attachments.append({'type': 'photo', 'photo': {
+                'id': photo_id,
+                'owner_id': -group_id,
+                'sizes': [{'type': 'x', 'url': url, 'width': 320, 'height': 320}]
+            }})
+
+        post = {
+            'id': next_post_id[group_id],
+            'owner_id': -group_id,
+            'from_id': -group_id,
+            'date': date,
+            'post_type': 'post',
+            'text': text,
+            'attachments': attachments
+        }
+        next_post_id[group_id] += 1
+        recording.add_posts([post])
+        published.append(post)
+
+    recording.save()
+    return recording
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена VK API")
+    parser.add_argument('mode', choices=['record', 'replay', 'generate'])
+    parser.add_argument('--recording', default='data/vk_recording', help="Каталог записи")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Задержка ответа")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Разброс задержки ±")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов с ошибкой 6")
+    parser.add_argument('--rps-limit', type=float, default=0.0, help="Лимит запросов в секунду на токен (0 - без лимита)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--groups', type=int, default=10, help="generate: число сообществ")
+    parser.add_argument('--posts', type=int, default=100, help="generate: постов на сообщество")
+    parser.add_argument('--copy-rate', type=float, default=0.05, help="generate: доля копий чужих постов")
+    args = parser.parse_args()
+
+    if args.mode == 'generate':
+        recording = generate_recording(args.recording, args.groups, args.posts, args.copy_rate, seed=args.seed or 42)
+        posts = sum(len(posts) for posts in recording.walls.values())
+        print(f"✅ Запись создана в {args.recording}: {len(recording.groups)} сообществ, {posts} постов, "
+              f"{len(recording.photo_sources)} фото")
+        return
+
+    import uvicorn
+
+    recording = VKRecording.load(args.recording)
+    fake_api = FakeVKAPI(
+        recording,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rps_limit=args.rps_limit,
+        upstream=UPSTREAM_URL if args.mode == 'record' else None,
+        seed=args.seed
+    )
+    print(f"🚀 VK API ({args.mode}) на http://{args.host}:{args.port}/method, запись: {args.recording}")
+    uvicorn.run(create_app(fake_api), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,10 @@ CREATE TABLE groups (
     posts_checked INTEGER DEFAULT 0,
     plagiarism_found INTEGER DEFAULT 0,
     last_check TIMESTAMP,
+    last_post_id INTEGER,
+    last_post_date TIMESTAMP,
+    backfill_offset INTEGER DEFAULT 0,
+    backfill_completed BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );